@@ -0,0 +1,49 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare the list based bitmap decoder with the streaming decoder, in time
+and allocated memory, on generated 16 and 24-bit bitmaps.
+"""
+
+import io
+import ubinascii  # type: ignore
+from common import bench, fake_display, make_bitmap, measure_alloc
+from libs.display.bitmap import Bitmap
+
+WIDTH = 240
+HEIGHT = 135
+
+
+def main():
+    fixtures = [
+        ("24-bit", make_bitmap(WIDTH, HEIGHT, 24)),
+        ("16-bit RGB555", make_bitmap(WIDTH, HEIGHT, 16)),
+        ("16-bit RGB565", make_bitmap(WIDTH, HEIGHT, 16, rgb565=True)),
+    ]
+    display, spi = fake_display(framebuffer=bytearray(WIDTH * HEIGHT * 2))
+    for name, bitmap in fixtures:
+        base64 = Bitmap.BASE64_HEADER + ubinascii.b2a_base64(bitmap).decode()
+        print(f"{name} ({len(bitmap)} bytes):")
+
+        def decode_list():
+            display.image(Bitmap.extract_pixels_from_base64bitmap(base64))
+
+        def decode_stream():
+            Bitmap.draw_base64bitmap(base64, display)
+
+        def decode_file():
+            Bitmap.draw_stream(io.BytesIO(bitmap), display)
+
+        if name != "16-bit RGB565":
+            # The list decoder does not understand RGB565 bit fields
+            bench("  extract_pixels_from_base64bitmap + image", decode_list, 1)
+            print(f"  allocated: {measure_alloc(decode_list)} bytes")
+        bench("  draw_base64bitmap", decode_stream, 3)
+        print(f"  allocated: {measure_alloc(decode_stream)} bytes")
+        bench("  draw_stream", decode_file, 3)
+        print(f"  allocated: {measure_alloc(decode_file)} bytes")
+
+
+main()
@@ -0,0 +1,105 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare per-pixel shift based color conversion with the lookup tables and
+row functions of colorconv, on the pixel rows of generated bitmaps.
+"""
+
+from common import bench, make_bitmap
+from libs.display import colorconv, colors
+from libs.display.bitmap import Bitmap
+
+WIDTH = 240
+HEIGHT = 135
+
+
+def rows(bitmap, bytes_per_pixel):
+    """Pixel rows of a generated bitmap, without padding"""
+    offset = Bitmap.HEADERS_SIZE
+    stride = (WIDTH * bytes_per_pixel + 3) & ~3
+    data = memoryview(bitmap)[offset:]
+    return [
+        data[y * stride : y * stride + WIDTH * bytes_per_pixel] for y in range(HEIGHT)
+    ]
+
+
+def shift_bgr888(src, dst, pixels):
+    j = 0
+    for i in range(0, pixels * 3, 3):
+        pixel = (src[i + 2] & 0xF8) << 8 | (src[i + 1] & 0xFC) << 3 | src[i] >> 3
+        dst[j] = pixel >> 8
+        dst[j + 1] = pixel & 0xFF
+        j += 2
+
+
+def lut_bgr888(src, dst, pixels):
+    r8 = colorconv.R8_TO_565
+    g8 = colorconv.G8_TO_565
+    b8 = colorconv.B8_TO_565
+    j = 0
+    for i in range(0, pixels * 3, 3):
+        pixel = r8[src[i + 2]] | g8[src[i + 1]] | b8[src[i]]
+        dst[j] = pixel >> 8
+        dst[j + 1] = pixel & 0xFF
+        j += 2
+
+
+def shift_rgb555(src, dst, pixels):
+    for j in range(0, pixels * 2, 2):
+        pixel = src[j] | src[j + 1] << 8
+        pixel = (pixel & 0x7FE0) << 1 | (pixel & 0x001F)
+        dst[j] = pixel >> 8
+        dst[j + 1] = pixel & 0xFF
+
+
+def main():
+    dst = bytearray(WIDTH * 2)
+    fixtures = [
+        (
+            "24-bit",
+            rows(make_bitmap(WIDTH, HEIGHT, 24), 3),
+            [
+                ("per-pixel shifts", shift_bgr888),
+                ("per-pixel lookup tables", lut_bgr888),
+                ("colorconv.convert_bgr888", colorconv.convert_bgr888),
+            ],
+        ),
+        (
+            "16-bit RGB555",
+            rows(make_bitmap(WIDTH, HEIGHT, 16), 2),
+            [
+                ("per-pixel shifts", shift_rgb555),
+                ("colorconv.convert_rgb555", colorconv.convert_rgb555),
+            ],
+        ),
+    ]
+    for name, pixel_rows, converters in fixtures:
+        print(f"{name} ({WIDTH}x{HEIGHT}):")
+        for label, convert in converters:
+
+            def run():
+                for row in pixel_rows:
+                    convert(row, dst, WIDTH)
+
+            bench(f"  {label}", run, 3)
+
+    values = list(range(0, 256, 5))
+
+    def shift_scalar():
+        for r in values:
+            for g in values:
+                (r & 0xF8) << 8 | (g & 0xFC) << 3 | r >> 3
+
+    def lut_scalar():
+        for r in values:
+            for g in values:
+                colors.rgb565(r, g, r)
+
+    print("Scalar rgb565:")
+    bench("  shifts", shift_scalar, 3)
+    bench("  colors.rgb565", lut_scalar, 3)
+
+
+main()
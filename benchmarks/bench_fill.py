@@ -0,0 +1,66 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare fill_rect filling the whole scratch buffer on every call with the
+solid color chunk cache, on small and large rectangles without a retained
+framebuffer.
+"""
+
+import framebuf  # type: ignore
+from common import bench, fake_display
+from libs.display.st7789 import _to_be16
+
+REPEAT = 200
+COLORS = (0xF800, 0x07E0, 0x001F)
+
+
+def full_scratch_fill_rect(display, x, y, width, height, color):
+    """fill_rect before the solid chunk cache"""
+    buf_len = len(display.buf)
+    chunks, rest = divmod(width * height * 2, buf_len)
+    f = framebuf.FrameBuffer(display.buf, buf_len // 2, 1, framebuf.RGB565)
+    f.fill(_to_be16(color))
+    display.begin()
+    display.set_window(x, y, x + width - 1, y + height - 1)
+    for _ in range(chunks):
+        display._data(display.buf)
+    if rest:
+        display._data(display.buf[:rest])
+    display.end()
+
+
+def main():
+    display, spi = fake_display(buf=bytearray(4096))
+    cases = [
+        ("hline 1x20", 20, 1),
+        ("vline 1x20", 1, 20),
+        ("rect 8x8", 8, 8),
+        ("rect 40x40", 40, 40),
+        ("full screen", display.width, display.height),
+    ]
+    for name, width, height in cases:
+        print(f"{REPEAT} x {name}:")
+
+        def old():
+            for i in range(REPEAT):
+                full_scratch_fill_rect(
+                    display, 0, 0, width, height, COLORS[i % len(COLORS)]
+                )
+
+        def new():
+            for i in range(REPEAT):
+                display.fill_rect(0, 0, width, height, COLORS[i % len(COLORS)])
+
+        bench("  full scratch fill", old, 3)
+        bench("  solid chunk cache", new, 3)
+
+    def outlines():
+        for i in range(REPEAT):
+            display.rect(i % 100, i % 50, 30, 20, COLORS[i % len(COLORS)])
+
+    bench(f"{REPEAT} x rect outline 30x20", outlines, 3)
+
+
+main()
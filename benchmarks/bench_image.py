@@ -0,0 +1,47 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare ST7789.image() with a list of pixels against ST7789.blit_rgb565()
+with a packed buffer, in both byte orders.
+"""
+
+from common import bench, fake_display
+
+WIDTH = 240
+HEIGHT = 135
+
+
+def main():
+    pixels = [(i * 7) & 0xFFFF for i in range(WIDTH * HEIGHT)]
+    packed = bytearray(WIDTH * HEIGHT * 2)
+    for i, pixel in enumerate(pixels):
+        packed[2 * i] = pixel >> 8
+        packed[2 * i + 1] = pixel & 0xFF
+
+    display, spi = fake_display(buf=bytearray(WIDTH * HEIGHT * 2))
+    bench("image(list)", lambda: display.image(pixels), repeat=2)
+    bench("blit_rgb565(big endian)", lambda: display.blit_rgb565(packed))
+    bench(
+        "blit_rgb565(little endian)",
+        lambda: display.blit_rgb565(packed, little_endian=True),
+    )
+
+    display, spi = fake_display(framebuffer=bytearray(WIDTH * HEIGHT * 2))
+    bench(
+        "retained image(list) + flush",
+        lambda: (display.image(pixels), display.flush()),
+        repeat=2,
+    )
+    bench(
+        "retained blit_rgb565 + flush",
+        lambda: (display.blit_rgb565(packed), display.flush()),
+    )
+    bench(
+        "retained blit_rgb565(little endian) + flush",
+        lambda: (display.blit_rgb565(packed, little_endian=True), display.flush()),
+    )
+
+
+main()
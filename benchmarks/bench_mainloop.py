@@ -0,0 +1,131 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare the old main loop, which polls the buttons and then runs the event
+loop for one iteration with stop() and run_forever(), with the application
+running as asyncio tasks.
+
+Three buttons are pressed at known times. The benchmark measures the delay
+until the on_press callback, how late a timer task standing in for a
+request handler wakes up, and how many times the buttons were read.
+"""
+
+import asyncio
+import time
+
+import common  # noqa: F401 - makes the application modules importable
+from libs.button.buttoncontroller import ButtonController
+import libs.std.logging as logging
+
+DURATION_MS = 2000
+# Presses do not line up with the polling interval
+PRESS_PERIOD_MS = 97
+PRESS_LENGTH_MS = 40
+TIMER_MS = 10
+
+
+class ScriptedPin:
+    """Button pin pressed for PRESS_LENGTH_MS every PRESS_PERIOD_MS"""
+
+    def __init__(self, start_us) -> None:
+        self.start_us = start_us
+        self.reads = 0
+
+    def phase_us(self):
+        elapsed = time.ticks_diff(time.ticks_us(), self.start_us)
+        return elapsed % (PRESS_PERIOD_MS * 1000)
+
+    def value(self):
+        self.reads += 1
+        return 0 if self.phase_us() < PRESS_LENGTH_MS * 1000 else 1
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.worst = 0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.worst = max(self.worst, value)
+
+    def __str__(self):
+        mean = self.total / self.count if self.count else 0
+        return f"mean {mean / 1000:.2f} ms, max {self.worst / 1000:.2f} ms"
+
+
+def make_buttons(start_us, presses):
+    buttons = []
+    for i in range(3):
+        pin = ScriptedPin(start_us)
+        button = ButtonController(pin, f"Button {i}")
+        button.register_event("on_press", lambda pin=pin: presses.add(pin.phase_us()))
+        buttons.append(button)
+    return buttons
+
+
+async def timer(lateness):
+    while True:
+        start = time.ticks_us()
+        await asyncio.sleep_ms(TIMER_MS)
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        lateness.add(max(0, elapsed - TIMER_MS * 1000))
+
+
+def report(name, buttons, presses, lateness):
+    reads = sum(button.button.reads for button in buttons)
+    print(f"{name}:")
+    print(f"  button press latency: {presses}")
+    print(f"  timer lateness: {lateness}")
+    print(f"  button reads: {reads} ({reads * 1000 // DURATION_MS}/s)")
+
+
+def pump():
+    """The loop main.py used to run"""
+    presses = Stats()
+    lateness = Stats()
+    buttons = make_buttons(time.ticks_us(), presses)
+    loop = asyncio.new_event_loop()
+
+    async def stop():
+        loop.stop()
+
+    task = loop.create_task(timer(lateness))
+    deadline = time.ticks_add(time.ticks_ms(), DURATION_MS)
+    while time.ticks_diff(deadline, time.ticks_ms()) > 0:
+        for button in buttons:
+            button.process()
+        loop.create_task(stop())
+        loop.run_forever()
+    task.cancel()
+    # Let the timer task handle its cancellation
+    loop.create_task(stop())
+    loop.run_forever()
+    report("stop/run_forever pump", buttons, presses, lateness)
+
+
+def tasks():
+    """Buttons and the timer as tasks of one asyncio program"""
+    presses = Stats()
+    lateness = Stats()
+    buttons = make_buttons(time.ticks_us(), presses)
+    asyncio.new_event_loop()
+
+    async def main():
+        running = [asyncio.create_task(button.run()) for button in buttons]
+        running.append(asyncio.create_task(timer(lateness)))
+        await asyncio.sleep_ms(DURATION_MS)
+        for task in running:
+            task.cancel()
+
+    asyncio.run(main())
+    report("asyncio tasks", buttons, presses, lateness)
+
+
+logging.getLogger("BUTTONCONTROLLER").setLevel(logging.WARNING)
+pump()
+tasks()
@@ -0,0 +1,38 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare the size and the streaming decode time of the same image as a
+24-bit bitmap and as a QOI file.
+"""
+
+import io
+from common import bench, fake_display, make_bitmap, make_qoi, measure_alloc
+from libs.display.bitmap import Bitmap
+from libs.display.qoi import QOI
+
+WIDTH = 240
+HEIGHT = 135
+
+
+def main():
+    bitmap = make_bitmap(WIDTH, HEIGHT, 24)
+    qoi = make_qoi(WIDTH, HEIGHT)
+    display, spi = fake_display(framebuffer=bytearray(WIDTH * HEIGHT * 2))
+    print(f"24-bit bitmap: {len(bitmap)} bytes")
+    print(f"QOI: {len(qoi)} bytes")
+
+    def decode_bitmap():
+        Bitmap.draw_stream(io.BytesIO(bitmap), display)
+
+    def decode_qoi():
+        QOI.draw_stream(io.BytesIO(qoi), display)
+
+    bench("Bitmap.draw_stream", decode_bitmap, 3)
+    print(f"  allocated: {measure_alloc(decode_bitmap)} bytes")
+    bench("QOI.draw_stream", decode_qoi, 3)
+    print(f"  allocated: {measure_alloc(decode_qoi)} bytes")
+
+
+main()
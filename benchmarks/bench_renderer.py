@@ -0,0 +1,65 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare text updates drawn and flushed one by one with the same updates
+queued on a Renderer, counting the flushes and bytes sent to the panel.
+"""
+
+import asyncio
+from common import fake_display
+from libs.display.renderer import Renderer
+from libs.display.widgets import Label, Scene
+
+UPDATES = 30
+# Updates received before the renderer task runs
+BURST = 3
+WIDTH = 240
+HEIGHT = 135
+
+
+def draw_text(display, label, text):
+    label.set(text)
+    label.render(display)
+
+
+def main():
+    display, spi = fake_display(framebuffer=bytearray(WIDTH * HEIGHT * 2))
+    display.fill(0)
+    display.flush()
+    scene = Scene(display)
+    label = scene.add(Label(10, 20))
+    scene.render()
+
+    display.reset_counters()
+    spi.reset()
+    flushes = 0
+    for i in range(UPDATES):
+        draw_text(display, label, f"Update {i:03d}")
+        display.flush()
+        flushes += 1
+    print(f"direct: {flushes} flushes, {spi.bytes} bytes")
+
+    renderer = Renderer(display)
+
+    async def queued():
+        renderer.start()
+        for i in range(UPDATES):
+            renderer.submit("text", draw_text, display, label, f"Queued {i:03d}")
+            if i % BURST == BURST - 1:
+                await asyncio.sleep_ms(0)
+                await asyncio.sleep_ms(0)
+        await asyncio.sleep_ms(10)
+        renderer.stop()
+
+    display.reset_counters()
+    spi.reset()
+    asyncio.run(queued())
+    print(
+        f"renderer: {renderer.batches} flushes, {spi.bytes} bytes, "
+        f"{renderer.coalesced} updates coalesced"
+    )
+
+
+main()
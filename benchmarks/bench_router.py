@@ -0,0 +1,101 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Time the route matching of tinyweb with a few hundred routes, against the
+former lookup: a dict of explicit URLs, then a dict of URLs with one
+trailing parameter, found by cutting the path at its last slash.
+
+The trie compares segments with viper functions: run it with the
+MicroPython unix port or on the device, where they are native code.
+"""
+
+from common import bench, measure_alloc
+import libs.network.tinyweb as tinyweb
+
+RESOURCES = 60
+LOOKUPS = 1000
+
+
+async def handler(req, resp, *args):
+    pass
+
+
+def legacy_maps(routes):
+    """Explicit and parameterized maps of the former add_route()"""
+    explicit = {}
+    parameterized = {}
+    for url in routes:
+        if url.endswith(">"):
+            parameterized[url[: url.rfind("<")].encode()] = handler
+        else:
+            explicit[url.encode()] = handler
+    return explicit, parameterized
+
+
+def legacy_find(explicit, parameterized, path):
+    if path in explicit:
+        return explicit[path]
+    idx = path.rfind(b"/") + 1
+    path2 = path[:idx]
+    if len(path2) > 0 and path2 in parameterized:
+        path[idx:].decode()
+        return parameterized[path2]
+    return None
+
+
+def main():
+    app = tinyweb.webserver()
+    routes = []
+    for i in range(RESOURCES):
+        routes.append(f"/api/res{i}")
+        routes.append(f"/api/res{i}/items")
+        routes.append(f"/api/res{i}/items/<int:id>")
+        routes.append(f"/api/res{i}/<name>")
+        routes.append(f"/api/res{i}/<name>/history/<int:window>")
+    for url in routes:
+        app.add_route(url, handler)
+    print(f"{len(routes)} routes, {LOOKUPS} lookups per run")
+
+    # Paths the former lookup can match too
+    paths = [
+        b"/api/res0",
+        b"/api/res59/items",
+        b"/api/res30/items/1234",
+        b"/api/res45/temperature",
+        b"/api/unknown/path",
+    ]
+    req = tinyweb.request(None)
+    req.method = b"GET"
+
+    def trie():
+        for i in range(LOOKUPS):
+            req.path = paths[i % len(paths)]
+            app._find_url_handler(req)
+
+    explicit, parameterized = legacy_maps(routes)
+
+    def legacy():
+        for i in range(LOOKUPS):
+            legacy_find(explicit, parameterized, paths[i % len(paths)])
+
+    bench("trie", trie)
+    bench("former maps", legacy)
+
+    def multi():
+        req.path = b"/api/res12/gyro/history/60"
+        for _ in range(LOOKUPS):
+            app._find_url_handler(req)
+
+    bench("trie, 2 parameters", multi)
+
+    # Static segments are compared in place: only the parameter values and
+    # the argument tuple are allocated
+    for path in (b"/api/res30/items/1234", b"/api/res12/gyro/history/60"):
+        req.path = path
+        size = measure_alloc(lambda: app._find_url_handler(req))
+        print(f"{path.decode()}: {size} bytes allocated")
+
+
+main()
@@ -0,0 +1,73 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Count SPI transactions, bytes and spi.write() calls of common display
+operations, with and without the window address cache.
+"""
+
+from common import bench, fake_display
+
+REPEAT = 100
+
+
+def report(name, display, spi, f):
+    display.reset_counters()
+    spi.reset()
+    elapsed = bench(name, f, repeat=1)
+    print(
+        f"  transactions: {display.transactions}, bytes: {display.bytes_sent}, "
+        f"spi.write calls: {spi.calls}"
+    )
+    return elapsed
+
+
+def main():
+    display, spi = fake_display(buf=bytearray(4096))
+
+    def status_line(invalidate):
+        for i in range(REPEAT):
+            if invalidate:
+                display._invalidate_window()
+            display.text(f"{i:05d}", 10, 20, 0xFFFF, 0x0000)
+
+    report(
+        f"{REPEAT} status lines, no window cache",
+        display,
+        spi,
+        lambda: status_line(True),
+    )
+    report(
+        f"{REPEAT} status lines, window cache",
+        display,
+        spi,
+        lambda: status_line(False),
+    )
+
+    def pixels():
+        for i in range(REPEAT):
+            display.pixel(i, i % 135, 0xF800)
+
+    report(f"{REPEAT} pixels", display, spi, pixels)
+
+    def batched_pixels():
+        display.begin()
+        pixels()
+        display.end()
+
+    report(f"{REPEAT} pixels in one batch", display, spi, batched_pixels)
+    report(
+        "diagonal line", display, spi, lambda: display.line(0, 0, 239, 134, 0x07E0)
+    )
+
+    display, spi = fake_display(framebuffer=bytearray(240 * 135 * 2))
+
+    def retained_line():
+        display.line(0, 0, 239, 134, 0x07E0)
+        display.flush()
+
+    report("retained diagonal line + flush", display, spi, retained_line)
+
+
+main()
@@ -0,0 +1,65 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compare a dashboard repainted from scratch on every tick with the same
+dashboard built from widgets, counting the bytes sent to the panel.
+"""
+
+from common import bench, fake_display
+from libs.display.widgets import Bar, Scene, ValueField
+
+TICKS = 60
+WIDTH = 240
+HEIGHT = 135
+
+
+def readings(tick):
+    """Clock, temperature and acceleration of a fake tick"""
+    seconds = 12 * 3600 + 30 * 60 + tick
+    clock = (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    temperature = 24.5 + (tick % 10) / 10
+    acceleration = (0.01 * (tick % 3), -0.02, 0.98 + 0.01 * (tick % 2))
+    return clock, temperature, acceleration
+
+
+def main():
+    display, spi = fake_display(framebuffer=bytearray(WIDTH * HEIGHT * 2))
+
+    def repaint():
+        for tick in range(TICKS):
+            clock, temperature, acceleration = readings(tick)
+            display.fill(0)
+            display.text("{:02d}:{:02d}:{:02d}".format(*clock), 10, 10, 0xFFFF, 0)
+            display.text("{:.1f} C".format(temperature), 10, 30, 0xFFFF, 0)
+            display.text("{:.2f} {:.2f} {:.2f}".format(*acceleration), 10, 50, 0xFFFF, 0)
+            display.fill_rect(10, 70, int(temperature * 4), 8, 0xF800)
+            display.flush()
+
+    display.fill(0)
+    display.flush()
+    scene = Scene(display)
+    clock_field = scene.add(ValueField(10, 10, "{:02d}:{:02d}:{:02d}"))
+    temperature_field = scene.add(ValueField(10, 30, "{:.1f} C"))
+    acceleration_field = scene.add(ValueField(10, 50, "{:.2f} {:.2f} {:.2f}"))
+    temperature_bar = scene.add(Bar(10, 70, 200, 8, 0, 50, 0xF800))
+    scene.render()
+
+    def widgets():
+        for tick in range(TICKS):
+            clock, temperature, acceleration = readings(tick)
+            clock_field.set(clock)
+            temperature_field.set(temperature)
+            acceleration_field.set(acceleration)
+            temperature_bar.set(temperature)
+            scene.render()
+
+    for name, f in (("full repaint", repaint), ("widgets", widgets)):
+        display.reset_counters()
+        spi.reset()
+        bench(f"{TICKS} ticks, {name}", f, 1)
+        print(f"  bytes per tick: {display.bytes_sent // TICKS}")
+
+
+main()
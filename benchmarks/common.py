@@ -0,0 +1,190 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Helpers shared by the benchmarks: fake SPI bus and pins, and a timer.
+"""
+
+import gc
+import struct
+import sys
+import time
+
+# Make the application modules importable when running from the repository
+# root with the MicroPython unix port. On the device they are already at "/".
+sys.path.append("cplus2_admin")
+
+
+class FakePin:
+    def __init__(self) -> None:
+        self.state = 0
+
+    def on(self):
+        self.state = 1
+
+    def off(self):
+        self.state = 0
+
+    def value(self, value=None):
+        if value is None:
+            return self.state
+        self.state = value
+
+
+class FakeSPI:
+    """SPI bus that only counts calls and bytes written."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.calls += 1
+        self.bytes += len(data)
+
+
+def fake_display(**kwargs):
+    """Create an ST7789 for the M5StickC Plus2 panel on a fake SPI bus."""
+    from libs.display.st7789 import ST7789
+
+    params = {
+        "width": 240,
+        "height": 135,
+        "xstart": 40,
+        "ystart": 52,
+        "reset": FakePin(),
+        "dc": FakePin(),
+        "cs": FakePin(),
+    }
+    params.update(kwargs)
+    spi = FakeSPI()
+    display = ST7789(spi, **params)
+    display.reset_counters()
+    spi.reset()
+    return display, spi
+
+
+def bench(name, f, repeat=5):
+    """Run f repeat times and print the best time in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.ticks_us()
+        f()
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        if best is None or elapsed < best:
+            best = elapsed
+    print(f"{name}: {best / 1000:.2f} ms")
+    return best
+
+
+def measure_alloc(f):
+    """Run f with the garbage collector disabled and return the bytes it allocated."""
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.mem_alloc()
+        f()
+        return gc.mem_alloc() - before
+    finally:
+        gc.enable()
+        gc.collect()
+
+
+def make_bitmap(width=240, height=135, bits_per_pixel=24, rgb565=False):
+    """Build a deterministic gradient bitmap file used as benchmark fixture."""
+    bytes_per_pixel = bits_per_pixel // 8
+    row_padded = (width * bits_per_pixel + 31) // 32 * 4
+    masks = b""
+    compression = 0
+    if rgb565:
+        masks = struct.pack("<III", 0xF800, 0x07E0, 0x001F)
+        compression = 3
+    offset = 54 + len(masks)
+    size = offset + row_padded * height
+    data = bytearray(size)
+    struct.pack_into("<2sIHHI", data, 0, b"BM", size, 0, 0, offset)
+    struct.pack_into(
+        "<IiiHHIIiiII",
+        data,
+        14,
+        40,
+        width,
+        height,
+        1,
+        bits_per_pixel,
+        compression,
+        row_padded * height,
+        2835,
+        2835,
+        0,
+        0,
+    )
+    data[54:offset] = masks
+    for y in range(height):
+        row = offset + y * row_padded
+        for x in range(width):
+            r, g, b = _gradient_pixel(width, height, x, y)
+            i = row + x * bytes_per_pixel
+            if bits_per_pixel == 24:
+                data[i] = b
+                data[i + 1] = g
+                data[i + 2] = r
+            else:
+                if rgb565:
+                    pixel = (r & 0xF8) << 8 | (g & 0xFC) << 3 | b >> 3
+                else:
+                    pixel = (r & 0xF8) << 7 | (g & 0xF8) << 2 | b >> 3
+                data[i] = pixel & 0xFF
+                data[i + 1] = pixel >> 8
+    return bytes(data)
+
+
+def _gradient_pixel(width, height, x, y):
+    return (x * 255) // width, (y * 255) // height, ((x + y) * 3) & 0xFF
+
+
+def make_qoi(width=240, height=135):
+    """Encode the image of make_bitmap as a QOI file. Bitmap rows are
+    stored bottom-up, QOI rows top-down."""
+    data = bytearray(struct.pack(">4sIIBB", b"qoif", width, height, 3, 0))
+    index = [(0, 0, 0, 0)] * 64
+    previous = (0, 0, 0)
+    run = 0
+    for y in range(height):
+        for x in range(width):
+            pixel = _gradient_pixel(width, height, x, height - 1 - y)
+            if pixel == previous:
+                run += 1
+                if run == 62:
+                    data.append(0xC0 | (run - 1))
+                    run = 0
+                continue
+            if run:
+                data.append(0xC0 | (run - 1))
+                run = 0
+            r, g, b = pixel
+            h = (r * 3 + g * 5 + b * 7 + 255 * 11) % 64
+            if index[h] == (r, g, b, 255):
+                data.append(h)
+            else:
+                index[h] = (r, g, b, 255)
+                dr = (r - previous[0] + 128) % 256 - 128
+                dg = (g - previous[1] + 128) % 256 - 128
+                db = (b - previous[2] + 128) % 256 - 128
+                if -2 <= dr < 2 and -2 <= dg < 2 and -2 <= db < 2:
+                    data.append(0x40 | (dr + 2) << 4 | (dg + 2) << 2 | (db + 2))
+                elif -32 <= dg < 32 and -8 <= dr - dg < 8 and -8 <= db - dg < 8:
+                    data.append(0x80 | (dg + 32))
+                    data.append((dr - dg + 8) << 4 | (db - dg + 8))
+                else:
+                    data.append(0xFE)
+                    data.extend(bytes(pixel))
+            previous = pixel
+    if run:
+        data.append(0xC0 | (run - 1))
+    data.extend(b"\x00" * 7 + b"\x01")
+    return bytes(data)
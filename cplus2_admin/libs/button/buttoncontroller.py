@@ -5,10 +5,13 @@ https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
 """
 
 from machine import Pin  # type: ignore
+import asyncio
 import libs.std.logging as logging
 
 
 class ButtonController:
+    POLL_INTERVAL_MS = 20
+
     def __init__(self, button: Pin, name) -> None:
         self.logger: logging.Logger = logging.getLogger("BUTTONCONTROLLER")
         self.button = button
@@ -32,6 +35,12 @@ class ButtonController:
             self._trigger_event("on_down")
         self.last_state = temp_state
 
+    async def run(self):
+        """Poll the button, sleeping between reads"""
+        while True:
+            self.process()
+            await asyncio.sleep_ms(self.POLL_INTERVAL_MS)
+
     def _trigger_event(self, event_type):
         if event_type in ["on_release", "on_press", "on_down"]:
             self.logger.info(f"{self.name} {event_type}")
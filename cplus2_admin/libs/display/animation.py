@@ -0,0 +1,422 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Animation files and a player for animations and image slideshows, running
+as an asyncio task next to the web server.
+
+Layout:
+
+    magic     4 bytes   b"A565"
+    width     uint16    little-endian
+    height    uint16    little-endian
+    frames    uint16    little-endian
+    fps       uint8
+    reserved  uint8
+
+Each frame is a header followed by its payload:
+
+    encoding  uint8     0 = raw, 1 = run-length encoded, 2 = delta
+    reserved  uint8
+    size      uint32    little-endian, payload bytes
+
+Raw and run-length encoded payloads hold the pixels of a whole frame, as in
+libs.display.rgb565file. Delta payloads are run-length records too, but a
+count with the high bit set skips pixels, keeping those of the previous
+frame; the color of a skip record is ignored.
+
+The player needs a retained display. While a frame is sent to the panel
+with flush_async(), the first bytes of the next frame are read from flash.
+Late frames are decoded without being sent, and frames before a later full
+frame are not decoded at all.
+"""
+
+import asyncio
+import struct
+import time
+from array import array
+
+import libs.std.logging as logging
+from libs.display.bitmap import Bitmap, RawDecoder
+from libs.display.qoi import QOI
+from libs.display.rgb565file import RGB565File, RLEDecoder
+
+_MAGIC = b"A565"
+_HEADER_FORMAT = "<4sHHHBB"
+_HEADER_SIZE = 12
+_FRAME_HEADER_FORMAT = "<BBI"
+_FRAME_HEADER_SIZE = 6
+_SKIP = 0x8000
+_CHUNK_SIZE = 1024
+_PREFETCH_SIZE = 8192
+# Achieved FPS is measured over windows of this length
+_FPS_WINDOW_MS = 1000
+
+
+class Animation:
+    RAW = 0
+    RLE = 1
+    DELTA = 2
+    HEADER_SIZE = _HEADER_SIZE
+    FRAME_HEADER_SIZE = _FRAME_HEADER_SIZE
+
+    def __init__(self, f) -> None:
+        """Read the header of an open file and index its frames"""
+        self.file = f
+        magic, self.width, self.height, self.count, self.fps, _ = struct.unpack(
+            _HEADER_FORMAT, f.read(_HEADER_SIZE)
+        )
+        if magic != _MAGIC:
+            raise Exception("Wrong file format: expecting an animation file")
+        if not self.count or not self.fps:
+            raise Exception("Wrong animation: expecting frames and FPS")
+        # Payload offset, size and encoding of each frame
+        self.offsets = array("I", bytes(4 * self.count))
+        self.sizes = array("I", bytes(4 * self.count))
+        self.encodings = bytearray(self.count)
+        offset = _HEADER_SIZE
+        header = bytearray(_FRAME_HEADER_SIZE)
+        for i in range(self.count):
+            f.seek(offset)
+            if f.readinto(header) != _FRAME_HEADER_SIZE:
+                raise Exception("Wrong file size: expecting more frames")
+            encoding, _, size = struct.unpack(_FRAME_HEADER_FORMAT, header)
+            if encoding > Animation.DELTA or (i == 0 and encoding == Animation.DELTA):
+                raise Exception("Wrong encoding: expecting raw, RLE or delta")
+            self.encodings[i] = encoding
+            self.offsets[i] = offset + _FRAME_HEADER_SIZE
+            self.sizes[i] = size
+            offset += _FRAME_HEADER_SIZE + size
+
+    def keyframe(self, index):
+        """Return the last full frame at or before index"""
+        while self.encodings[index] == Animation.DELTA:
+            index -= 1
+        return index
+
+
+class DeltaDecoder:
+    """Incremental decoder for delta frames, drawing only the changed runs"""
+
+    def __init__(self, display, width=240, height=135) -> None:
+        self.display = display
+        self.width = width
+        self.height = height
+        self.record = bytearray(4)
+        self.reset()
+
+    def reset(self):
+        """Start a new frame"""
+        self.record_fill = 0
+        self.x = 0
+        self.y = 0
+
+    def feed(self, data):
+        """Consume a chunk of records"""
+        data = memoryview(data)
+        while len(data):
+            size = min(len(data), 4 - self.record_fill)
+            self.record[self.record_fill : self.record_fill + size] = data[:size]
+            self.record_fill += size
+            data = data[size:]
+            if self.record_fill == 4:
+                self.record_fill = 0
+                self._run(self.record[0] | self.record[1] << 8)
+
+    def _run(self, count):
+        skip = count & _SKIP
+        count &= ~_SKIP
+        color = self.record[2] << 8 | self.record[3]
+        while count:
+            if self.y >= self.height:
+                raise Exception("Wrong file size: too many pixels")
+            size = min(count, self.width - self.x)
+            if not skip:
+                self.display.hline(self.x, self.y, size, color)
+            self.x += size
+            count -= size
+            if self.x == self.width:
+                self.x = 0
+                self.y += 1
+
+    def close(self):
+        """Check that the whole frame was received"""
+        if self.y < self.height or self.record_fill:
+            raise Exception("Wrong file size: expecting a complete delta frame")
+
+
+class Player:
+    """Play an animation file or a list of images on a retained display.
+
+    Only one playback runs at a time; starting another one stops it. The
+    player owns the screen while it plays. Each frame is drawn and sent
+    while holding lock, e.g. the one of a libs.display.renderer.Renderer.
+    on_done() is called when a playback ends by itself, at its end or on an
+    error, to give the screen back; not when it is stopped or replaced.
+    """
+
+    def __init__(
+        self, display, prefetch_size=_PREFETCH_SIZE, lock=None, on_done=None
+    ) -> None:
+        if not display.retained:
+            raise ValueError("retained framebuffer required")
+        self.logger: logging.Logger = logging.getLogger("PLAYER")
+        self.display = display
+        self.lock = asyncio.Lock() if lock is None else lock
+        self.task = None
+        self.on_done = on_done
+        self.source = None
+        # Allocated on the first animation
+        self.buf = None
+        self.prefetch_size = prefetch_size
+        # First bytes of the next frame, read while the current one is sent
+        self.prefetch = None
+        self.prefetched = 0
+        self.prefetched_index = -1
+        self.error = None
+        # Raw, RLE and delta decoders of the animation being played
+        self.decoders = None
+        self._reset_stats(0)
+
+    def _reset_stats(self, target_fps):
+        self.target_fps = target_fps
+        self.frame = 0
+        self.frames = 0
+        self.shown = 0
+        self.skipped = 0
+        self.fps = 0
+        self._window_start = time.ticks_ms()
+        self._window_shown = 0
+
+    @property
+    def playing(self):
+        return self.task is not None
+
+    def status(self):
+        return {
+            "playing": self.playing,
+            "source": self.source,
+            "frame": self.frame,
+            "frames": self.frames,
+            "target_fps": self.target_fps,
+            "fps": self.fps,
+            "shown": self.shown,
+            "skipped": self.skipped,
+            "error": self.error,
+        }
+
+    def play(self, path, fps=None, loop=True):
+        """Start playing an animation file. fps overrides the file rate."""
+        self.stop()
+        self.source = path
+        self.task = asyncio.create_task(self._play(path, fps, loop))
+
+    def slideshow(self, paths, interval_ms=5000, loop=True):
+        """Start showing images (RGB565, QOI or BMP files) in turn. The
+        slideshow ends after a pass where no image could be shown."""
+        if not paths:
+            raise ValueError("no images")
+        if interval_ms <= 0:
+            raise ValueError("interval must be positive")
+        self.stop()
+        self.source = paths
+        self.task = asyncio.create_task(self._slideshow(paths, interval_ms, loop))
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _play(self, path, fps, loop):
+        self.error = None
+        if self.prefetch is None:
+            self.buf = bytearray(_CHUNK_SIZE)
+            self.prefetch = bytearray(self.prefetch_size)
+        try:
+            with open(path, "rb") as f:
+                animation = Animation(f)
+                if (
+                    animation.width != self.display.width
+                    or animation.height != self.display.height
+                ):
+                    raise Exception(
+                        f"Wrong image size: excepting {self.display.width}x{self.display.height} dimension"
+                    )
+                fps = fps or animation.fps
+                self._reset_stats(fps)
+                self.frames = animation.count
+                self.decoders = (
+                    RawDecoder(self.display, animation.width, animation.height),
+                    RLEDecoder(self.display, animation.width, animation.height),
+                    DeltaDecoder(self.display, animation.width, animation.height),
+                )
+                while True:
+                    await self._play_once(animation, 1000 / fps)
+                    if not loop:
+                        break
+        except Exception as e:
+            self.error = str(e)
+            self.logger.warning(f"Animation stopped: {self.error}")
+        finally:
+            self.prefetched_index = -1
+            self._done()
+
+    async def _play_once(self, animation, frame_ms):
+        display = self.display
+        start = time.ticks_ms()
+        index = 0
+        current = -1
+        while index < animation.count:
+            async with self.lock:
+                # Catch up from the current frame or from a later full frame
+                first = current + 1
+                keyframe = animation.keyframe(index)
+                if keyframe > first:
+                    self.skipped += keyframe - first
+                    first = keyframe
+                for late in range(first, index):
+                    self._decode(animation, late)
+                    self.skipped += 1
+                self._decode(animation, index)
+                current = index
+                self.frame = index
+
+                flush = asyncio.create_task(display.flush_async())
+                if index + 1 < animation.count:
+                    await self._prefetch(animation, index + 1)
+                await flush
+                self._count_frame()
+
+            elapsed = time.ticks_diff(time.ticks_ms(), start)
+            index += 1
+            wait = int(index * frame_ms) - elapsed
+            if wait > 0:
+                await asyncio.sleep_ms(wait)
+            else:
+                # Show the frame due now, skipping those in between, but
+                # always end on the last one
+                if index < animation.count:
+                    index = min(
+                        max(index, int(elapsed / frame_ms)), animation.count - 1
+                    )
+                await asyncio.sleep_ms(0)
+
+    def _count_frame(self):
+        self.shown += 1
+        self._window_shown += 1
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self._window_start)
+        if elapsed >= _FPS_WINDOW_MS:
+            self.fps = round(self._window_shown * 1000 / elapsed, 1)
+            self._window_start = now
+            self._window_shown = 0
+
+    async def _prefetch(self, animation, index):
+        """Read the first bytes of a frame, yielding between chunks so the
+        flush of the current frame goes on"""
+        f = animation.file
+        f.seek(animation.offsets[index])
+        size = min(animation.sizes[index], len(self.prefetch))
+        prefetch = memoryview(self.prefetch)
+        self.prefetched = 0
+        self.prefetched_index = index
+        while self.prefetched < size:
+            end = min(self.prefetched + _CHUNK_SIZE, size)
+            read = f.readinto(prefetch[self.prefetched : end])
+            if not read:
+                break
+            self.prefetched += read
+            await asyncio.sleep_ms(0)
+
+    def _decode(self, animation, index):
+        """Draw a frame on the framebuffer, using the prefetched bytes"""
+        f = animation.file
+        size = animation.sizes[index]
+        encoding = animation.encodings[index]
+        display = self.display
+        done = 0
+        if encoding == Animation.RAW and display.palette is None:
+            # Raw frames are read straight into the framebuffer
+            frame = display.frame
+            if len(frame) < size:
+                raise Exception("Wrong file size: frame is too large")
+            if self.prefetched_index == index:
+                done = self.prefetched
+                frame[:done] = memoryview(self.prefetch)[:done]
+            f.seek(animation.offsets[index] + done)
+            if f.readinto(frame[done:size]) != size - done:
+                raise Exception("Wrong file size: frame is incomplete")
+            self.prefetched_index = -1
+            display.damage(0, 0, display.width, display.height)
+            return
+
+        decoder = self.decoders[encoding]
+        decoder.reset()
+        if self.prefetched_index == index:
+            done = self.prefetched
+            decoder.feed(memoryview(self.prefetch)[:done])
+        self.prefetched_index = -1
+        f.seek(animation.offsets[index] + done)
+        chunk = memoryview(self.buf)
+        while done < size:
+            read = f.readinto(chunk[: min(len(chunk), size - done)])
+            if not read:
+                raise Exception("Wrong file size: frame is incomplete")
+            decoder.feed(chunk[:read])
+            done += read
+        decoder.close()
+
+    async def _slideshow(self, paths, interval_ms, loop):
+        self.error = None
+        try:
+            self._reset_stats(round(1000 / interval_ms, 1))
+            self.frames = len(paths)
+            while True:
+                shown = 0
+                for i, path in enumerate(paths):
+                    self.frame = i
+                    drawn = False
+                    async with self.lock:
+                        try:
+                            self._draw_image(path)
+                            drawn = True
+                        except Exception as e:
+                            # Keep going with the next images
+                            self.error = f"{path}: {str(e)}"
+                            self.logger.warning(f"Image skipped: {self.error}")
+                            self.skipped += 1
+                        if drawn:
+                            await self.display.flush_async()
+                    if drawn:
+                        shown += 1
+                        self._count_frame()
+                        await asyncio.sleep_ms(interval_ms)
+                    else:
+                        # An uncontended lock does not yield
+                        await asyncio.sleep_ms(0)
+                if not loop or not shown:
+                    break
+        finally:
+            self._done()
+
+    def _done(self):
+        # A stopped task finishes after the next one was started
+        if self.task is asyncio.current_task():
+            self.task = None
+            if self.on_done is not None:
+                self.on_done()
+
+    def _draw_image(self, path):
+        with open(path, "rb") as f:
+            magic = f.read(4)
+            f.seek(0)
+            if magic == b"qoif":
+                QOI.draw_stream(f, self.display, self.display.width, self.display.height)
+                return
+            if magic[:2] == b"BM":
+                Bitmap.draw_stream(
+                    f, self.display, self.display.width, self.display.height
+                )
+                return
+        RGB565File.draw(path, self.display)
@@ -7,13 +7,94 @@ https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
 import struct
 import ubinascii  # type: ignore
 import libs.display.colors as colors
+import libs.display.colorconv as colorconv
 
 
 class Bitmap:
     FILE_HEADER_SIZE = 14
     DIB_HEADER_SIZE = 40
     HEADERS_SIZE = FILE_HEADER_SIZE + DIB_HEADER_SIZE
+    BITFIELDS_SIZE = 12
+    BI_RGB = 0
+    BI_BITFIELDS = 3
     BASE64_HEADER = "data:image/bmp;base64,"
+    # 960 base64 characters decode to 720 bytes: one 240 pixels 24-bit row
+    BASE64_CHUNK_SIZE = 960
+    CHUNK_SIZE = 720
+    # 72 base64 characters decode to the 54 bytes of the file and DIB headers
+    BASE64_HEADERS_SIZE = 72
+
+    @staticmethod
+    def draw_base64bitmap(
+        base64: str, display, expected_width=240, expected_height=135
+    ):
+        """Decode a base64 bitmap in chunks and draw it row by row"""
+        if not base64.startswith(Bitmap.BASE64_HEADER):
+            raise Exception(f"Wrong base64 format: expecting {Bitmap.BASE64_HEADER}")
+
+        decoder = BitmapDecoder(display, expected_width, expected_height)
+        start = len(Bitmap.BASE64_HEADER)
+        while start < len(base64):
+            end = start + Bitmap.BASE64_CHUNK_SIZE
+            decoder.feed(ubinascii.a2b_base64(base64[start:end]))
+            start = end
+        decoder.close()
+
+    @staticmethod
+    def check_base64bitmap(base64: str, expected_width=240, expected_height=135):
+        """Decode only the headers of a base64 bitmap and raise if it can not
+        be drawn, so the request can be rejected before the image is queued"""
+        if not base64.startswith(Bitmap.BASE64_HEADER):
+            raise Exception(f"Wrong base64 format: expecting {Bitmap.BASE64_HEADER}")
+
+        start = len(Bitmap.BASE64_HEADER)
+        headers = base64[start : start + Bitmap.BASE64_HEADERS_SIZE]
+        if len(headers) < Bitmap.BASE64_HEADERS_SIZE:
+            raise Exception("Wrong file size: expecting a valid bitmap file")
+        decoder = BitmapDecoder(None, expected_width, expected_height)
+        decoder.feed(ubinascii.a2b_base64(headers))
+
+    @staticmethod
+    def draw_stream(stream, display, expected_width=240, expected_height=135):
+        """Read a bitmap from a stream (e.g. a file) and draw it row by row"""
+        decoder = BitmapDecoder(display, expected_width, expected_height)
+        buf = bytearray(Bitmap.CHUNK_SIZE)
+        chunk = memoryview(buf)
+        while True:
+            size = stream.readinto(buf)
+            if not size:
+                break
+            decoder.feed(chunk[:size])
+        decoder.close()
+
+    @staticmethod
+    def rgb565_header(width, height):
+        """Headers of a bottom-up 16-bit RGB565 (bit fields) bitmap, followed
+        by its little-endian rows padded to 4 bytes"""
+        offset = Bitmap.HEADERS_SIZE + Bitmap.BITFIELDS_SIZE
+        image_size = ((width * 2 + 3) & ~3) * height
+        header = bytearray(offset)
+        struct.pack_into(
+            "<2sIHHI", header, 0, b"BM", offset + image_size, 0, 0, offset
+        )
+        struct.pack_into(
+            "<IiiHHIIiiII",
+            header,
+            Bitmap.FILE_HEADER_SIZE,
+            Bitmap.DIB_HEADER_SIZE,
+            width,
+            height,
+            1,
+            16,
+            Bitmap.BI_BITFIELDS,
+            image_size,
+            2835,
+            2835,
+            0,
+            0,
+        )
+        struct.pack_into("<III", header, Bitmap.HEADERS_SIZE, 0xF800, 0x07E0, 0x001F)
+        return header
 
     @staticmethod
     def extract_pixels_from_base64bitmap(
@@ -69,15 +150,180 @@ class Bitmap:
             end -= row_padded
         return bitmap_pixels
 
+    @staticmethod
     def argb1555_to_rgb565(argb1555):
         """Convert a 16-bit ARGB1555 value to a 16-bit RGB565 value."""
-        alpha = (argb1555 >> 15) & 0x01
-        red = (argb1555 >> 10) & 0x1F
-        green = (argb1555 >> 5) & 0x1F
-        blue = argb1555 & 0x1F
+        return colorconv.rgb555_to_rgb565(argb1555)
+
+
+class BitmapDecoder:
+    """Incremental bitmap decoder.
+
+    Bytes are pushed with feed() in chunks of any size. Each complete row is
+    converted to big-endian RGB565 in a reusable row buffer and drawn on its
+    own display window, so nothing larger than one row is allocated.
+    """
+
+    def __init__(self, display, expected_width=240, expected_height=135) -> None:
+        self.display = display
+        self.expected_width = expected_width
+        self.expected_height = expected_height
+        self.header = bytearray(Bitmap.HEADERS_SIZE + Bitmap.BITFIELDS_SIZE)
+        self.header_size = Bitmap.HEADERS_SIZE
+        self.position = 0
+        self.pixel_array_offset = 0
+        self.row = None
+        self.row_fill = 0
+        self.rows_left = 0
+
+    def feed(self, data):
+        """Consume a chunk of the bitmap file"""
+        data = memoryview(data)
+        while len(data):
+            if self.position < self.header_size:
+                size = min(len(data), self.header_size - self.position)
+                self.header[self.position : self.position + size] = data[:size]
+                self.position += size
+                data = data[size:]
+                if self.position == self.header_size:
+                    self._parse_header()
+            elif self.position < self.pixel_array_offset:
+                size = min(len(data), self.pixel_array_offset - self.position)
+                self.position += size
+                data = data[size:]
+            elif self.rows_left:
+                size = min(len(data), len(self.row) - self.row_fill)
+                self.row[self.row_fill : self.row_fill + size] = data[:size]
+                self.row_fill += size
+                self.position += size
+                data = data[size:]
+                if self.row_fill == len(self.row):
+                    self._draw_row()
+            else:
+                # Ignore trailing data after the pixel array
+                break
+
+    def close(self):
+        """Check that the whole pixel array was received"""
+        if self.position < self.header_size or self.rows_left:
+            raise Exception("Wrong file size: expecting a valid bitmap file")
+
+    def _parse_header(self):
+        if self.header_size > Bitmap.HEADERS_SIZE:
+            self._parse_bitfields()
+            return
+        if self.header[0:2] != b"\x42\x4D":
+            raise Exception("Wrong file format: expecting a bitmap file")
+
+        file_header_fields = struct.unpack_from("<2sIHHI", self.header)
+        header_fields = struct.unpack_from(
+            "<IiiHHiiiiii", self.header, Bitmap.FILE_HEADER_SIZE
+        )
+
+        self.width = header_fields[1]
+        self.height = abs(header_fields[2])
+        self.top_down = header_fields[2] < 0
+        if self.width != self.expected_width or self.height != self.expected_height:
+            raise Exception(
+                f"Wrong image size: excepting {self.expected_width}x{self.expected_height} dimension"
+            )
+
+        self.bits_per_pixel = header_fields[4]
+        if self.bits_per_pixel not in [16, 24]:
+            raise Exception("Wrong bit count: expecting bitmap with 16 or 24 bits")
+
+        self.compression = header_fields[5]
+        self.is_rgb565 = False
+        if self.compression == Bitmap.BI_BITFIELDS and self.bits_per_pixel == 16:
+            # Color masks follow the 40 bytes DIB header
+            self.header_size += Bitmap.BITFIELDS_SIZE
+        elif self.compression != Bitmap.BI_RGB:
+            raise Exception("Wrong compression: expecting an uncompressed bitmap")
+
+        self.pixel_array_offset = file_header_fields[4]
+        if self.pixel_array_offset < self.header_size:
+            raise Exception("Wrong file size: expecting a valid bitmap file")
+        if self.header_size == Bitmap.HEADERS_SIZE:
+            self._start_pixels()
+
+    def _parse_bitfields(self):
+        masks = struct.unpack_from("<III", self.header, Bitmap.HEADERS_SIZE)
+        if masks == (0xF800, 0x07E0, 0x001F):
+            self.is_rgb565 = True
+        elif masks != (0x7C00, 0x03E0, 0x001F):
+            raise Exception("Wrong color masks: expecting RGB565 or RGB555")
+        self._start_pixels()
+
+    def _start_pixels(self):
+        row_padded = (self.width * self.bits_per_pixel + 31) // 32 * 4
+        self.row = bytearray(row_padded)
+        self.out = bytearray(self.width * 2)
+        self.row_fill = 0
+        self.rows_left = self.height
+
+    def _draw_row(self):
+        src = self.row
+        out = self.out
+        width = self.width
+        little_endian = False
+        if self.bits_per_pixel == 24:
+            colorconv.convert_bgr888(src, out, width)
+        elif self.is_rgb565:
+            # Pixels are already RGB565, only the byte order differs
+            out = src
+            little_endian = True
+        else:
+            colorconv.convert_rgb555(src, out, width)
+
+        self.rows_left -= 1
+        if self.top_down:
+            y = self.height - 1 - self.rows_left
+        else:
+            y = self.rows_left
+        self.display.blit_rgb565(out, 0, y, width, 1, little_endian)
+        self.row_fill = 0
+
+
+class RawDecoder:
+    """Incremental decoder for headerless RGB565 images.
+
+    Same interface as BitmapDecoder: bytes are pushed with feed() and drawn
+    row by row, top to bottom, from a reusable row buffer.
+    """
+
+    def __init__(
+        self, display, width=240, height=135, little_endian=False
+    ) -> None:
+        self.display = display
+        self.width = width
+        self.height = height
+        self.little_endian = little_endian
+        self.row = bytearray(width * 2)
+        self.reset()
 
-        green_565 = green << 1  # Expande de 5 bits para 6 bits
+    def reset(self):
+        """Start a new image of the same size"""
+        self.row_fill = 0
+        self.y = 0
 
-        rgb565 = (red << 11) | (green_565 << 5) | blue
+    def feed(self, data):
+        """Consume a chunk of the image"""
+        data = memoryview(data)
+        while len(data) and self.y < self.height:
+            size = min(len(data), len(self.row) - self.row_fill)
+            self.row[self.row_fill : self.row_fill + size] = data[:size]
+            self.row_fill += size
+            data = data[size:]
+            if self.row_fill == len(self.row):
+                self.display.blit_rgb565(
+                    self.row, 0, self.y, self.width, 1, self.little_endian
+                )
+                self.row_fill = 0
+                self.y += 1
+        if len(data):
+            raise Exception("Wrong file size: expecting a raw RGB565 image")
 
-        return rgb565
+    def close(self):
+        """Check that the whole image was received"""
+        if self.y < self.height:
+            raise Exception("Wrong file size: expecting a raw RGB565 image")
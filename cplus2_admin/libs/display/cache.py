@@ -0,0 +1,82 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+LRU caches: of buffers, limited by their total size in bytes, used for
+rendered glyphs and sprites; and of any values, limited by their number.
+"""
+
+
+class BufferCache:
+    """LRU cache of buffers, limited by their total size in bytes"""
+
+    def __init__(self, max_bytes=8192) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.buffers = {}
+        self.order = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.order[-1] != key:
+            self.order.remove(key)
+            self.order.append(key)
+        return buffer
+
+    def put(self, key, buffer):
+        if key in self.buffers:
+            self.order.remove(key)
+            self.size -= len(self.buffers.pop(key))
+        if len(buffer) > self.max_bytes:
+            return
+        while self.size + len(buffer) > self.max_bytes:
+            self.size -= len(self.buffers.pop(self.order.pop(0)))
+        self.buffers[key] = buffer
+        self.order.append(key)
+        self.size += len(buffer)
+
+    def clear(self):
+        self.buffers = {}
+        self.order = []
+        self.size = 0
+
+
+class LRUCache:
+    """LRU cache of values, limited by their number"""
+
+    def __init__(self, max_items=16) -> None:
+        self.max_items = max_items
+        self.values = {}
+        self.order = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.values.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.order[-1] != key:
+            self.order.remove(key)
+            self.order.append(key)
+        return value
+
+    def put(self, key, value):
+        if key in self.values:
+            self.order.remove(key)
+        elif len(self.order) >= self.max_items:
+            del self.values[self.order.pop(0)]
+        self.values[key] = value
+        self.order.append(key)
+
+    def clear(self):
+        self.values = {}
+        self.order = []
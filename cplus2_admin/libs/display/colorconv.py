@@ -0,0 +1,94 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Color conversion to RGB565 with precomputed tables.
+
+The row functions convert a whole buffer in one call and write big-endian
+RGB565, the byte order expected by the panel.
+"""
+
+import array
+import micropython  # type: ignore
+
+# 8-bit channel to its position in a RGB565 value
+R8_TO_565 = array.array("H", ((r & 0xF8) << 8 for r in range(256)))
+G8_TO_565 = array.array("H", ((g & 0xFC) << 3 for g in range(256)))
+B8_TO_565 = array.array("H", (b >> 3 for b in range(256)))
+
+# 5-bit to 6-bit expansion, replicating the top bit so white stays white
+G5_TO_G6 = bytes((g << 1) | (g >> 4) for g in range(32))
+
+
+def rgb555_to_rgb565(rgb555):
+    """Convert a 16-bit (A)RGB1555 value to a 16-bit RGB565 value."""
+    green = G5_TO_G6[(rgb555 >> 5) & 0x1F]
+    return (rgb555 & 0x7C00) << 1 | green << 5 | rgb555 & 0x1F
+
+
+@micropython.viper
+def _bgr888_row(src, dst, pixels: int, r_lut, g_lut, b_lut):
+    s = ptr8(src)
+    d = ptr8(dst)
+    r = ptr16(r_lut)
+    g = ptr16(g_lut)
+    b = ptr16(b_lut)
+    i = 0
+    j = 0
+    end = pixels * 3
+    while i < end:
+        pixel = r[s[i + 2]] | g[s[i + 1]] | b[s[i]]
+        d[j] = pixel >> 8
+        d[j + 1] = pixel & 0xFF
+        i += 3
+        j += 2
+
+
+@micropython.viper
+def _rgb888_row(src, dst, pixels: int, step: int, r_lut, g_lut, b_lut):
+    s = ptr8(src)
+    d = ptr8(dst)
+    r = ptr16(r_lut)
+    g = ptr16(g_lut)
+    b = ptr16(b_lut)
+    i = 0
+    j = 0
+    end = pixels * step
+    while i < end:
+        pixel = r[s[i]] | g[s[i + 1]] | b[s[i + 2]]
+        d[j] = pixel >> 8
+        d[j + 1] = pixel & 0xFF
+        i += step
+        j += 2
+
+
+@micropython.viper
+def _rgb555_row(src, dst, pixels: int, g_lut):
+    s = ptr8(src)
+    d = ptr8(dst)
+    g6 = ptr8(g_lut)
+    i = 0
+    end = pixels * 2
+    while i < end:
+        low = s[i]
+        high = s[i + 1]
+        green = g6[((high & 0x03) << 3) | (low >> 5)]
+        d[i] = ((high << 1) & 0xF8) | (green >> 3)
+        d[i + 1] = ((green & 0x07) << 5) | (low & 0x1F)
+        i += 2
+
+
+def convert_bgr888(src, dst, pixels):
+    """Convert a row of BGR888 pixels (24-bit BMP order) to RGB565"""
+    _bgr888_row(src, dst, pixels, R8_TO_565, G8_TO_565, B8_TO_565)
+
+
+def convert_rgb888(src, dst, pixels, step=3):
+    """Convert a row of RGB888 pixels to RGB565. Use step=4 for RGBA input"""
+    _rgb888_row(src, dst, pixels, step, R8_TO_565, G8_TO_565, B8_TO_565)
+
+
+def convert_rgb555(src, dst, pixels):
+    """Convert a row of little-endian (A)RGB1555 pixels (16-bit BMP) to RGB565"""
+    _rgb555_row(src, dst, pixels, G5_TO_G6)
@@ -22,6 +22,7 @@
 # Based on https://github.com/devbis/st7789py_mpy
 
 from micropython import const  # type: ignore
+from libs.display.colorconv import R8_TO_565, G8_TO_565, B8_TO_565
 
 BLACK = const(0x0000)
 BLUE = const(0x001F)
@@ -34,9 +35,8 @@ WHITE = const(0xFFFF)
 
 
 def rgb565(r, g=0, b=0):
-    """Convert red, green and blue values (0-255) into a 16-bit 565 encoding."""
-    try:
-        r, g, b = r  # see if the first var is a tuple/list
-    except TypeError:
-        pass
-    return (r & 0xF8) << 8 | (g & 0xFC) << 3 | b >> 3
+    """Convert red, green and blue values (0-255) into a 16-bit 565 encoding.
+    Only the low 8 bits of each value are used."""
+    if not isinstance(r, int):
+        r, g, b = r  # the first var is a tuple/list
+    return R8_TO_565[r & 0xFF] | G8_TO_565[g & 0xFF] | B8_TO_565[b & 0xFF]
@@ -0,0 +1,165 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Scrolling text console for the ST7789 driver.
+
+In the portrait orientations the console uses the hardware vertical scrolling
+of the controller: a new line moves the scroll offset and only that line is
+sent to the panel. The landscape orientations cannot scroll along the screen
+rows, so the visible lines are redrawn instead, through the framebuffer on
+a retained display. The framebuffer is then flushed, together with the
+other regions waiting for the next flush.
+
+    console = Console(display, top=16)
+    console.write("Connected\\n")
+
+While the hardware scrolling is active, the rows of the console must not be
+drawn through the retained framebuffer. Call close() to give them back.
+"""
+
+import framebuf  # type: ignore
+import libs.display.colors as colors
+from libs.display.st7789 import _to_be16
+
+_FONT_SIZE = 8
+
+
+class Console:
+    def __init__(
+        self,
+        display,
+        top=0,
+        height=None,
+        fg=colors.WHITE,
+        bg=colors.BLACK,
+        font=None,
+    ) -> None:
+        if height is None:
+            height = display.height - top
+        self.display = display
+        self.top = top
+        self.fg = fg
+        self.bg = bg
+        self.font = font
+        self.line_height = _FONT_SIZE if font is None else font.height
+        self.rows = height // self.line_height
+        if self.rows == 0:
+            raise ValueError("console too small for one line")
+        self.height = self.rows * self.line_height
+
+        # Lines of the console, oldest first, to redraw without scrolling
+        self.lines = []
+        # Lines written since the last clear and current scroll offset
+        self.count = 0
+        self.offset = 0
+        self.line = bytearray(display.width * self.line_height * 2)
+        self.line_fb = framebuf.FrameBuffer(
+            self.line, display.width, self.line_height, framebuf.RGB565
+        )
+        try:
+            display.vertical_scroll_area(top, self.height)
+            self.hardware = True
+        except ValueError:
+            self.hardware = False
+        self.clear()
+
+    def clear(self):
+        """Clear the console and go back to its first line"""
+        self.lines = []
+        self.count = 0
+        self.offset = 0
+        if not self.hardware:
+            self.display.fill_rect(
+                0, self.top, self.display.width, self.height, self.bg
+            )
+            self.display.flush()
+            return
+        self.display.vertical_scroll(0)
+        self.line_fb.fill(_to_be16(self.bg))
+        self.display.begin()
+        for row in range(self.rows):
+            self.display.write_region(
+                self.line,
+                0,
+                self.top + row * self.line_height,
+                self.display.width,
+                self.line_height,
+            )
+        self.display.end()
+
+    def write(self, s):
+        """Add the lines of s. Lines wider than the screen are clipped."""
+        for line in s.split("\n"):
+            if line:
+                self._add_line(line)
+
+    def _add_line(self, line):
+        if not self.hardware:
+            self.lines.append(line)
+            if len(self.lines) > self.rows:
+                self.lines.pop(0)
+            self._redraw()
+            return
+
+        display = self.display
+        scroll = self.count == self.rows
+        if scroll:
+            # The row of the oldest line becomes the last one
+            self.offset = (self.offset + self.line_height) % self.height
+            row = self.rows - 1
+        else:
+            row = self.count
+            self.count += 1
+        y = self.top + (self.offset + row * self.line_height) % self.height
+        self._render(line)
+        display.begin()
+        if scroll:
+            display.vertical_scroll(self.offset)
+        display.write_region(self.line, 0, y, display.width, self.line_height)
+        display.end()
+
+    def _render(self, line):
+        """Render a line in the line buffer"""
+        fb = self.line_fb
+        fb.fill(_to_be16(self.bg))
+        if self.font is None:
+            fb.text(line, 0, 0, _to_be16(self.fg))
+            return
+        x = 0
+        for ch in line:
+            glyph, width = self.font.glyph(ch, self.fg, self.bg)
+            if x + width > self.display.width:
+                break
+            fb.blit(
+                framebuf.FrameBuffer(glyph, width, self.line_height, framebuf.RGB565),
+                x,
+                0,
+            )
+            x += width
+
+    def _redraw(self):
+        display = self.display
+        display.begin()
+        for row, line in enumerate(self.lines):
+            self._render(line)
+            display.blit_buffer(
+                self.line,
+                0,
+                self.top + row * self.line_height,
+                display.width,
+                self.line_height,
+            )
+        display.end()
+        display.flush()
+
+    def close(self):
+        """Leave the hardware scrolling. On a retained display the console rows
+        are redrawn from the framebuffer on the next flush."""
+        if not self.hardware:
+            return
+        self.hardware = False
+        self.display.vertical_scroll_reset()
+        if self.display.retained:
+            self.display.damage(0, self.top, self.display.width, self.height)
@@ -0,0 +1,245 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Bitmap fonts for the ST7789 driver.
+
+Font files are created with tools/bdf2font.py and have the layout:
+
+    magic    4 bytes           b"MPF1"
+    height   uint8             glyph height in pixels
+    first    uint8             code of the first character
+    count    uint8             number of characters
+    reserved uint8
+    widths   count x uint8     glyph widths in pixels
+    offsets  count x uint16    little-endian glyph offsets in the bitmaps
+    bitmaps                    MONO_HLSB glyphs, rows padded to whole bytes
+
+Only the header, widths and offsets are kept in RAM; glyph bitmaps are read
+from flash when a glyph is rendered. Rendered glyphs are kept in an LRU cache
+per foreground and background color pair, so redrawing the same text does no
+rasterizing work.
+"""
+
+import struct
+
+import framebuf  # type: ignore
+from libs.display.cache import BufferCache
+from libs.display.st7789 import _to_be16
+from micropython import const  # type: ignore
+
+_MAGIC = b"MPF1"
+_HEADER_SIZE = const(8)
+_BUILTIN_SIZE = const(8)
+_BUILTIN_FIRST = const(32)
+_BUILTIN_LAST = const(127)
+_DEFAULT_CACHE_SIZE = const(8192)
+
+# Rendered glyphs are cached as buffers keyed by character and colors
+GlyphCache = BufferCache
+
+
+class BaseFont:
+    """Rendering and drawing shared by all fonts.
+
+    Subclasses set height, scale and mono_height and implement
+    _glyph_width(ch) and _bitmap(ch), which returns the MONO_HLSB bitmap of
+    an unscaled glyph.
+    """
+
+    def __init__(self, scale=1, cache_size=_DEFAULT_CACHE_SIZE) -> None:
+        self.scale = scale
+        self.cache = GlyphCache(cache_size)
+        self._palette = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565)
+
+    def char_width(self, ch):
+        return self._glyph_width(ch) * self.scale
+
+    def text_width(self, s):
+        width = 0
+        for ch in s:
+            width += self._glyph_width(ch)
+        return width * self.scale
+
+    def glyph(self, ch, fg, bg):
+        """Return the glyph of ch as a big-endian RGB565 buffer and its width"""
+        key = (ch, fg, bg)
+        glyph = self.cache.get(key)
+        if glyph is None:
+            glyph = self._render(ch, fg, bg)
+            self.cache.put(key, glyph)
+        return glyph, len(glyph) // (self.height * 2)
+
+    def _render(self, ch, fg, bg):
+        mono_width = self._glyph_width(ch)
+        mono = framebuf.FrameBuffer(
+            self._bitmap(ch), mono_width, self.mono_height, framebuf.MONO_HLSB
+        )
+        width = mono_width * self.scale
+        glyph = bytearray(width * self.height * 2)
+        f = framebuf.FrameBuffer(glyph, width, self.height, framebuf.RGB565)
+        if self.scale == 1:
+            self._palette.pixel(0, 0, _to_be16(bg))
+            self._palette.pixel(1, 0, _to_be16(fg))
+            f.blit(mono, 0, 0, -1, self._palette)
+            return glyph
+        scale = self.scale
+        fg = _to_be16(fg)
+        f.fill(_to_be16(bg))
+        for y in range(self.mono_height):
+            for x in range(mono_width):
+                if mono.pixel(x, y):
+                    f.fill_rect(x * scale, y * scale, scale, scale, fg)
+        return glyph
+
+    def draw(self, display, s, x, y, fg, bg):
+        """Draw s on an ST7789 display. Glyphs crossing the left or right edge
+        are skipped, rows past the top or bottom edge are clipped.
+
+        On a retained display every glyph is copied to the framebuffer. Without
+        a retained framebuffer the glyphs are composed side by side in the
+        display scratch buffer and each segment is sent in a single window.
+        """
+        height = self.height
+        # Rows of the glyphs inside the display
+        top = max(0, -y)
+        bottom = min(height, display.height - y)
+        if bottom <= top:
+            return
+        rows = bottom - top
+        start = 0
+        while start < len(s) and x < 0:
+            x += self.char_width(s[start])
+            start += 1
+
+        if display.retained:
+            while start < len(s):
+                glyph, width = self.glyph(s[start], fg, bg)
+                if x + width > display.width:
+                    break
+                if rows < height:
+                    glyph = memoryview(glyph)[top * width * 2 : bottom * width * 2]
+                display.blit_buffer(glyph, x, y + top, width, rows)
+                x += width
+                start += 1
+            return
+
+        scratch = display.buf
+        capacity = min(len(scratch) // (height * 2), display.width - x)
+        display.begin()
+        while start < len(s):
+            # Find the longest segment that fits the scratch buffer
+            end = start
+            segment_width = 0
+            while end < len(s):
+                width = self.char_width(s[end])
+                if segment_width + width > capacity:
+                    break
+                segment_width += width
+                end += 1
+            if end == start:
+                # Glyph is wider than the scratch buffer or the screen
+                glyph, width = self.glyph(s[start], fg, bg)
+                if x + width > display.width:
+                    break
+                if rows < height:
+                    glyph = memoryview(glyph)[top * width * 2 : bottom * width * 2]
+                display.blit_buffer(glyph, x, y + top, width, rows)
+                x += width
+                capacity = min(capacity, display.width - x)
+                start += 1
+                continue
+            column = 0
+            for ch in s[start:end]:
+                glyph, width = self.glyph(ch, fg, bg)
+                glyph = memoryview(glyph)
+                row_len = width * 2
+                for row in range(height):
+                    offset = (row * segment_width + column) * 2
+                    scratch[offset : offset + row_len] = glyph[
+                        row * row_len : (row + 1) * row_len
+                    ]
+                column += width
+            display.blit_buffer(
+                scratch[top * segment_width * 2 : bottom * segment_width * 2],
+                x,
+                y + top,
+                segment_width,
+                rows,
+            )
+            x += segment_width
+            capacity = min(capacity, display.width - x)
+            start = end
+            if capacity <= 0:
+                break
+        display.end()
+
+
+class BuiltinFont(BaseFont):
+    """The 8x8 framebuf font, optionally scaled by an integer factor"""
+
+    def __init__(self, scale=1, cache_size=_DEFAULT_CACHE_SIZE) -> None:
+        super().__init__(scale, cache_size)
+        self.mono_height = _BUILTIN_SIZE
+        self.height = _BUILTIN_SIZE * scale
+        self._mono = bytearray(_BUILTIN_SIZE)
+        self._mono_fb = framebuf.FrameBuffer(
+            self._mono, _BUILTIN_SIZE, _BUILTIN_SIZE, framebuf.MONO_HLSB
+        )
+
+    def _glyph_width(self, ch):
+        return _BUILTIN_SIZE
+
+    def _bitmap(self, ch):
+        if not _BUILTIN_FIRST <= ord(ch) <= _BUILTIN_LAST:
+            ch = "?"
+        self._mono_fb.fill(0)
+        self._mono_fb.text(ch, 0, 0, 1)
+        return self._mono
+
+
+class Font(BaseFont):
+    """Proportional font loaded from a binary font file on flash"""
+
+    def __init__(self, path, scale=1, cache_size=_DEFAULT_CACHE_SIZE) -> None:
+        super().__init__(scale, cache_size)
+        self.file = open(path, "rb")
+        magic, height, first, count, _ = struct.unpack(
+            "<4sBBBB", self.file.read(_HEADER_SIZE)
+        )
+        if magic != _MAGIC:
+            raise ValueError("Wrong font file: expecting MPF1 magic")
+        self.mono_height = height
+        self.height = height * scale
+        self.first = first
+        self.count = count
+        self.widths = self.file.read(count)
+        self.offsets = self.file.read(count * 2)
+        self.bitmaps_start = _HEADER_SIZE + count * 3
+        self._mono = bytearray((max(self.widths) + 7) // 8 * height)
+        # Characters missing in the font are drawn as "?" or the first glyph
+        self.default = ord("?") - first
+        if not 0 <= self.default < count:
+            self.default = 0
+
+    def _index(self, ch):
+        index = ord(ch) - self.first
+        if 0 <= index < self.count:
+            return index
+        return self.default
+
+    def _glyph_width(self, ch):
+        return self.widths[self._index(ch)]
+
+    def _bitmap(self, ch):
+        index = self._index(ch)
+        size = (self.widths[index] + 7) // 8 * self.mono_height
+        offset = struct.unpack_from("<H", self.offsets, index * 2)[0]
+        self.file.seek(self.bitmaps_start + offset)
+        mono = memoryview(self._mono)[:size]
+        self.file.readinto(mono)
+        return mono
+
+    def close(self):
+        self.file.close()
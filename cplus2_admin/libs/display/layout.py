@@ -0,0 +1,168 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Multi-line text: word wrap, alignment and line spacing.
+
+wrap() breaks a text in lines that fit a width, at spaces and newlines;
+words wider than the width are broken between characters. Line breaks and
+widths are cached per text, font and width, so redrawing the same text
+does not measure it again.
+
+A TextBlock shows wrapped text in a widget Scene, one Label per line:
+
+    block = TextBlock(scene, 10, 20, width=220, align=CENTER)
+    block.set("Connected to the access point")
+    scene.render()
+
+Each line is a bounded region of the screen. When the text changes, only
+the lines whose text or position changed are redrawn, and inside a line
+only the glyphs that changed.
+"""
+
+from libs.display.cache import LRUCache
+from libs.display.widgets import Label
+import libs.display.colors as colors
+
+LEFT = "left"
+CENTER = "center"
+RIGHT = "right"
+
+_FONT_SIZE = 8
+_CACHE_SIZE = 16
+
+_cache = LRUCache(_CACHE_SIZE)
+
+
+def _char_width(ch, font):
+    return _FONT_SIZE if font is None else font.char_width(ch)
+
+
+def _text_width(s, font):
+    return len(s) * _FONT_SIZE if font is None else font.text_width(s)
+
+
+def wrap(text, width, font=None):
+    """Return the lines of text fitting width as a tuple of (line, width)"""
+    key = (text, font, width)
+    lines = _cache.get(key)
+    if lines is None:
+        lines = tuple(_wrap(text, width, font))
+        _cache.put(key, lines)
+    return lines
+
+
+def _wrap(text, width, font):
+    space = _char_width(" ", font)
+    for paragraph in text.split("\n"):
+        line = ""
+        line_width = 0
+        for word in paragraph.split(" "):
+            if not word:
+                continue
+            word_width = _text_width(word, font)
+            if line and line_width + space + word_width <= width:
+                line += " " + word
+                line_width += space + word_width
+                continue
+            if line:
+                yield line, line_width
+            # Break words wider than a line between characters
+            while word_width > width:
+                end = 0
+                end_width = 0
+                while end < len(word):
+                    w = _char_width(word[end], font)
+                    if end and end_width + w > width:
+                        break
+                    end_width += w
+                    end += 1
+                yield word[:end], end_width
+                word = word[end:]
+                word_width -= end_width
+            line = word
+            line_width = word_width
+        yield line, line_width
+
+
+class TextBlock:
+    """Wrapped text drawn with labels of a Scene. Lines below height are
+    not shown. A width of None extends the block to the right edge of the
+    screen."""
+
+    def __init__(
+        self,
+        scene,
+        x,
+        y,
+        width=None,
+        height=None,
+        align=LEFT,
+        line_spacing=2,
+        fg=colors.WHITE,
+        font=None,
+    ) -> None:
+        display = scene.display
+        self.scene = scene
+        self.x = x
+        self.y = y
+        self.width = display.width - x if width is None else width
+        self.height = display.height - y if height is None else height
+        self.align = align
+        self.font_height = _FONT_SIZE if font is None else font.height
+        self.line_height = self.font_height + line_spacing
+        self.fg = fg
+        self.font = font
+        self.text = ""
+        self.labels = []
+
+    def _line_x(self, line_width):
+        if self.align == CENTER:
+            return self.x + (self.width - line_width) // 2
+        if self.align == RIGHT:
+            return self.x + self.width - line_width
+        return self.x
+
+    def set(self, text):
+        """Show text. Call Scene.render() to draw the changes."""
+        self.text = text
+        lines = wrap(text, self.width, self.font)
+        shown = 0
+        for i, (line, line_width) in enumerate(lines):
+            y = self.y + i * self.line_height
+            if y + self.font_height > self.y + self.height:
+                break
+            x = self._line_x(line_width)
+            # Left aligned labels span the block, so they never move
+            width = self.width if self.align == LEFT else line_width
+            width = min(width, self.scene.display.width - x)
+            if i < len(self.labels):
+                label = self.labels[i]
+                if label.x != x or label.width != width:
+                    self.scene.remove(label)
+                    label = None
+            else:
+                label = None
+            if label is None:
+                label = self.scene.add(Label(x, y, "", self.fg, None, self.font, width))
+                if i < len(self.labels):
+                    self.labels[i] = label
+                else:
+                    self.labels.append(label)
+            label.set_colors(self.fg)
+            label.set(line)
+            shown += 1
+        while len(self.labels) > shown:
+            self.scene.remove(self.labels.pop())
+
+    def set_colors(self, fg):
+        self.fg = fg
+        for label in self.labels:
+            label.set_colors(fg)
+
+    def clear(self):
+        """Remove the text, restoring the background under it"""
+        self.text = ""
+        while self.labels:
+            self.scene.remove(self.labels.pop())
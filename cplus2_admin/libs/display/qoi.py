@@ -0,0 +1,212 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Streaming decoder for QOI ("Quite OK Image", https://qoiformat.org) images.
+
+Bytes are pushed in chunks of any size and decoded in one pass into a
+single RGB565 row buffer, which is drawn when complete. The alpha channel
+is ignored.
+"""
+
+import micropython  # type: ignore
+import struct
+
+_MAGIC = b"qoif"
+_HEADER_SIZE = 14
+# Longest operation: QOI_OP_RGBA
+_MAX_OP_SIZE = 5
+_CHUNK_SIZE = 1024
+
+# Decoder state: pixel (r, g, b, a), pending run, pixels written by the
+# last call (uint32 at offset 8) and the 64 entry color index at offset 16
+_STATE_SIZE = 16 + 64 * 4
+
+
+@micropython.viper
+def _decode(state, src, src_len: int, dst, dst_pixels: int) -> int:
+    """Decode operations from src into up to dst_pixels big-endian RGB565
+    pixels of dst. Stops before an incomplete operation. Returns the bytes
+    consumed and stores the pixels written in the state."""
+    st = ptr8(state)
+    s = ptr8(src)
+    d = ptr8(dst)
+    r = st[0]
+    g = st[1]
+    b = st[2]
+    a = st[3]
+    run = st[4]
+    i = 0
+    written = 0
+    while written < dst_pixels:
+        if run > 0:
+            run -= 1
+        else:
+            if i >= src_len:
+                break
+            b1 = s[i]
+            if b1 == 0xFE:
+                if i + 4 > src_len:
+                    break
+                r = s[i + 1]
+                g = s[i + 2]
+                b = s[i + 3]
+                i += 4
+            elif b1 == 0xFF:
+                if i + 5 > src_len:
+                    break
+                r = s[i + 1]
+                g = s[i + 2]
+                b = s[i + 3]
+                a = s[i + 4]
+                i += 5
+            elif (b1 & 0xC0) == 0x00:
+                k = 16 + (b1 << 2)
+                r = st[k]
+                g = st[k + 1]
+                b = st[k + 2]
+                a = st[k + 3]
+                i += 1
+            elif (b1 & 0xC0) == 0x40:
+                r = (r + ((b1 >> 4) & 0x03) - 2) & 0xFF
+                g = (g + ((b1 >> 2) & 0x03) - 2) & 0xFF
+                b = (b + (b1 & 0x03) - 2) & 0xFF
+                i += 1
+            elif (b1 & 0xC0) == 0x80:
+                if i + 2 > src_len:
+                    break
+                b2 = s[i + 1]
+                vg = (b1 & 0x3F) - 32
+                r = (r + vg - 8 + ((b2 >> 4) & 0x0F)) & 0xFF
+                g = (g + vg) & 0xFF
+                b = (b + vg - 8 + (b2 & 0x0F)) & 0xFF
+                i += 2
+            else:
+                run = b1 & 0x3F
+                i += 1
+            k = 16 + (((r * 3 + g * 5 + b * 7 + a * 11) & 0x3F) << 2)
+            st[k] = r
+            st[k + 1] = g
+            st[k + 2] = b
+            st[k + 3] = a
+        d[written << 1] = (r & 0xF8) | (g >> 5)
+        d[(written << 1) + 1] = ((g << 3) & 0xE0) | (b >> 3)
+        written += 1
+    st[0] = r
+    st[1] = g
+    st[2] = b
+    st[3] = a
+    st[4] = run
+    ptr32(state)[2] = written
+    return i
+
+
+class QOI:
+    @staticmethod
+    def draw_stream(stream, display, expected_width=240, expected_height=135):
+        """Read a QOI image from a stream (e.g. a file) and draw it row by row"""
+        decoder = QOIDecoder(display, expected_width, expected_height)
+        buf = bytearray(_CHUNK_SIZE)
+        chunk = memoryview(buf)
+        while True:
+            size = stream.readinto(buf)
+            if not size:
+                break
+            decoder.feed(chunk[:size])
+        decoder.close()
+
+
+class QOIDecoder:
+    """Incremental QOI decoder with the interface of BitmapDecoder.
+
+    Operations split between two chunks are kept in a 5 byte carry buffer.
+    """
+
+    def __init__(self, display, expected_width=240, expected_height=135) -> None:
+        self.display = display
+        self.expected_width = expected_width
+        self.expected_height = expected_height
+        self.header = bytearray()
+        self.width = 0
+        self.height = 0
+        self.row = None
+        self.row_fill = 0
+        self.y = 0
+        self.state = bytearray(_STATE_SIZE)
+        # Initial pixel is opaque black
+        self.state[3] = 255
+        self.carry = bytearray(_MAX_OP_SIZE * 2)
+        self.carry_size = 0
+
+    def feed(self, data):
+        """Consume a chunk of the image"""
+        data = memoryview(data)
+        if self.row is None:
+            size = min(len(data), _HEADER_SIZE - len(self.header))
+            self.header += data[:size]
+            data = data[size:]
+            if len(self.header) < _HEADER_SIZE:
+                return
+            self._parse_header()
+        if self.y >= self.height:
+            # End marker and trailing bytes
+            return
+        if self.carry_size:
+            # Complete the split operation with the first bytes of data
+            size = min(len(data), len(self.carry) - self.carry_size)
+            self.carry[self.carry_size : self.carry_size + size] = data[:size]
+            carry = memoryview(self.carry)[: self.carry_size + size]
+            used = self._decode(carry)
+            if used < self.carry_size:
+                # Still incomplete, data was too short
+                self.carry_size += size
+                return
+            data = data[used - self.carry_size :]
+            self.carry_size = 0
+        used = self._decode(data)
+        rest = len(data) - used
+        if rest and self.y < self.height:
+            self.carry[:rest] = data[used:]
+            self.carry_size = rest
+
+    def _parse_header(self):
+        magic, width, height, channels, _ = struct.unpack(">4sIIBB", self.header)
+        if magic != _MAGIC:
+            raise Exception("Wrong file format: expecting a QOI file")
+        if width != self.expected_width or height != self.expected_height:
+            raise Exception(
+                f"Wrong image size: excepting {self.expected_width}x{self.expected_height} dimension"
+            )
+        if channels not in (3, 4):
+            raise Exception("Wrong channels: expecting RGB or RGBA")
+        self.width = width
+        self.height = height
+        self.row = bytearray(width * 2)
+
+    def _decode(self, data):
+        """Decode as many whole operations of data as possible into rows.
+        Returns the bytes used."""
+        pos = 0
+        row = memoryview(self.row)
+        while self.y < self.height:
+            used = _decode(
+                self.state,
+                data[pos:],
+                len(data) - pos,
+                row[self.row_fill * 2 :],
+                self.width - self.row_fill,
+            )
+            pos += used
+            self.row_fill += struct.unpack_from("<I", self.state, 8)[0]
+            if self.row_fill < self.width:
+                break
+            self.display.blit_rgb565(self.row, 0, self.y, self.width, 1)
+            self.row_fill = 0
+            self.y += 1
+        return pos
+
+    def close(self):
+        """Check that the whole image was received"""
+        if self.row is None or self.y < self.height:
+            raise Exception("Wrong file size: expecting a complete QOI image")
@@ -0,0 +1,106 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Serialized drawing on a retained display.
+
+Request handlers queue drawing operations under a key and return at once.
+A queued operation replaces the pending one with the same key, so three
+text updates sent before the renderer runs collapse into the last one. A
+single task applies the pending operations in order, on the framebuffer,
+and flushes the panel once per batch:
+
+    renderer.submit("text", draw_text, scene, lines)
+
+Code that draws across awaits, like a streamed upload or an animation,
+leases the display instead. The lease excludes the renderer and the other
+leases, so the framebuffer, the damage list and the scratch buffer of the
+display are only used by the holder:
+
+    async with renderer.lease() as display:
+        ...
+"""
+
+import asyncio
+
+import libs.std.logging as logging
+
+
+class Renderer:
+    def __init__(self, display) -> None:
+        if not display.retained:
+            raise ValueError("retained framebuffer required")
+        self.logger: logging.Logger = logging.getLogger("RENDERER")
+        self.display = display
+        # Held while drawing, by the renderer task or by a lease
+        self.lock = asyncio.Lock()
+        # Pending operations as [key, function, args], oldest first
+        self.queue = []
+        self.event = asyncio.Event()
+        self.task = None
+        # Batches flushed and operations dropped before being applied
+        self.batches = 0
+        self.coalesced = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def submit(self, key, function, *args):
+        """Queue function(*args), replacing the pending operation of key.
+        The operation moves to the end of the queue."""
+        self.cancel(key)
+        self.queue.append([key, function, args])
+        self.event.set()
+
+    def cancel(self, key):
+        """Drop the pending operation of key. Returns True if there was one."""
+        for i, op in enumerate(self.queue):
+            if op[0] == key:
+                del self.queue[i]
+                self.coalesced += 1
+                return True
+        return False
+
+    def lease(self):
+        """Async context manager giving exclusive use of the display"""
+        return _Lease(self)
+
+    async def _run(self):
+        while True:
+            await self.event.wait()
+            self.event.clear()
+            async with self.lock:
+                while self.queue:
+                    self.apply()
+                    await self.display.flush_async()
+                    self.batches += 1
+
+    def apply(self):
+        """Apply the pending operations on the framebuffer, without flushing.
+        Errors are logged and do not stop the batch."""
+        queue = self.queue
+        self.queue = []
+        for key, function, args in queue:
+            try:
+                function(*args)
+            except Exception as e:
+                self.logger.warning(f"Drawing {key} failed: {str(e)}")
+
+
+class _Lease:
+    def __init__(self, renderer) -> None:
+        self.renderer = renderer
+
+    async def __aenter__(self):
+        await self.renderer.lock.acquire()
+        return self.renderer.display
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.renderer.lock.release()
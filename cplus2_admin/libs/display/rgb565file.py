@@ -0,0 +1,211 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Compact RGB565 image files, used to keep the display background on flash.
+
+Layout:
+
+    magic     4 bytes   b"R565"
+    width     uint16    little-endian
+    height    uint16    little-endian
+    encoding  uint8     0 = raw, 1 = run-length encoded
+    reserved  uint8
+
+Raw files hold big-endian RGB565 pixels row by row. Run-length encoded files
+hold records of a little-endian uint16 count followed by a big-endian RGB565
+color; runs may cross rows.
+"""
+
+import micropython  # type: ignore
+import struct
+import sys
+
+import framebuf  # type: ignore
+from libs.display.bitmap import RawDecoder
+
+_MAGIC = b"R565"
+_HEADER_FORMAT = "<4sHHBB"
+_HEADER_SIZE = 10
+_MAX_RUN = 0xFFFF
+
+
+@micropython.viper
+def _run_length(pixels, start: int, end: int) -> int:
+    """Return how many pixels from start are equal to the one at start."""
+    p = ptr16(pixels)
+    color = p[start]
+    i = start + 1
+    while i < end and p[i] == color:
+        i += 1
+    return i - start
+
+
+class RGB565File:
+    RAW = 0
+    RLE = 1
+    HEADER_SIZE = _HEADER_SIZE
+    CHUNK_SIZE = 1024
+
+    @staticmethod
+    def save(display, path, rle=True):
+        """Save the retained framebuffer of display. Run-length encoding is
+        only used when it is smaller than the raw pixels. Returns the encoding
+        used."""
+        if not display.retained:
+            raise ValueError("retained framebuffer required")
+        width = display.width
+        height = display.height
+        row = bytearray(width * 2)
+        encoding = RGB565File.RAW
+        # Records take 4 bytes, so RLE pays off below one run every 2 pixels
+        limit = width * height // 2
+        if rle:
+            runs = 0
+            for _ in RGB565File._runs(display, row):
+                runs += 1
+                if runs >= limit:
+                    break
+            if runs < limit:
+                encoding = RGB565File.RLE
+
+        with open(path, "wb") as f:
+            f.write(struct.pack(_HEADER_FORMAT, _MAGIC, width, height, encoding, 0))
+            if encoding == RGB565File.RAW:
+                for y in range(height):
+                    f.write(display.read_buffer(0, y, width, 1, row))
+                return encoding
+
+            buf = bytearray(RGB565File.CHUNK_SIZE)
+            used = 0
+            for run, color in RGB565File._runs(display, row):
+                buf[used] = run & 0xFF
+                buf[used + 1] = run >> 8
+                buf[used + 2] = color >> 8
+                buf[used + 3] = color & 0xFF
+                used += 4
+                if used == len(buf):
+                    f.write(buf)
+                    used = 0
+            if used:
+                f.write(memoryview(buf)[:used])
+        return encoding
+
+    @staticmethod
+    def _runs(display, row):
+        """Yield the runs of the framebuffer as (count, color), reading it
+        row by row as RGB565 into row. Runs continue across rows."""
+        width = display.width
+        color = -1
+        count = 0
+        for y in range(display.height):
+            display.read_buffer(0, y, width, 1, row)
+            x = 0
+            while x < width:
+                run = _run_length(row, x, width)
+                pixel = row[x * 2] << 8 | row[x * 2 + 1]
+                if pixel == color and count + run <= _MAX_RUN:
+                    count += run
+                else:
+                    if count:
+                        yield count, color
+                    color = pixel
+                    count = run
+                x += run
+        if count:
+            yield count, color
+
+    @staticmethod
+    def read_header(f):
+        """Read the header of an open file and return its width, height and
+        encoding. Pixels start at HEADER_SIZE."""
+        magic, width, height, encoding, _ = struct.unpack(
+            _HEADER_FORMAT, f.read(_HEADER_SIZE)
+        )
+        if magic != _MAGIC:
+            raise Exception("Wrong file format: expecting an RGB565 file")
+        return width, height, encoding
+
+    @staticmethod
+    def draw(path, display):
+        """Stream an image file to display through a small reusable buffer"""
+        with open(path, "rb") as f:
+            width, height, encoding = RGB565File.read_header(f)
+            if width != display.width or height != display.height:
+                raise Exception(
+                    f"Wrong image size: excepting {display.width}x{display.height} dimension"
+                )
+            if encoding == RGB565File.RAW:
+                decoder = RawDecoder(display, width, height)
+            elif encoding == RGB565File.RLE:
+                decoder = RLEDecoder(display, width, height)
+            else:
+                raise Exception("Wrong encoding: expecting raw or RLE")
+            buf = bytearray(RGB565File.CHUNK_SIZE)
+            chunk = memoryview(buf)
+            while True:
+                size = f.readinto(buf)
+                if not size:
+                    break
+                decoder.feed(chunk[:size])
+            decoder.close()
+
+
+class RLEDecoder:
+    """Incremental decoder for run-length encoded RGB565 files.
+
+    Runs are expanded into a reusable row buffer with framebuf, which is drawn
+    when complete.
+    """
+
+    def __init__(self, display, width=240, height=135) -> None:
+        self.display = display
+        self.width = width
+        self.height = height
+        self.row = bytearray(width * 2)
+        self.row_fb = framebuf.FrameBuffer(self.row, width, 1, framebuf.RGB565)
+        self.record = bytearray(4)
+        self.reset()
+
+    def reset(self):
+        """Start a new image of the same size"""
+        self.record_fill = 0
+        self.x = 0
+        self.y = 0
+
+    def feed(self, data):
+        """Consume a chunk of records"""
+        data = memoryview(data)
+        while len(data):
+            size = min(len(data), 4 - self.record_fill)
+            self.record[self.record_fill : self.record_fill + size] = data[:size]
+            self.record_fill += size
+            data = data[size:]
+            if self.record_fill == 4:
+                self.record_fill = 0
+                self._run(self.record[0] | self.record[1] << 8)
+
+    def _run(self, count):
+        record = self.record
+        # Pixel value whose in-memory bytes are the big-endian color
+        if sys.byteorder == "little":
+            color = record[3] << 8 | record[2]
+        else:
+            color = record[2] << 8 | record[3]
+        while count:
+            if self.y >= self.height:
+                raise Exception("Wrong file size: too many pixels")
+            size = min(count, self.width - self.x)
+            self.row_fb.hline(self.x, 0, size, color)
+            self.x += size
+            count -= size
+            if self.x == self.width:
+                self.display.blit_rgb565(self.row, 0, self.y, self.width, 1)
+                self.x = 0
+                self.y += 1
+
+    def close(self):
+        """Check that the whole image was received"""
+        if self.y < self.height or self.record_fill:
+            raise Exception("Wrong file size: expecting a complete RLE image")
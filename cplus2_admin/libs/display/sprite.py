@@ -0,0 +1,204 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Sprites and tile sheets with a transparent color key.
+
+Sprites are RGB565 files (see libs.display.rgb565file) on flash. A sheet is
+a raw RGB565 file split in tiles of the same size; tiles are read from flash
+when first drawn and kept in an LRU cache limited in bytes:
+
+    icons = SpriteSheet("/icons/status.rgb565", 16, 16, key=colors.MAGENTA)
+    icons.draw(display, WIFI_3, 220, 2)
+
+On a retained display, sprites are composited on the framebuffer and sent
+with the next flush, so replacing an icon does not flicker. Without a
+retained framebuffer, compose the sprites on a Region over its background
+and draw the region in a single window.
+"""
+
+import micropython  # type: ignore
+
+import framebuf  # type: ignore
+from libs.display.bitmap import RawDecoder
+from libs.display.cache import BufferCache
+from libs.display.rgb565file import RGB565File, RLEDecoder
+from libs.display.st7789 import _to_be16
+
+_DEFAULT_CACHE_SIZE = 8192
+
+
+@micropython.viper
+def _blit_keyed(
+    dst, dst_offset: int, dst_stride: int, src, src_offset: int, src_stride: int,
+    width: int, height: int, key: int,
+):  # fmt: skip
+    """Copy a rectangle of 16-bit pixels, skipping the pixels equal to key."""
+    d = ptr16(dst)
+    s = ptr16(src)
+    y = 0
+    while y < height:
+        x = 0
+        while x < width:
+            pixel = s[src_offset + x]
+            if pixel != key:
+                d[dst_offset + x] = pixel
+            x += 1
+        dst_offset += dst_stride
+        src_offset += src_stride
+        y += 1
+
+
+class Sprite:
+    """Big-endian RGB565 pixels. Pixels of the key color are transparent;
+    a key of -1 makes the sprite opaque."""
+
+    def __init__(self, buffer, width, height, key=-1) -> None:
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.key = key
+
+    @staticmethod
+    def load(path, key=-1):
+        """Load a whole RGB565 file (raw or run-length encoded)"""
+        with open(path, "rb") as f:
+            width, height, encoding = RGB565File.read_header(f)
+            target = _BufferTarget(width, height)
+            if encoding == RGB565File.RAW:
+                decoder = RawDecoder(target, width, height)
+            elif encoding == RGB565File.RLE:
+                decoder = RLEDecoder(target, width, height)
+            else:
+                raise Exception("Wrong encoding: expecting raw or RLE")
+            buf = bytearray(RGB565File.CHUNK_SIZE)
+            chunk = memoryview(buf)
+            while True:
+                size = f.readinto(buf)
+                if not size:
+                    break
+                decoder.feed(chunk[:size])
+            decoder.close()
+        return Sprite(target.buffer, width, height, key)
+
+    def draw(self, display, x, y):
+        """Draw on a display. Transparent sprites need a retained display."""
+        if self.key >= 0 and not display.retained:
+            raise ValueError("retained framebuffer required, or draw on a Region")
+        display.blit_buffer(self.buffer, x, y, self.width, self.height, self.key)
+
+
+class SpriteSheet:
+    """Tiles of a raw RGB565 file, numbered left to right, top to bottom.
+
+    Tiles are read from flash on demand and kept in cache, which can be
+    shared between sheets.
+    """
+
+    def __init__(
+        self, path, tile_width=None, tile_height=None, key=-1, cache=None
+    ) -> None:
+        self.path = path
+        self.file = open(path, "rb")
+        self.width, self.height, encoding = RGB565File.read_header(self.file)
+        if encoding != RGB565File.RAW:
+            raise Exception("Wrong encoding: sprite sheets must be raw")
+        self.tile_width = tile_width or self.width
+        self.tile_height = tile_height or self.height
+        self.columns = self.width // self.tile_width
+        self.count = self.columns * (self.height // self.tile_height)
+        self.key = key
+        if cache is None:
+            cache = BufferCache(_DEFAULT_CACHE_SIZE)
+        self.cache = cache
+
+    def sprite(self, index):
+        """Return tile index as a Sprite"""
+        key = (self.path, index)
+        buffer = self.cache.get(key)
+        if buffer is None:
+            buffer = self._read_tile(index)
+            self.cache.put(key, buffer)
+        return Sprite(buffer, self.tile_width, self.tile_height, self.key)
+
+    def _read_tile(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError("tile index out of range")
+        row_len = self.tile_width * 2
+        x = index % self.columns * self.tile_width
+        y = index // self.columns * self.tile_height
+        buffer = bytearray(row_len * self.tile_height)
+        tile = memoryview(buffer)
+        for row in range(self.tile_height):
+            self.file.seek(
+                RGB565File.HEADER_SIZE + ((y + row) * self.width + x) * 2
+            )
+            self.file.readinto(tile[row * row_len : (row + 1) * row_len])
+        return buffer
+
+    def draw(self, display, index, x, y):
+        self.sprite(index).draw(display, x, y)
+
+    def close(self):
+        self.file.close()
+
+
+class Region:
+    """Buffer where sprites are composited before a single windowed write"""
+
+    def __init__(self, width, height) -> None:
+        self.width = width
+        self.height = height
+        self.buffer = bytearray(width * height * 2)
+        self.framebuf = framebuf.FrameBuffer(
+            self.buffer, width, height, framebuf.RGB565
+        )
+
+    def fill(self, color):
+        self.framebuf.fill(_to_be16(color))
+
+    def blit_buffer(self, buffer, x, y, width, height, key=-1):
+        """Copy big-endian RGB565 pixels, clipped to the region, skipping
+        the key color"""
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        # Pixels are compared in memory order, so the key is swapped too
+        _blit_keyed(
+            self.buffer,
+            y0 * self.width + x0,
+            self.width,
+            buffer,
+            (y0 - y) * width + x0 - x,
+            width,
+            x1 - x0,
+            y1 - y0,
+            _to_be16(key) if key >= 0 else -1,
+        )
+
+    def sprite(self, sprite, x, y):
+        """Composite a sprite at (x, y) of the region"""
+        self.blit_buffer(sprite.buffer, x, y, sprite.width, sprite.height, sprite.key)
+
+    def draw(self, display, x, y):
+        """Draw the region on display in one window"""
+        display.blit_buffer(self.buffer, x, y, self.width, self.height)
+
+
+class _BufferTarget:
+    """Minimal display interface for the decoders, drawing into a buffer"""
+
+    def __init__(self, width, height) -> None:
+        self.width = width
+        self.height = height
+        self.buffer = bytearray(width * height * 2)
+
+    def blit_rgb565(
+        self, buffer, x=0, y=0, width=None, height=None, little_endian=False
+    ):
+        offset = (y * self.width + x) * 2
+        self.buffer[offset : offset + width * 2] = buffer[: width * 2]
@@ -25,14 +25,25 @@
 # Notable modifications:
 #   - Created method to rotate screen
 #   - Created method to draw bitmap
+#   - Created retained framebuffer mode with damage tracking
+#   - Created method to blit packed RGB565 buffers
+#   - Created span based line, circle, triangle and polyline primitives
+#   - Created SPI transaction batching and window address caching
+#   - Created support for bitmap fonts and long strings in text()
+#   - Created asynchronous chunked flush with optional double buffering
+#   - Created hardware vertical scrolling
+#   - Created indexed color (4 and 8-bit palette) framebuffer mode
 """
 Driver for the ST7789 display controller.
 """
 
+import array
+import asyncio
+import math
 import sys
 
 import framebuf  # type: ignore
-import ustruct  # type: ignore
+import micropython  # type: ignore
 from micropython import const  # type: ignore
 from utime import sleep_ms  # type: ignore
 
@@ -57,6 +68,8 @@ _ST77XX_RAMWR = const(0x2C)
 _ST77XX_RAMRD = const(0x2E)
 
 _ST77XX_PTLAR = const(0x30)
+_ST7789_VSCRDEF = const(0x33)
+_ST7789_VSCSAD = const(0x37)
 _ST77XX_COLMOD = const(0x3A)
 _ST7789_MADCTL = const(0x36)
 
@@ -84,6 +97,25 @@ _BUF_DEFAULT_LEN = const(512)
 
 _PIXEL_LEN = const(2)
 
+_FLUSH_CHUNK_DEFAULT = const(4096)
+
+# Damage tracking: rectangles are merged when the union wastes fewer than
+# _DAMAGE_MERGE_SLACK pixels, and collapsed into their bounding box when
+# more than _DAMAGE_MAX_RECTS are pending.
+_DAMAGE_MERGE_SLACK = const(64)
+_DAMAGE_MAX_RECTS = const(32)
+
+# Consecutive spans of a shape share one damage rectangle while it covers at
+# most _SPAN_GROUP_RATIO times the pixels actually drawn.
+_SPAN_GROUP_RATIO = const(4)
+
+# Solid color chunks kept for immediate fills: size in bytes and colors
+_SOLID_CHUNK_LEN = const(128)
+_SOLID_CACHE_COLORS = const(4)
+
+# Rows of the controller frame memory, the range of vertical scrolling
+_ST7789_MEMORY_ROWS = const(320)
+
 _FONT_HEIGHT = const(8)
 _FONT_WIDTH = const(8)
 
@@ -92,6 +124,104 @@ _ST7789_RPORTRAIT = const(0x00)
 _ST7789_LANDSCAPE = const(0xA0)
 _ST7789_RLANDSCAPE = const(0x60)
 
+# Basic colors of the default 16 color palette
+_BASIC16 = (
+    0x0000, 0x001F, 0xF800, 0x07E0, 0x07FF, 0xF81F, 0xFFE0, 0xFFFF,
+    0x8410, 0x4208, 0xC618, 0x0010, 0x8000, 0x0400, 0x8400, 0xFD20,
+)  # fmt: skip
+
+
+def palette_rgb332():
+    """256 color palette with 3 bits of red, 3 of green and 2 of blue.
+
+    Colors are mapped to it without searching, so it is the fastest
+    palette for 8-bit framebuffers.
+    """
+    palette = array.array("H", bytes(512))
+    for i in range(256):
+        r = i >> 5
+        g = (i >> 2) & 0x07
+        b = i & 0x03
+        palette[i] = (
+            (r << 2 | r >> 1) << 11 | (g << 3 | g) << 5 | (b << 3 | b << 1 | b >> 1)
+        )
+    return palette
+
+
+def palette_basic16():
+    """16 color palette with the colors of libs.display.colors and grays"""
+    return array.array("H", _BASIC16)
+
+
+@micropython.viper
+def _expand8(src, start: int, dst, count: int, lut):
+    """Expand count 8-bit indexes from src[start] to big-endian RGB565."""
+    s = ptr8(src)
+    d = ptr8(dst)
+    colors = ptr8(lut)
+    i = 0
+    while i < count:
+        k = s[start + i] << 1
+        d[i << 1] = colors[k]
+        d[(i << 1) + 1] = colors[k + 1]
+        i += 1
+
+
+@micropython.viper
+def _expand4(src, start: int, dst, count: int, lut):
+    """Expand count 4-bit indexes from pixel start (GS4_HMSB) to RGB565."""
+    s = ptr8(src)
+    d = ptr8(dst)
+    colors = ptr8(lut)
+    i = 0
+    while i < count:
+        p = start + i
+        if p & 1:
+            k = (s[p >> 1] & 0x0F) << 1
+        else:
+            k = (s[p >> 1] >> 4) << 1
+        d[i << 1] = colors[k]
+        d[(i << 1) + 1] = colors[k + 1]
+        i += 1
+
+
+@micropython.viper
+def _to_rgb332(src, dst, start: int, count: int):
+    """Convert count big-endian RGB565 pixels to RGB332 indexes at dst[start]."""
+    s = ptr8(src)
+    d = ptr8(dst)
+    i = 0
+    while i < count:
+        high = s[i << 1]
+        low = s[(i << 1) + 1]
+        d[start + i] = (high & 0xE0) | ((high & 0x07) << 2) | ((low >> 3) & 0x03)
+        i += 1
+
+
+@micropython.viper
+def _swap16(dst, src, length: int):
+    """Copy length bytes from src to dst swapping the bytes of every pixel."""
+    d = ptr8(dst)
+    s = ptr8(src)
+    i = 0
+    while i < length:
+        d[i] = s[i + 1]
+        d[i + 1] = s[i]
+        i += 2
+
+
+# Framebuffer value of a RGB565 color: framebuf stores pixels in the native
+# byte order and the panel expects big-endian
+if sys.byteorder == "little":
+
+    def _to_be16(c):
+        return (c << 8) & 0xFF00 | (c >> 8) & 0x00FF
+
+else:
+
+    def _to_be16(c):
+        return c
+
 
 class ST7789:
     def __init__(
@@ -107,6 +237,9 @@ class ST7789:
         ystart=-1,
         init=True,
         color_mode=ColorMode_65K | ColorMode_16bit,
+        framebuffer=None,
+        send_buffer=None,
+        palette=None,
     ):
         """
         display = st7789.ST7789(
@@ -116,6 +249,21 @@ class ST7789:
             dc=machine.Pin(2, machine.Pin.OUT),
             buf=bytearray(128),
         )
+
+        Passing framebuffer=bytearray(width * height * 2) enables the retained
+        mode: drawing goes to the framebuffer and only the damaged regions
+        are sent to the panel when flush() is called.
+
+        Passing also send_buffer (same size) enables double buffering for
+        flush_async(): damaged regions are copied to it and sent from there,
+        so the next frame can be drawn while the current one is sent.
+
+        Passing a palette of 16 or 256 RGB565 colors makes the framebuffer
+        indexed, with 4 or 8 bits per pixel (width * height // 2 or
+        width * height bytes). Colors are drawn as the nearest palette entry
+        and rows are expanded to RGB565 when flushed:
+
+            framebuffer=bytearray(240 * 135), palette=st7789.palette_rgb332()
         """
         self.width = width
         self.height = height
@@ -124,14 +272,66 @@ class ST7789:
         self.dc = dc
         self.cs = cs
 
+        # Preallocated command, position and pixel buffers
+        self._cmd = bytearray(1)
+        self._pos = bytearray(4)
+        self._pixel = bytearray(2)
+        self._scroll_def = bytearray(6)
+        # Memory access control value, see change_orientation()
+        self.madctl = 0
+        # First memory row and height of the vertical scroll area
+        self._scroll_area = None
+        # Pre-filled solid color chunks by color, oldest color first
+        self._solid = {}
+        self._solid_order = []
+        # Nesting depth of begin() / end()
+        self._batch = 0
+        # Last column and row window sent to the controller
+        self._invalidate_window()
+        # Statistics
+        self.reset_counters()
+
         if buf is None:
             buf = bytearray(_BUF_DEFAULT_LEN)
         self.buf = memoryview(buf)
 
-        if sys.byteorder == "little":
-            self._to_be16 = lambda c: (c << 8) & 0xFF00 | (c >> 8) & 0x00FF
-        else:
-            self._to_be16 = lambda c: c
+        self.retained = framebuffer is not None
+        self._damage = []
+        self.palette = None
+        # Bits per pixel of the retained framebuffer
+        self.bits = 16
+        if self.retained:
+            frame_format = framebuf.RGB565
+            if palette is not None:
+                if len(palette) == 16:
+                    self.bits = 4
+                    frame_format = framebuf.GS4_HMSB
+                    if width & 1:
+                        raise ValueError("4-bit framebuffer requires an even width")
+                elif len(palette) == 256:
+                    self.bits = 8
+                    frame_format = framebuf.GS8
+                else:
+                    raise ValueError("palette must have 16 or 256 colors")
+            frame_size = width * height * self.bits // 8
+            if len(framebuffer) < frame_size:
+                raise ValueError("framebuffer too small")
+            self.frame = memoryview(framebuffer)
+            self.framebuf = framebuf.FrameBuffer(
+                self.frame, width, height, frame_format
+            )
+            self._flush_lock = asyncio.Lock()
+            self.send_frame = None
+            if send_buffer is not None:
+                if len(send_buffer) < frame_size:
+                    raise ValueError("send buffer too small")
+                self.send_frame = memoryview(send_buffer)
+            # Framebuffer value of a color
+            self._pen = _to_be16
+            if palette is not None:
+                # Line buffer for the rows expanded to RGB565
+                self._line = bytearray(width * _PIXEL_LEN)
+                self.set_palette(palette)
 
         if xstart >= 0 and ystart >= 0:
             self.xstart = xstart
@@ -158,18 +358,23 @@ class ST7789:
             self.write(_ST77XX_NORON)
             sleep_ms(10)
             self.fill(0)
+            self.flush()
             self.write(_ST77XX_DISPON)
             sleep_ms(10)
 
     def change_orientation(self, orientation: str):
+        self._invalidate_window()
         if orientation == "LANDSCAPE":
-            self.write(_ST7789_MADCTL, bytes([_ST7789_LANDSCAPE]))
+            self.madctl = _ST7789_LANDSCAPE
         elif orientation == "PORTRAIT":
-            self.write(_ST7789_MADCTL, bytes([_ST7789_PORTRAIT]))
+            self.madctl = _ST7789_PORTRAIT
         elif orientation == "RLANDSCAPE":
-            self.write(_ST7789_MADCTL, bytes([_ST7789_RLANDSCAPE]))
+            self.madctl = _ST7789_RLANDSCAPE
         elif orientation == "RPORTRAIT":
-            self.write(_ST7789_MADCTL, bytes([_ST7789_RPORTRAIT]))
+            self.madctl = _ST7789_RPORTRAIT
+        else:
+            return
+        self.write(_ST7789_MADCTL, bytes([self.madctl]))
 
     def cs_low(self):
         if self.cs:
@@ -179,16 +384,49 @@ class ST7789:
         if self.cs:
             self.cs.on()
 
+    def begin(self):
+        """Start a batch: CS stays asserted until the matching end().
+
+        Batches nest, so drawing methods can be grouped in a single
+        transaction by the caller.
+        """
+        if self._batch == 0:
+            self.cs_low()
+            self.transactions += 1
+        self._batch += 1
+
+    def end(self):
+        """Finish a batch started with begin()"""
+        self._batch -= 1
+        if self._batch == 0:
+            self.cs_high()
+
+    def reset_counters(self):
+        """Reset the transaction and sent bytes counters"""
+        self.transactions = 0
+        self.bytes_sent = 0
+
+    def _command(self, command):
+        self._cmd[0] = command
+        self.dc.off()
+        self.spi.write(self._cmd)
+        self.bytes_sent += 1
+
+    def _data(self, data):
+        self.dc.on()
+        self.spi.write(data)
+        self.bytes_sent += len(data)
+
     def write(self, command=None, data=None):
         """SPI write to the device: commands and data"""
-        self.cs_low()
+        self.begin()
         if command is not None:
-            self.dc.off()
-            self.spi.write(bytes([command]))
+            if command in (_ST77XX_CASET, _ST77XX_RASET, _ST77XX_SWRESET):
+                self._invalidate_window()
+            self._command(command)
         if data is not None:
-            self.dc.on()
-            self.spi.write(data)
-        self.cs_high()
+            self._data(data)
+        self.end()
 
     def hard_reset(self):
         self.cs_low()
@@ -203,6 +441,7 @@ class ST7789:
 
     def soft_reset(self):
         self.write(_ST77XX_SWRESET)
+        self._invalidate_window()
         sleep_ms(120)
 
     def sleep_mode(self, value):
@@ -240,34 +479,217 @@ class ST7789:
 
         if is_bgr:
             value |= _ST7789_MADCTL_BGR
+        self.madctl = value
         self.write(_ST7789_MADCTL, bytes([value]))
 
-    def _encode_pos(self, x, y):
-        """Encode a position into bytes."""
-        return ustruct.pack(">HH", x, y)
-
     def _encode_pixel(self, color):
-        """Encode a pixel color into bytes."""
-        return ustruct.pack(">H", color)
+        """Encode a pixel color into the preallocated pixel buffer."""
+        self._pixel[0] = color >> 8
+        self._pixel[1] = color & 0xFF
+        return self._pixel
+
+    def _send_pos(self, command, start, end):
+        """Send a CASET / RASET command with the preallocated position buffer."""
+        pos = self._pos
+        pos[0] = start >> 8
+        pos[1] = start & 0xFF
+        pos[2] = end >> 8
+        pos[3] = end & 0xFF
+        self._command(command)
+        self._data(pos)
+
+    def _invalidate_window(self):
+        self._columns_start = -1
+        self._columns_end = -1
+        self._rows_start = -1
+        self._rows_end = -1
 
     def _set_columns(self, start, end):
         if start > end or end >= self.width:
             return
         start += self.xstart
         end += self.xstart
-        self.write(_ST77XX_CASET, self._encode_pos(start, end))
+        if start == self._columns_start and end == self._columns_end:
+            return
+        self._send_pos(_ST77XX_CASET, start, end)
+        self._columns_start = start
+        self._columns_end = end
 
     def _set_rows(self, start, end):
         if start > end or end >= self.height:
             return
         start += self.ystart
         end += self.ystart
-        self.write(_ST77XX_RASET, self._encode_pos(start, end))
+        if start == self._rows_start and end == self._rows_end:
+            return
+        self._send_pos(_ST77XX_RASET, start, end)
+        self._rows_start = start
+        self._rows_end = end
 
     def set_window(self, x0, y0, x1, y1):
+        """Set the address window and start a memory write.
+
+        CASET and RASET are skipped when they repeat the last window. Data
+        for the window can follow in the same begin() / end() batch.
+        """
+        self.begin()
         self._set_columns(x0, x1)
         self._set_rows(y0, y1)
-        self.write(_ST77XX_RAMWR)
+        self._command(_ST77XX_RAMWR)
+        self.end()
+
+    def set_palette(self, palette):
+        """Replace the colors of an indexed framebuffer. The whole screen is
+        redrawn on the next flush."""
+        if len(palette) != 1 << self.bits:
+            raise ValueError("palette size does not match the framebuffer")
+        self.palette = palette
+        lut = bytearray(len(palette) * _PIXEL_LEN)
+        lut_le = bytearray(len(palette) * _PIXEL_LEN)
+        for i, color in enumerate(palette):
+            lut[i * 2] = lut_le[i * 2 + 1] = color >> 8
+            lut[i * 2 + 1] = lut_le[i * 2] = color & 0xFF
+        self._lut = lut
+        # Same colors as little-endian RGB565, for read_buffer()
+        self._lut_le = lut_le
+        self._rgb332 = self.bits == 8 and list(palette) == list(palette_rgb332())
+        self._pen_cache = {}
+        if self._rgb332:
+            self._pen = self._rgb332_index
+        else:
+            self._pen = self._palette_index
+        self.damage(0, 0, self.width, self.height)
+
+    @staticmethod
+    def _rgb332_index(color):
+        return (color >> 8) & 0xE0 | (color >> 6) & 0x1C | (color >> 3) & 0x03
+
+    def _palette_index(self, color):
+        """Index of the palette color nearest to color, cached per color"""
+        index = self._pen_cache.get(color)
+        if index is not None:
+            return index
+        r = color >> 11
+        g = (color >> 5) & 0x3F
+        b = color & 0x1F
+        best = -1
+        for i, other in enumerate(self.palette):
+            dr = (r - (other >> 11)) * 2
+            dg = g - ((other >> 5) & 0x3F)
+            db = (b - (other & 0x1F)) * 2
+            distance = dr * dr + dg * dg + db * db
+            if best < 0 or distance < best:
+                best = distance
+                index = i
+        if len(self._pen_cache) >= 256:
+            self._pen_cache = {}
+        self._pen_cache[color] = index
+        return index
+
+    def frame_color(self, color):
+        """Value of an RGB565 color in the retained framebuffer, for drawing
+        on display.framebuf directly"""
+        return self._pen(color)
+
+    def _expand_row(self, x, y, count, dst, frame=None, lut=None):
+        """Expand count indexed pixels from (x, y) to RGB565 into dst"""
+        if frame is None:
+            frame = self.frame
+        if lut is None:
+            lut = self._lut
+        if self.bits == 8:
+            _expand8(frame, y * self.width + x, dst, count, lut)
+        else:
+            _expand4(frame, y * self.width + x, dst, count, lut)
+
+    def _frame_span(self, frame, x0, x1, y):
+        """Bytes of a framebuffer holding the pixels x0 to x1 of row y"""
+        start = (y * self.width + x0) * self.bits // 8
+        end = ((y * self.width + x1 + 1) * self.bits + 7) // 8
+        return frame[start:end]
+
+    def _blit_indexed(self, buffer, x, y, width, height, key=-1):
+        """Draw a big-endian RGB565 buffer on an indexed framebuffer"""
+        self._check_region(x, y, width, height)
+        src = memoryview(buffer)
+        row_len = width * _PIXEL_LEN
+        if self._rgb332 and key < 0:
+            for row in range(height):
+                _to_rgb332(
+                    src[row * row_len :],
+                    self.frame,
+                    (y + row) * self.width + x,
+                    width,
+                )
+        else:
+            f = self.framebuf
+            pen = self._pen
+            i = 0
+            for row in range(y, y + height):
+                for column in range(x, x + width):
+                    color = src[i] << 8 | src[i + 1]
+                    if color != key:
+                        f.pixel(column, row, pen(color))
+                    i += 2
+        self.damage(x, y, width, height)
+
+    def write_region(self, buffer, x, y, width, height):
+        """Send a big-endian RGB565 buffer straight to the panel.
+
+        The retained framebuffer, if any, is neither read nor updated.
+        """
+        self.begin()
+        self.set_window(x, y, x + width - 1, y + height - 1)
+        self._data(buffer)
+        self.end()
+
+    def vertical_scroll_area(self, top, height):
+        """Use the screen rows [top, top + height) as hardware scroll area.
+
+        The controller scrolls along its memory rows, which are the screen
+        rows only in the portrait orientations. The area is placed in the
+        frame memory using ystart and the row order of the orientation.
+        """
+        if self.madctl & _ST7789_MADCTL_MV:
+            raise ValueError("vertical scrolling requires a portrait orientation")
+        if top < 0 or height <= 0 or top + height > self.height:
+            raise ValueError("scroll area out of bounds")
+        if self.madctl & _ST7789_MADCTL_MY:
+            # Rows are mirrored: screen row 0 is the last memory row
+            first = _ST7789_MEMORY_ROWS - self.ystart - top - height
+        else:
+            first = self.ystart + top
+        bottom = _ST7789_MEMORY_ROWS - first - height
+        scroll_def = self._scroll_def
+        scroll_def[0] = first >> 8
+        scroll_def[1] = first & 0xFF
+        scroll_def[2] = height >> 8
+        scroll_def[3] = height & 0xFF
+        scroll_def[4] = bottom >> 8
+        scroll_def[5] = bottom & 0xFF
+        self.write(_ST7789_VSCRDEF, scroll_def)
+        self._scroll_area = (first, height)
+        self.vertical_scroll(0)
+
+    def vertical_scroll(self, offset):
+        """Show the row offset of the scroll area at its top.
+
+        Screen row top + k of the area then shows the pixels written to row
+        top + (offset + k) % height.
+        """
+        if self._scroll_area is None:
+            raise ValueError("scroll area not defined")
+        first, height = self._scroll_area
+        offset %= height
+        if self.madctl & _ST7789_MADCTL_MY:
+            offset = (height - offset) % height
+        start = first + offset
+        self.write(_ST7789_VSCSAD, bytes([start >> 8, start & 0xFF]))
+
+    def vertical_scroll_reset(self):
+        """Leave the vertical scrolling mode"""
+        self._scroll_area = None
+        self.write(_ST77XX_NORON)
 
     def vline(self, x, y, length, color):
         self.fill_rect(x, y, 1, length, color)
@@ -276,12 +698,202 @@ class ST7789:
         self.fill_rect(x, y, length, 1, color)
 
     def pixel(self, x, y, color):
+        if self.retained:
+            self.framebuf.pixel(x, y, self._pen(color))
+            self.damage(x, y, 1, 1)
+            return
+        self.begin()
         self.set_window(x, y, x, y)
-        self.write(None, self._encode_pixel(color))
+        self._data(self._encode_pixel(color))
+        self.end()
 
-    def blit_buffer(self, buffer, x, y, width, height):
-        self.set_window(x, y, x + width - 1, y + height - 1)
-        self.write(None, buffer)
+    def blit_buffer(self, buffer, x, y, width, height, key=-1):
+        """Draw a big-endian RGB565 buffer. On a retained display, pixels of
+        the key color are skipped when key is given."""
+        if self.retained:
+            if self.palette is not None:
+                self._blit_indexed(buffer, x, y, width, height, key)
+                return
+            if key >= 0:
+                self._check_region(x, y, width, height)
+                self.framebuf.blit(
+                    framebuf.FrameBuffer(buffer, width, height, framebuf.RGB565),
+                    x,
+                    y,
+                    _to_be16(key),
+                )
+                self.damage(x, y, width, height)
+                return
+            self._check_region(x, y, width, height)
+            row_len = width * _PIXEL_LEN
+            src = memoryview(buffer)
+            for row in range(height):
+                offset = ((y + row) * self.width + x) * _PIXEL_LEN
+                self.frame[offset : offset + row_len] = src[
+                    row * row_len : (row + 1) * row_len
+                ]
+            self.damage(x, y, width, height)
+            return
+        self.write_region(buffer, x, y, width, height)
+
+    def read_buffer(self, x, y, width, height, buffer=None, little_endian=False):
+        """Copy a region of the retained framebuffer as big-endian RGB565
+        (little-endian if little_endian is set) into buffer, or into a new
+        bytearray."""
+        if not self.retained:
+            raise ValueError("retained framebuffer required")
+        self._check_region(x, y, width, height)
+        row_len = width * _PIXEL_LEN
+        if buffer is None:
+            buffer = bytearray(row_len * height)
+        dst = memoryview(buffer)
+        for row in range(height):
+            if self.palette is not None:
+                lut = self._lut_le if little_endian else self._lut
+                self._expand_row(x, y + row, width, dst[row * row_len :], None, lut)
+                continue
+            offset = ((y + row) * self.width + x) * _PIXEL_LEN
+            if little_endian:
+                _swap16(dst[row * row_len :], self.frame[offset:], row_len)
+                continue
+            dst[row * row_len : (row + 1) * row_len] = self.frame[
+                offset : offset + row_len
+            ]
+        return buffer
+
+    def _check_region(self, x, y, width, height):
+        if (
+            x < 0
+            or y < 0
+            or width < 0
+            or height < 0
+            or x + width > self.width
+            or y + height > self.height
+        ):
+            raise ValueError("region out of bounds")
+
+    def damage(self, x, y, width, height):
+        """Mark a region of the retained framebuffer as changed."""
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width) - 1
+        y1 = min(y + height, self.height) - 1
+        if x0 > x1 or y0 > y1:
+            return
+        rect = [x0, y0, x1, y1]
+        merged = True
+        while merged:
+            merged = False
+            for other in self._damage:
+                if self._merge_damage(rect, other):
+                    self._damage.remove(other)
+                    merged = True
+                    break
+        self._damage.append(rect)
+        if len(self._damage) > _DAMAGE_MAX_RECTS:
+            for other in self._damage[:-1]:
+                rect[0] = min(rect[0], other[0])
+                rect[1] = min(rect[1], other[1])
+                rect[2] = max(rect[2], other[2])
+                rect[3] = max(rect[3], other[3])
+            self._damage = [rect]
+
+    @staticmethod
+    def _merge_damage(rect, other):
+        """Grow rect to include other if they touch and the union is cheap."""
+        if (
+            other[0] > rect[2] + 1
+            or rect[0] > other[2] + 1
+            or other[1] > rect[3] + 1
+            or rect[1] > other[3] + 1
+        ):
+            return False
+        x0 = min(rect[0], other[0])
+        y0 = min(rect[1], other[1])
+        x1 = max(rect[2], other[2])
+        y1 = max(rect[3], other[3])
+        union = (x1 - x0 + 1) * (y1 - y0 + 1)
+        area = (rect[2] - rect[0] + 1) * (rect[3] - rect[1] + 1)
+        area += (other[2] - other[0] + 1) * (other[3] - other[1] + 1)
+        if union > area + _DAMAGE_MERGE_SLACK:
+            return False
+        rect[0], rect[1], rect[2], rect[3] = x0, y0, x1, y1
+        return True
+
+    def flush(self):
+        """Send the damaged regions of the retained framebuffer to the panel."""
+        if not self.retained:
+            return
+        self.begin()
+        for x0, y0, x1, y1 in self._damage:
+            self.set_window(x0, y0, x1, y1)
+            if self.palette is not None:
+                line = memoryview(self._line)[: (x1 - x0 + 1) * _PIXEL_LEN]
+                for y in range(y0, y1 + 1):
+                    self._expand_row(x0, y, x1 - x0 + 1, line)
+                    self._data(line)
+            elif x0 == 0 and x1 == self.width - 1:
+                start = y0 * self.width * _PIXEL_LEN
+                end = (y1 + 1) * self.width * _PIXEL_LEN
+                self._data(self.frame[start:end])
+            else:
+                row_len = (x1 - x0 + 1) * _PIXEL_LEN
+                offset = (y0 * self.width + x0) * _PIXEL_LEN
+                for _ in range(y1 - y0 + 1):
+                    self._data(self.frame[offset : offset + row_len])
+                    offset += self.width * _PIXEL_LEN
+        self.end()
+        self._damage = []
+
+    async def flush_async(self, chunk_size=_FLUSH_CHUNK_DEFAULT):
+        """Send the damaged regions in chunks, yielding to the event loop
+        between them so sockets and other tasks keep being served.
+
+        Each chunk is a band of whole rows with its own window, so the panel
+        state stays correct even if other drawing happens in between. With a
+        send buffer, the regions are copied first and drawing the next frame
+        can overlap with sending:
+
+            task = asyncio.create_task(display.flush_async())
+            # ... draw the next frame ...
+            await task
+        """
+        if not self.retained:
+            return
+        async with self._flush_lock:
+            damage = self._damage
+            self._damage = []
+            frame = self.frame
+            if self.send_frame is not None:
+                frame = self.send_frame
+                for x0, y0, x1, y1 in damage:
+                    for y in range(y0, y1 + 1):
+                        self._frame_span(frame, x0, x1, y)[:] = self._frame_span(
+                            self.frame, x0, x1, y
+                        )
+
+            stride = self.width * _PIXEL_LEN
+            for x0, y0, x1, y1 in damage:
+                row_len = (x1 - x0 + 1) * _PIXEL_LEN
+                rows = max(1, chunk_size // row_len)
+                for band in range(y0, y1 + 1, rows):
+                    band_end = min(band + rows - 1, y1)
+                    self.begin()
+                    self.set_window(x0, band, x1, band_end)
+                    offset = band * stride + x0 * _PIXEL_LEN
+                    if self.palette is not None:
+                        line = memoryview(self._line)[:row_len]
+                        for y in range(band, band_end + 1):
+                            self._expand_row(x0, y, x1 - x0 + 1, line, frame)
+                            self._data(line)
+                    elif row_len == stride:
+                        self._data(frame[offset : (band_end + 1) * stride])
+                    else:
+                        for _ in range(band_end - band + 1):
+                            self._data(frame[offset : offset + row_len])
+                            offset += stride
+                    self.end()
+                    await asyncio.sleep_ms(0)
 
     def rect(self, x, y, w, h, color):
         self.hline(x, y, w, color)
@@ -290,26 +902,135 @@ class ST7789:
         self.hline(x, y + h - 1, w, color)
 
     def fill_rect(self, x, y, width, height, color):
-        buf_len = len(self.buf)
-        chunks, rest = divmod(width * height * _PIXEL_LEN, buf_len)
-        f = framebuf.FrameBuffer(self.buf, buf_len // _PIXEL_LEN, 1, framebuf.RGB565)
-        f.fill(self._to_be16(color))
-
+        if self.retained:
+            self.framebuf.fill_rect(x, y, width, height, self._pen(color))
+            self.damage(x, y, width, height)
+            return
+        size = width * height * _PIXEL_LEN
+        if size <= 0:
+            return
+        chunk = self._solid_chunk(color)
+        self.begin()
         self.set_window(x, y, x + width - 1, y + height - 1)
-        if chunks:
-            for _ in range(chunks):
-                self.write(None, self.buf)
+        if size <= len(chunk):
+            # Small rectangles are sent straight from the cached chunk
+            self._data(chunk[:size])
+            self.end()
+            return
+        # Fill only the part of the scratch buffer that is sent, doubling
+        # the copied chunk, and send it as many times as needed
+        fill_len = min(size, len(self.buf) & ~1)
+        buf = self.buf
+        filled = min(len(chunk), fill_len)
+        buf[:filled] = chunk[:filled]
+        while filled < fill_len:
+            size_copy = min(filled, fill_len - filled)
+            buf[filled : filled + size_copy] = buf[:size_copy]
+            filled += size_copy
+        chunks, rest = divmod(size, fill_len)
+        for _ in range(chunks):
+            self._data(buf[:fill_len])
         if rest:
-            self.write(None, self.buf[:rest])
+            self._data(buf[:rest])
+        self.end()
+
+    def _solid_chunk(self, color):
+        """Return a chunk filled with color from a small per color cache"""
+        chunk = self._solid.get(color)
+        if chunk is not None:
+            return chunk
+        buf = bytearray(_SOLID_CHUNK_LEN)
+        chunk = memoryview(buf)
+        buf[0] = color >> 8
+        buf[1] = color & 0xFF
+        filled = _PIXEL_LEN
+        while filled < _SOLID_CHUNK_LEN:
+            size = min(filled, _SOLID_CHUNK_LEN - filled)
+            buf[filled : filled + size] = buf[:size]
+            filled += size
+        if len(self._solid_order) >= _SOLID_CACHE_COLORS:
+            del self._solid[self._solid_order.pop(0)]
+        self._solid[color] = chunk
+        self._solid_order.append(color)
+        return chunk
 
     def fill(self, color):
         self.fill_rect(0, 0, self.width, self.height, color)
 
     def line(self, x0, y0, x1, y1, color):
         # Line drawing function.  Will draw a single pixel wide line starting at
-        # x0, y0 and ending at x1, y1.
+        # x0, y0 and ending at x1, y1. Each horizontal or vertical run of the
+        # line is drawn as one rectangle.
+        self._draw_spans(self._line_spans(x0, y0, x1, y1), color)
+
+    def polyline(self, points, color, closed=False):
+        """Draw lines through a sequence of (x, y) points."""
+        if not self.retained:
+            # All the segments in one transaction
+            self.begin()
+        for i in range(1, len(points)):
+            x0, y0 = points[i - 1]
+            x1, y1 = points[i]
+            self.line(x0, y0, x1, y1, color)
+        if closed and len(points) > 2:
+            x0, y0 = points[-1]
+            x1, y1 = points[0]
+            self.line(x0, y0, x1, y1, color)
+        if not self.retained:
+            self.end()
+
+    def triangle(self, x0, y0, x1, y1, x2, y2, color, fill=False):
+        if not fill:
+            self.polyline(((x0, y0), (x1, y1), (x2, y2)), color, True)
+            return
+        self._draw_spans(self._triangle_spans(x0, y0, x1, y1, x2, y2), color)
+
+    def circle(self, x, y, r, color, fill=False):
+        self._draw_spans(self._circle_spans(x, y, r, fill), color)
+
+    def _draw_spans(self, spans, color):
+        """Draw a sequence of (x, y, width, height) rectangles.
+
+        In retained mode neighbouring spans share a damage rectangle, so a
+        diagonal line is flushed in a few windows instead of one per run.
+        Without a retained framebuffer there is no background to compose
+        the spans against: each one is its own window, but all of them are
+        sent in a single transaction.
+        """
+        if not self.retained:
+            self.begin()
+            for x, y, w, h in spans:
+                self.fill_rect(x, y, w, h, color)
+            self.end()
+            return
+        f = self.framebuf
+        c = self._pen(color)
+        group = None
+        pixels = 0
+        for x, y, w, h in spans:
+            f.fill_rect(x, y, w, h, c)
+            if group:
+                x0 = min(group[0], x)
+                y0 = min(group[1], y)
+                x1 = max(group[2], x + w)
+                y1 = max(group[3], y + h)
+                pixels += w * h
+                area = (x1 - x0) * (y1 - y0)
+                if area <= _SPAN_GROUP_RATIO * pixels + _DAMAGE_MERGE_SLACK:
+                    group[0], group[1], group[2], group[3] = x0, y0, x1, y1
+                    continue
+                self._damage_group(group)
+            group = [x, y, x + w, y + h]
+            pixels = w * h
+        if group:
+            self._damage_group(group)
+
+    def _damage_group(self, group):
+        self.damage(group[0], group[1], group[2] - group[0], group[3] - group[1])
+
+    @staticmethod
+    def _line_spans(x0, y0, x1, y1):
         steep = abs(y1 - y0) > abs(x1 - x0)
-        pixel = self._encode_pixel(color)
         if steep:
             x0, y0 = y0, x0
             x1, y1 = y1, x1
@@ -323,31 +1044,168 @@ class ST7789:
             ystep = 1
         else:
             ystep = -1
-        while x0 <= x1:
-            if steep:
-                self.set_window(y0, x0, y0, x0)
-                self.write(None, pixel)
-            else:
-                self.set_window(x0, y0, x0, y0)
-                self.write(None, pixel)
+        start = x0
+        for x in range(x0, x1 + 1):
             err -= dy
-            if err < 0:
+            if err < 0 or x == x1:
+                if steep:
+                    yield y0, start, 1, x - start + 1
+                else:
+                    yield start, y0, x - start + 1, 1
                 y0 += ystep
                 err += dx
-            x0 += 1
+                start = x + 1
 
-    def text(self, s, x, y, fg, bg):
+    @staticmethod
+    def _circle_spans(x, y, r, fill):
+        # Half width of every row, from the middle row (dy = 0) to the top
+        extents = [int(math.sqrt(r * r - dy * dy + r)) for dy in range(r + 1)]
+        if fill:
+            for dy in range(-r, r + 1):
+                extent = extents[abs(dy)]
+                yield x - extent, y + dy, 2 * extent + 1, 1
+            return
+        yield x - extents[r], y - r, 2 * extents[r] + 1, 1
+        for side in (1, -1):
+            for dy in range(1 - r, r):
+                extent = extents[abs(dy)]
+                inner = min(extents[abs(dy) + 1] + 1, extent)
+                if side > 0:
+                    yield x + inner, y + dy, extent - inner + 1, 1
+                else:
+                    yield x - extent, y + dy, extent - inner + 1, 1
+        yield x - extents[r], y + r, 2 * extents[r] + 1, 1
+
+    @staticmethod
+    def _triangle_spans(x0, y0, x1, y1, x2, y2):
+        # Sort vertices by y
+        if y0 > y1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        if y1 > y2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        if y0 > y1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        for y in range(y0, y2 + 1):
+            # Long edge from vertex 0 to vertex 2
+            if y2 == y0:
+                xa = min(x0, x1, x2)
+                xb = max(x0, x1, x2)
+            else:
+                xa = x0 + (x2 - x0) * (y - y0) // (y2 - y0)
+                if y < y1:
+                    xb = x0 + (x1 - x0) * (y - y0) // (y1 - y0)
+                elif y2 == y1:
+                    xb = x1
+                else:
+                    xb = x1 + (x2 - x1) * (y - y1) // (y2 - y1)
+            if xa > xb:
+                xa, xb = xb, xa
+            yield xa, y, xb - xa + 1, 1
+
+    def text_size(self, s, font=None):
+        """Return the width and height in pixels of a text drawn with text()."""
+        if font is not None:
+            return font.text_width(s), font.height
+        return len(s) * _FONT_WIDTH, _FONT_HEIGHT
+
+    def text(self, s, x, y, fg, bg, font=None):
+        """Draw a text with the built-in 8x8 font or a libs.display.font font.
+
+        Strings longer than the scratch buffer are drawn in segments.
+        """
+        if font is not None:
+            font.draw(self, s, x, y, fg, bg)
+            return
         text_width = len(s) * _FONT_WIDTH
-        text_mem = text_width * _FONT_HEIGHT * _PIXEL_LEN
-        if text_mem > len(self.buf):
+        if self.retained:
+            self.framebuf.fill_rect(x, y, text_width, _FONT_HEIGHT, self._pen(bg))
+            self.framebuf.text(s, x, y, self._pen(fg))
+            self.damage(x, y, text_width, _FONT_HEIGHT)
+            return
+
+        chars = len(self.buf) // (_FONT_WIDTH * _FONT_HEIGHT * _PIXEL_LEN)
+        if chars == 0:
+            raise ValueError("buffer too small")
+        self.begin()
+        for start in range(0, len(s), chars):
+            # Segments are clipped to the right edge of the screen
+            segment_width = min(
+                min(chars, len(s) - start) * _FONT_WIDTH, self.width - x
+            )
+            if segment_width <= 0:
+                break
+            text_mem = segment_width * _FONT_HEIGHT * _PIXEL_LEN
+            f = framebuf.FrameBuffer(
+                self.buf, segment_width, _FONT_HEIGHT, framebuf.RGB565
+            )
+            f.fill(_to_be16(bg))
+            f.text(s[start : start + chars], 0, 0, _to_be16(fg))
+            self.blit_buffer(self.buf[:text_mem], x, y, segment_width, _FONT_HEIGHT)
+            x += segment_width
+        self.end()
+
+    def blit_rgb565(
+        self, buffer, x=0, y=0, width=None, height=None, little_endian=False
+    ):
+        """Draw a packed RGB565 buffer (bytes, bytearray or memoryview).
+
+        The buffer is big-endian, as expected by the panel, unless
+        little_endian is set, in which case whole rows are byte-swapped on the
+        way out. No per-pixel work is done in Python.
+        """
+        if width is None:
+            width = self.width
+        if height is None:
+            height = len(buffer) // (width * _PIXEL_LEN)
+        image_mem = width * height * _PIXEL_LEN
+        if len(buffer) < image_mem:
             raise ValueError("buffer too small")
+        src = memoryview(buffer)
+        if not little_endian:
+            self.blit_buffer(src[:image_mem], x, y, width, height)
+            return
 
-        f = framebuf.FrameBuffer(self.buf, text_width, _FONT_HEIGHT, framebuf.RGB565)
-        f.fill(self._to_be16(bg))
-        f.text(s, 0, 0, self._to_be16(fg))
-        self.blit_buffer(self.buf[:text_mem], x, y, text_width, _FONT_HEIGHT)
+        if self.retained and self.palette is not None:
+            row_len = width * _PIXEL_LEN
+            line = memoryview(self._line)
+            for row in range(height):
+                _swap16(line, src[row * row_len :], row_len)
+                self._blit_indexed(line[:row_len], x, y + row, width, 1)
+            return
+        if self.retained:
+            self._check_region(x, y, width, height)
+            row_len = width * _PIXEL_LEN
+            for row in range(height):
+                offset = ((y + row) * self.width + x) * _PIXEL_LEN
+                _swap16(self.frame[offset:], src[row * row_len :], row_len)
+            self.damage(x, y, width, height)
+            return
+
+        chunk = len(self.buf) & ~1
+        self.begin()
+        self.set_window(x, y, x + width - 1, y + height - 1)
+        for start in range(0, image_mem, chunk):
+            size = min(chunk, image_mem - start)
+            _swap16(self.buf, src[start:], size)
+            self._data(self.buf[:size])
+        self.end()
 
-    def image(self, pixels: list[int]):
+    def image(self, pixels):
+        """Draw a full screen image.
+
+        pixels is either a packed big-endian RGB565 buffer, drawn with
+        blit_rgb565(), or a list of RGB565 integers.
+        """
+        if not isinstance(pixels, list):
+            self.blit_rgb565(pixels)
+            return
+        if self.retained:
+            f = self.framebuf
+            for y in range(self.height):
+                for x in range(self.width):
+                    f.pixel(x, y, self._pen(pixels[(y * self.width) + x]))
+            self.damage(0, 0, self.width, self.height)
+            return
         image_mem = len(pixels) * _PIXEL_LEN
         if image_mem > len(self.buf):
             raise ValueError("buffer too small")
@@ -355,6 +1213,6 @@ class ST7789:
         f = framebuf.FrameBuffer(self.buf, self.width, self.height, framebuf.RGB565)
         for y in range(self.height):
             for x in range(self.width):
-                f.pixel(x, y, self._to_be16(pixels[(y * self.width) + x]))
+                f.pixel(x, y, _to_be16(pixels[(y * self.width) + x]))
 
         self.blit_buffer(self.buf[:image_mem], 0, 0, self.width, self.height)
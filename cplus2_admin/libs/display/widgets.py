@@ -0,0 +1,317 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Retained widgets for dashboards on a retained ST7789 display.
+
+A Scene keeps a copy of the background under each widget. Widgets mark
+themselves dirty when their value changes, and render() redraws only the
+dirty ones, restoring the background from the copy where needed:
+
+    scene = Scene(display)
+    clock = scene.add(ValueField(10, 10, "{:02d}:{:02d}:{:02d}"))
+    clock.set(rtc.datetime()[4:7])
+    scene.render()
+
+Labels compare the new text with the drawn one and only redraw the glyphs
+that changed, so a clock tick sends one or two glyphs to the panel.
+"""
+
+import libs.display.colors as colors
+
+_FONT_SIZE = 8
+
+
+class Widget:
+    """Base class of widgets. Subclasses implement render(display). A plain
+    Widget draws nothing: it only keeps the background of its region."""
+
+    def __init__(self, x, y, width, height) -> None:
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.dirty = True
+        self.background = None
+
+    def invalidate(self):
+        """Forget what was drawn, after the background was redrawn"""
+        self.dirty = True
+
+    def render(self, display):
+        """Draw the widget on the framebuffer of display"""
+
+    def restore(self, display, x, y, width, height):
+        """Copy the saved background of a region inside the widget back to
+        the framebuffer"""
+        x0 = max(x, self.x)
+        y0 = max(y, self.y)
+        x1 = min(x + width, self.x + self.width)
+        y1 = min(y + height, self.y + self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        background = memoryview(self.background)
+        row_len = (x1 - x0) * 2
+        src = ((y0 - self.y) * self.width + x0 - self.x) * 2
+        for y in range(y0, y1):
+            display.blit_buffer(background[src : src + row_len], x0, y, x1 - x0, 1)
+            src += self.width * 2
+
+
+class Label(Widget):
+    """Single line of text. A width of None extends the label to the right
+    edge of the screen. With bg=None the text is drawn over the background.
+    """
+
+    def __init__(
+        self, x, y, text="", fg=colors.WHITE, bg=None, font=None, width=None
+    ) -> None:
+        height = _FONT_SIZE if font is None else font.height
+        super().__init__(x, y, width, height)
+        self.text = text
+        self.fg = fg
+        self.bg = bg
+        self.font = font
+        # Drawn glyphs as (x, character, width)
+        self._cells = []
+        self._repaint = False
+
+    def set(self, text):
+        if text != self.text:
+            self.text = text
+            self.dirty = True
+
+    def set_colors(self, fg, bg=None):
+        if fg != self.fg or bg != self.bg:
+            self.fg = fg
+            self.bg = bg
+            self._repaint = True
+            self.dirty = True
+
+    def invalidate(self):
+        self._cells = []
+        self._repaint = False
+        super().invalidate()
+
+    def _layout(self, text):
+        cells = []
+        x = self.x
+        right = self.x + self.width
+        for ch in text:
+            width = _FONT_SIZE if self.font is None else self.font.char_width(ch)
+            if x + width > right:
+                break
+            cells.append((x, ch, width))
+            x += width
+        return cells
+
+    def render(self, display):
+        old = self._cells
+        if self._repaint:
+            for x, _, width in old:
+                self.restore(display, x, self.y, width, self.height)
+            old = []
+            self._repaint = False
+        new = self._layout(self.text)
+        # A glyph is kept when the same character is drawn at the same place
+        old_keys = set((x, ch) for x, ch, _ in old)
+        new_keys = set((x, ch) for x, ch, _ in new)
+        for x, ch, width in old:
+            if (x, ch) not in new_keys:
+                self.restore(display, x, self.y, width, self.height)
+        for x, ch, width in new:
+            if (x, ch) not in old_keys:
+                self._draw_glyph(display, x, ch, width)
+        self._cells = new
+
+    def _draw_glyph(self, display, x, ch, width):
+        y = self.y
+        if self.font is None:
+            if self.bg is None:
+                display.framebuf.text(ch, x, y, display.frame_color(self.fg))
+                display.damage(x, y, width, self.height)
+            else:
+                display.text(ch, x, y, self.fg, self.bg)
+            return
+        if self.bg is not None:
+            glyph, width = self.font.glyph(ch, self.fg, self.bg)
+            display.blit_buffer(glyph, x, y, width, self.height)
+            return
+        # Render with a key color that differs from fg and skip it when blitting
+        key = self.fg ^ 0xFFFF
+        glyph, width = self.font.glyph(ch, self.fg, key)
+        display.blit_buffer(glyph, x, y, width, self.height, key)
+
+
+class ValueField(Label):
+    """Label showing a value through a format string"""
+
+    def __init__(
+        self, x, y, fmt="{}", fg=colors.WHITE, bg=None, font=None, width=None
+    ) -> None:
+        super().__init__(x, y, "", fg, bg, font, width)
+        self.fmt = fmt
+        self.value = None
+
+    def set(self, value):
+        """Show value. Tuples fill several fields of the format string."""
+        self.value = value
+        if isinstance(value, tuple):
+            super().set(self.fmt.format(*value))
+        else:
+            super().set(self.fmt.format(value))
+
+
+class Bar(Widget):
+    """Horizontal bar filled in proportion to its value"""
+
+    def __init__(
+        self,
+        x,
+        y,
+        width,
+        height,
+        minimum=0,
+        maximum=100,
+        fg=colors.WHITE,
+        bg=None,
+    ) -> None:
+        if maximum <= minimum:
+            raise ValueError("maximum must be greater than minimum")
+        super().__init__(x, y, width, height)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.fg = fg
+        self.bg = bg
+        self.value = minimum
+        # Filled width on the screen, -1 when nothing was drawn
+        self._filled = -1
+
+    def set(self, value):
+        value = min(max(value, self.minimum), self.maximum)
+        if value != self.value:
+            self.value = value
+            self.dirty = True
+
+    def invalidate(self):
+        self._filled = -1
+        super().invalidate()
+
+    def render(self, display):
+        filled = int(
+            (self.value - self.minimum)
+            * self.width
+            // (self.maximum - self.minimum)
+        )
+        old = self._filled
+        if old < 0:
+            # Draw the empty part too
+            self._clear(display, filled, self.width)
+            old = 0
+        if filled > old:
+            display.fill_rect(self.x + old, self.y, filled - old, self.height, self.fg)
+        elif filled < old:
+            self._clear(display, filled, old)
+        self._filled = filled
+
+    def _clear(self, display, start, end):
+        if start >= end:
+            return
+        if self.bg is None:
+            self.restore(display, self.x + start, self.y, end - start, self.height)
+        else:
+            display.fill_rect(self.x + start, self.y, end - start, self.height, self.bg)
+
+
+class Image(Widget):
+    """Big-endian RGB565 image. Without a buffer the background is shown."""
+
+    def __init__(self, x, y, width, height, buffer=None) -> None:
+        super().__init__(x, y, width, height)
+        self.buffer = buffer
+
+    def set(self, buffer):
+        self.buffer = buffer
+        self.dirty = True
+
+    def render(self, display):
+        if self.buffer is None:
+            self.restore(display, self.x, self.y, self.width, self.height)
+        else:
+            display.blit_buffer(self.buffer, self.x, self.y, self.width, self.height)
+
+
+class Icon(Widget):
+    """Tile of a libs.display.sprite.SpriteSheet, chosen by index. The
+    background is restored under transparent tiles before drawing, on the
+    framebuffer, so changing the icon does not flicker."""
+
+    def __init__(self, x, y, sheet, index=None) -> None:
+        super().__init__(x, y, sheet.tile_width, sheet.tile_height)
+        self.sheet = sheet
+        self.index = index
+
+    def set(self, index):
+        if index != self.index:
+            self.index = index
+            self.dirty = True
+
+    def render(self, display):
+        if self.index is None or self.sheet.key >= 0:
+            self.restore(display, self.x, self.y, self.width, self.height)
+        if self.index is not None:
+            self.sheet.draw(display, self.index, self.x, self.y)
+
+
+class Scene:
+    """Set of widgets drawn over a background on a retained display"""
+
+    def __init__(self, display) -> None:
+        if not display.retained:
+            raise ValueError("retained framebuffer required")
+        self.display = display
+        self.widgets = []
+
+    def add(self, widget):
+        """Add a widget, saving the background under it. Widgets are clipped
+        to the screen."""
+        display = self.display
+        if widget.width is None:
+            widget.width = display.width - widget.x
+        widget.width = min(widget.width, display.width - widget.x)
+        widget.height = min(widget.height, display.height - widget.y)
+        widget.background = display.read_buffer(
+            widget.x, widget.y, widget.width, widget.height
+        )
+        widget.invalidate()
+        self.widgets.append(widget)
+        return widget
+
+    def remove(self, widget):
+        """Remove a widget and restore the background under it"""
+        widget.restore(self.display, widget.x, widget.y, widget.width, widget.height)
+        self.widgets.remove(widget)
+
+    def capture(self):
+        """Save the background again after it was redrawn under the widgets.
+        All the widgets are drawn on the next render()."""
+        display = self.display
+        for widget in self.widgets:
+            widget.background = display.read_buffer(
+                widget.x, widget.y, widget.width, widget.height
+            )
+            widget.invalidate()
+
+    def render(self, flush=True):
+        """Redraw the dirty widgets and return how many were drawn. With
+        flush=False the caller flushes, for example with flush_async()."""
+        drawn = 0
+        for widget in self.widgets:
+            if widget.dirty:
+                widget.render(self.display)
+                widget.dirty = False
+                drawn += 1
+        if flush:
+            self.display.flush()
+        return drawn
@@ -6,6 +6,7 @@ MIT license
 
 import libs.std.logging as logging
 import asyncio
+import micropython  # type: ignore
 import ujson as json  # type: ignore
 import gc
 import uos as os  # type: ignore
@@ -66,15 +67,325 @@ class HTTPException(Exception):
         self.code = code
 
 
+@micropython.viper
+def _find(buf, start: int, end: int, sub) -> int:
+    """Return the index of sub in buf[start:end], or -1. Unlike bytes.find,
+    works on bytearrays."""
+    b = ptr8(buf)
+    s = ptr8(sub)
+    n = int(len(sub))
+    first = s[0]
+    last = end - n
+    i = start
+    while i <= last:
+        if b[i] == first:
+            j = 1
+            while j < n and b[i + j] == s[j]:
+                j += 1
+            if j == n:
+                return i
+        i += 1
+    return -1
+
+
+def _header_param(value, key):
+    """Return the parameter key of a header value, like the boundary of
+    multipart/form-data; boundary=xyz, or None"""
+    for item in value.split(b";")[1:]:
+        frags = item.split(b"=", 1)
+        if len(frags) == 2 and frags[0].strip().lower() == key:
+            return frags[1].strip().strip(b'"')
+    return None
+
+
+class _BodyReader:
+    """Stream reader limited to the body of one request, so that a handler
+    can not read into the next request of a persistent connection.
+    Reading returns nothing at the end of the body, and raises EOFError when
+    the connection ends before.
+    """
+
+    def __init__(self, reader, size):
+        self.reader = reader
+        self.remaining = size
+
+    async def read(self, n=-1):
+        if n < 0 or n > self.remaining:
+            n = self.remaining
+        if n == 0:
+            return b""
+        data = await self.reader.read(n)
+        if not data:
+            raise EOFError("Body is incomplete")
+        self.remaining -= len(data)
+        return data
+
+    async def readexactly(self, n):
+        if n > self.remaining:
+            raise EOFError("Body is incomplete")
+        data = await self.reader.readexactly(n)
+        self.remaining -= n
+        return data
+
+    async def readinto(self, buf):
+        n = min(len(buf), self.remaining)
+        if n == 0:
+            return 0
+        if n < len(buf):
+            buf = memoryview(buf)[:n]
+        size = await self.reader.readinto(buf)
+        if not size:
+            raise EOFError("Body is incomplete")
+        self.remaining -= size
+        return size
+
+    async def drain(self, buf_size=128):
+        """Read and drop what the handler left of the body"""
+        buf = bytearray(min(self.remaining, buf_size))
+        while self.remaining:
+            await self.readinto(buf)
+
+
+class _ChunkedReader:
+    """Stream reader decoding a body sent with Transfer-Encoding: chunked.
+    Same interface as _BodyReader."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        # Bytes left in the current chunk
+        self.remaining = 0
+        self.started = False
+        self.done = False
+
+    async def _next_chunk(self):
+        if self.started:
+            # CRLF after the data of the previous chunk
+            await self.reader.readexactly(2)
+        self.started = True
+        line = await self.reader.readline()
+        if not line:
+            raise EOFError("Body is incomplete")
+        try:
+            self.remaining = int(line.split(b";", 1)[0], 16)
+        except ValueError:
+            raise HTTPException(400)
+        if self.remaining == 0:
+            # Skip the trailer headers
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    raise EOFError("Body is incomplete")
+                if line == b"\r\n" or line == b"\n":
+                    break
+            self.done = True
+
+    async def readinto(self, buf):
+        while self.remaining == 0:
+            if self.done:
+                return 0
+            await self._next_chunk()
+        if len(buf) > self.remaining:
+            buf = memoryview(buf)[: self.remaining]
+        size = await self.reader.readinto(buf)
+        if not size:
+            raise EOFError("Body is incomplete")
+        self.remaining -= size
+        return size
+
+    async def read(self, n=-1):
+        """Read up to n bytes, or the whole body when n is negative"""
+        data = bytearray()
+        buf = bytearray(128 if n < 0 else min(n, 128))
+        while n < 0 or len(data) < n:
+            size = await self.readinto(buf if n < 0 else memoryview(buf)[: n - len(data)])
+            if not size:
+                break
+            data.extend(memoryview(buf)[:size])
+        return bytes(data)
+
+    async def readexactly(self, n):
+        data = await self.read(n)
+        if len(data) < n:
+            raise EOFError("Body is incomplete")
+        return data
+
+
+class _BodyChunks:
+    """Async iterator over a request body. Chunks are memoryviews of buf,
+    valid until the next one is read."""
+
+    def __init__(self, reader, buf, limit):
+        self.reader = reader
+        self.buf = buf
+        self.view = memoryview(buf)
+        self.limit = limit
+        self.size = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        size = await self.reader.readinto(self.buf)
+        if not size:
+            raise StopAsyncIteration
+        self.size += size
+        if self.size > self.limit:
+            raise HTTPException(413)
+        return self.view[:size]
+
+
+class _Multipart:
+    """Async iterator over the parts of a multipart/form-data body.
+
+    Each part is an async iterator over its data. Parts must be read in
+    order: the rest of a part is skipped when the next one is requested.
+    The body is parsed in buf, which must hold the header lines of a part.
+    """
+
+    def __init__(self, reader, boundary, buf, limit):
+        self.reader = reader
+        # The CRLF before the first delimiter is implied
+        self.delimiter = b"\r\n--" + boundary
+        if len(buf) < 2 * len(self.delimiter):
+            raise ValueError("Buffer too small")
+        self.buf = buf
+        self.view = memoryview(buf)
+        buf[0:2] = b"\r\n"
+        # Unparsed data is buf[start:end]
+        self.start = 0
+        self.end = 2
+        self.limit = limit
+        self.size = 0
+        self.part = None
+        self.done = False
+
+    async def _fill(self):
+        """Read more of the body after the unparsed data"""
+        if self.start:
+            left = self.end - self.start
+            if left:
+                self.buf[:left] = bytes(self.view[self.start : self.end])
+            self.start = 0
+            self.end = left
+        if self.end == len(self.buf):
+            # Part header longer than the buffer
+            raise HTTPException(413)
+        size = await self.reader.readinto(self.view[self.end :])
+        if not size:
+            # The body ended before the closing delimiter
+            raise HTTPException(400)
+        self.size += size
+        if self.size > self.limit:
+            raise HTTPException(413)
+        self.end += size
+
+    async def _data(self):
+        """Next chunk of data of the current part, None at its end"""
+        delimiter = self.delimiter
+        while True:
+            i = _find(self.buf, self.start, self.end, delimiter)
+            if i == self.start:
+                self.start += len(delimiter)
+                return None
+            if i < 0:
+                # Keep what could be the beginning of the delimiter
+                i = self.end - len(delimiter) + 1
+            if i > self.start:
+                chunk = self.view[self.start : i]
+                self.start = i
+                return chunk
+            await self._fill()
+
+    async def _line(self):
+        while True:
+            i = _find(self.buf, self.start, self.end, b"\r\n")
+            if i >= 0:
+                line = bytes(self.view[self.start : i])
+                self.start = i + 2
+                return line
+            await self._fill()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.done:
+            raise StopAsyncIteration
+        # Skip the preamble, or what the handler left of the previous part
+        part = self.part
+        if part is None or not part.done:
+            while await self._data() is not None:
+                pass
+            if part is not None:
+                part.done = True
+        while self.end - self.start < 2:
+            await self._fill()
+        if self.buf[self.start] == 45 and self.buf[self.start + 1] == 45:
+            # Closing delimiter
+            self.done = True
+            self.part = None
+            raise StopAsyncIteration
+        await self._line()
+        headers = {}
+        while True:
+            line = await self._line()
+            if not line:
+                break
+            frags = line.split(b":", 1)
+            if len(frags) != 2:
+                raise HTTPException(400)
+            headers[frags[0].strip().lower()] = frags[1].strip()
+        self.part = _Part(self, headers)
+        return self.part
+
+
+class _Part:
+    """Part of a multipart/form-data body: its headers, name, filename and
+    content type, and an async iterator over its data"""
+
+    def __init__(self, multipart, headers):
+        self.multipart = multipart
+        self.headers = headers
+        disposition = headers.get(b"content-disposition", b"")
+        name = _header_param(disposition, b"name")
+        filename = _header_param(disposition, b"filename")
+        self.name = None if name is None else name.decode()
+        self.filename = None if filename is None else filename.decode()
+        self.content_type = headers.get(b"content-type", b"text/plain")
+        self.done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.done:
+            chunk = await self.multipart._data()
+            if chunk is not None:
+                return chunk
+            self.done = True
+        raise StopAsyncIteration
+
+
 class request:
     """HTTP Request class"""
 
+    # Buffer size of body() and multipart() when no buffer is given
+    BODY_BUF_SIZE = 512
+
     def __init__(self, _reader):
         self.reader = _reader
         self.headers = {}
         self.method = b""
         self.path = b""
         self.query_string = b""
+        self.version = b""
+        # Values of the URL parameters, passed to the handler
+        self.args = ()
+        # Framing headers, parsed whatever save_headers is
+        self.content_length = 0
+        self.connection = b""
+        self.chunked = False
+        self.content_type = b""
 
     async def read_request_line(self):
         """Read and parse first line (AKA HTTP Request Line).
@@ -89,10 +400,14 @@ class request:
             if rl == b"\r\n" or rl == b"\n":
                 continue
             break
+        if not rl:
+            # Connection closed between requests
+            raise EOFError
         rl_frags = rl.split()
         if len(rl_frags) != 3:
             raise HTTPException(400)
         self.method = rl_frags[0]
+        self.version = rl_frags[2]
         url_frags = rl_frags[1].split(b"?", 1)
         self.path = url_frags[0]
         if len(url_frags) > 1:
@@ -102,6 +417,7 @@ class request:
         """Read and parse HTTP headers until \r\n\r\n:
         Optional argument 'save_headers' controls which headers to save.
             This is done mostly to deal with memory constrains.
+            Saved headers are keyed by their lowercase name.
 
         Function is generator.
 
@@ -118,8 +434,67 @@ class request:
             frags = line.split(b":", 1)
             if len(frags) != 2:
                 raise HTTPException(400)
-            if frags[0].lower() in save_headers:
-                self.headers[frags[0]] = frags[1].strip()
+            name = frags[0].lower()
+            if name == b"content-length":
+                try:
+                    self.content_length = int(frags[1])
+                except ValueError:
+                    raise HTTPException(400)
+                if self.content_length < 0:
+                    raise HTTPException(400)
+            elif name == b"connection":
+                self.connection = frags[1].strip().lower()
+            elif name == b"transfer-encoding":
+                self.chunked = frags[1].strip().lower() != b"identity"
+            elif name == b"content-type":
+                self.content_type = frags[1].strip()
+            if name in save_headers:
+                self.headers[name] = frags[1].strip()
+        # Stop handlers at the end of the body
+        if self.chunked:
+            self.reader = _ChunkedReader(self.reader)
+        else:
+            self.reader = _BodyReader(self.reader, self.content_length)
+
+    def body(self, buf=None):
+        """Async iterator over the body, with Content-Length or chunked.
+        Chunks are memoryviews of buf, valid until the next one is read, so
+        the body is processed with a fixed buffer whatever its size.
+        Raises HTTPException(413) past the max_body_size of the route.
+
+        Example:
+            async for chunk in req.body(bytearray(1024)):
+                f.write(chunk)
+        """
+        limit = self.params["max_body_size"]
+        if self.content_length > limit:
+            raise HTTPException(413)
+        if buf is None:
+            buf = bytearray(self.BODY_BUF_SIZE)
+        return _BodyChunks(self.reader, buf, limit)
+
+    def multipart(self, buf=None):
+        """Async iterator over the parts of a multipart/form-data body.
+        Each part has name, filename, content_type and headers, and is an
+        async iterator over its data, as memoryviews of buf.
+
+        Example:
+            async for part in req.multipart():
+                if part.filename:
+                    async for chunk in part:
+                        f.write(chunk)
+        """
+        if self.content_type.split(b";", 1)[0].strip() != b"multipart/form-data":
+            raise HTTPException(415)
+        boundary = _header_param(self.content_type, b"boundary")
+        if not boundary:
+            raise HTTPException(400)
+        limit = self.params["max_body_size"]
+        if self.content_length > limit:
+            raise HTTPException(413)
+        if buf is None:
+            buf = bytearray(self.BODY_BUF_SIZE)
+        return _Multipart(self.reader, boundary, buf, limit)
 
     async def read_parse_form_data(self):
         """Read HTTP form data (payload), if any.
@@ -129,23 +504,27 @@ class request:
             - dict of key / value pairs
             - None in case of no form data present
         """
-        # TODO: Probably there is better solution how to handle
-        # request body, at least for simple urlencoded forms - by processing
-        # chunks instead of accumulating payload.
+        # Forms are small: use body() to process larger payloads in chunks
         gc.collect()
-        if b"Content-Length" not in self.headers:
+        if not self.content_length and not self.chunked:
             return {}
         # Parse payload depending on content type
-        if b"Content-Type" not in self.headers:
+        if b"content-type" not in self.headers:
             # Unknown content type, return unparsed, raw data
             return {}
-        size = int(self.headers[b"Content-Length"])
+        size = self.content_length
         if size > self.params["max_body_size"] or size < 0:
             raise HTTPException(413)
-        data = await self.reader.readexactly(size)
+        if self.chunked:
+            data = bytearray()
+            async for chunk in self.body():
+                data.extend(chunk)
+            data = bytes(data)
+        else:
+            data = await self.reader.readexactly(size)
         # Use only string before ';', e.g:
         # application/x-www-form-urlencoded; charset=UTF-8
-        ct = self.headers[b"Content-Type"].split(b";", 1)[0]
+        ct = self.headers[b"content-type"].split(b";", 1)[0]
         try:
             if ct == b"application/json":
                 return json.loads(data)
@@ -165,6 +544,10 @@ class response:
         self.code = 200
         self.version = "1.0"
         self.headers = {}
+        # Set by the server when the connection may serve another request.
+        # Cleared when the response has no Content-Length nor chunks.
+        self.keep_alive = False
+        self.headers_sent = False
 
     async def _send_headers(self):
         """Compose and send:
@@ -177,6 +560,20 @@ class response:
         to send them separately - sometimes it could increase latency.
         So combining headers together and send them as single "packet".
         """
+        if self.keep_alive:
+            if (
+                "Content-Length" not in self.headers
+                and "Transfer-Encoding" not in self.headers
+                and self.code not in (204, 304)
+            ):
+                # The end of the body is the end of the connection
+                self.keep_alive = False
+            else:
+                self.version = "1.1"
+                self.add_header("Connection", "keep-alive")
+        if not self.keep_alive and self.version == "1.1":
+            self.add_header("Connection", "close")
+        self.headers_sent = True
         # Request line
         hdrs = "HTTP/{} {} MSG\r\n".format(self.version, self.code)
         # Headers
@@ -199,8 +596,9 @@ class response:
             await resp.error(403)
         """
         self.code = code
-        if msg:
-            self.add_header("Content-Length", len(msg))
+        if isinstance(msg, str):
+            msg = msg.encode()
+        self.add_header("Content-Length", len(msg) if msg else 0)
         await self._send_headers()
         if msg:
             await self.send(msg)
@@ -218,8 +616,9 @@ class response:
         """
         self.code = 302
         self.add_header("Location", location)
-        if msg:
-            self.add_header("Content-Length", len(msg))
+        if isinstance(msg, str):
+            msg = msg.encode()
+        self.add_header("Content-Length", len(msg) if msg else 0)
         await self._send_headers()
         if msg:
             await self.send(msg)
@@ -263,6 +662,45 @@ class response:
         self.add_header("Content-Type", "text/html")
         await self._send_headers()
 
+    async def start_chunked(self, content_type):
+        """Start a response with a body of unknown size, sent in chunks
+        with send_chunk() and finished with end_chunked().
+        This function is generator.
+
+        NOTICE: HTTP 1.0 by itself does not support chunked responses, so,
+        making workaround: Response is HTTP/1.1, with Connection: close
+        unless the connection is kept alive.
+
+        Example:
+            await resp.start_chunked('text/plain')
+            await resp.send_chunk('Hello, ')
+            await resp.send_chunk('world!')
+            await resp.end_chunked()
+        """
+        self.version = "1.1"
+        self.add_header("Content-Type", content_type)
+        self.add_header("Transfer-Encoding", "chunked")
+        await self._send_headers()
+
+    async def send_chunk(self, data):
+        """Send data (str, bytes, bytearray or memoryview) as one chunk.
+        Empty data is skipped, since an empty chunk ends the body.
+        This function is generator.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not len(data):
+            return
+        await self.send("{:x}\r\n".format(len(data)))
+        await self.send(data)
+        await self.send("\r\n")
+
+    async def end_chunked(self):
+        """Finish a response started with start_chunked().
+        This function is generator.
+        """
+        await self.send("0\r\n\r\n")
+
     async def send_file(
         self,
         filename,
@@ -306,7 +744,7 @@ class response:
             # to tell browser to cache it, however, you can always
             # override it by setting max_age to zero
             self.add_header("Cache-Control", "max-age={}, public".format(max_age))
-            with open(filename) as f:
+            with open(filename, "rb") as f:
                 await self._send_headers()
                 gc.collect()
                 buf = bytearray(min(stat[6], buf_size))
@@ -323,7 +761,7 @@ class response:
                 raise
 
 
-async def restful_resource_handler(req, resp, param=None):
+async def restful_resource_handler(req, resp, *args):
     """Handler for RESTful API endpoins"""
     # Gather data - query string, JSON in request body...
     data = await req.read_parse_form_data()
@@ -335,10 +773,7 @@ async def restful_resource_handler(req, resp, param=None):
     _handler, _kwargs = req.params["_callmap"][req.method]
     # Collect garbage before / after handler execution
     gc.collect()
-    if param:
-        res = _handler(data, param, **_kwargs)
-    else:
-        res = _handler(data, **_kwargs)
+    res = _handler(data, *args, **_kwargs)
     gc.collect()
     # Handler result could be:
     # 1. generator - in case of large payload
@@ -349,22 +784,13 @@ async def restful_resource_handler(req, resp, param=None):
     # res = {'blah': 'blah'}, 201
     if isinstance(res, type_gen):
         # Result is generator, use chunked response
-        # NOTICE: HTTP 1.0 by itself does not support chunked responses, so, making workaround:
-        # Response is HTTP/1.1 with Connection: close
-        resp.version = "1.1"
-        resp.add_header("Connection", "close")
-        resp.add_header("Content-Type", "application/json")
-        resp.add_header("Transfer-Encoding", "chunked")
         resp.add_access_control_headers()
-        await resp._send_headers()
+        await resp.start_chunked("application/json")
         # Drain generator
         for chunk in res:
-            chunk_len = len(chunk.encode("utf-8"))
-            await resp.send("{:x}\r\n".format(chunk_len))
-            await resp.send(chunk)
-            await resp.send("\r\n")
+            await resp.send_chunk(chunk)
             gc.collect()
-        await resp.send("0\r\n\r\n")
+        await resp.end_chunked()
     else:
         if type(res) == tuple:
             resp.code = res[1]
@@ -376,6 +802,9 @@ async def restful_resource_handler(req, resp, param=None):
             res_str = json.dumps(res)
         else:
             res_str = res
+        # Content-Length counts bytes, not characters
+        if isinstance(res_str, str):
+            res_str = res_str.encode()
         resp.add_header("Content-Type", "application/json")
         resp.add_header("Content-Length", str(len(res_str)))
         resp.add_access_control_headers()
@@ -383,10 +812,132 @@ async def restful_resource_handler(req, resp, param=None):
         await resp.send(res_str)
 
 
+@micropython.viper
+def _segment_hash(buf, start: int, end: int) -> int:
+    """Hash of buf[start:end], without copying it"""
+    b = ptr8(buf)
+    h = 5381
+    i = start
+    while i < end:
+        h = ((h << 5) + h + b[i]) & 0x3FFFFFFF
+        i += 1
+    return h
+
+
+@micropython.viper
+def _segment_equal(buf, start: int, end: int, segment) -> bool:
+    """Whether buf[start:end] == segment, without copying it"""
+    n = int(len(segment))
+    if end - start != n:
+        return False
+    b = ptr8(buf)
+    s = ptr8(segment)
+    i = 0
+    while i < n:
+        if b[start + i] != s[i]:
+            return False
+        i += 1
+    return True
+
+
+@micropython.viper
+def _segment_int(buf, start: int, end: int) -> int:
+    """Value of the decimal number buf[start:end], or -1"""
+    if start == end or end - start > 9:
+        return -1
+    b = ptr8(buf)
+    value = 0
+    i = start
+    while i < end:
+        c = b[i]
+        if c < 48 or c > 57:
+            return -1
+        value = value * 10 + c - 48
+        i += 1
+    return value
+
+
+def _convert_str(path, start, end):
+    return path[start:end].decode() if end > start else None
+
+
+def _convert_int(path, start, end):
+    value = _segment_int(path, start, end)
+    return None if value < 0 else value
+
+
+# URL parameter types. A converter returns the value of path[start:end],
+# or None when the segment does not match. "path" is handled by the router:
+# it takes the rest of the path.
+_CONVERTERS = {"str": _convert_str, "int": _convert_int}
+
+
+class _RouteNode:
+    """Path segment of the route trie"""
+
+    def __init__(self):
+        # Segment hash -> list of (segment, node)
+        self.static = {}
+        # (type, converter, node) of the parameters, tried in order when
+        # no static segment matches
+        self.params = []
+        # Node of a <path:name> parameter
+        self.rest = None
+        # Method -> (function, params) of the routes ending here, and the
+        # first of them, answering OPTIONS and 405
+        self.methods = {}
+        self.route = None
+
+    def child(self, segment):
+        children = self.static.setdefault(
+            _segment_hash(segment, 0, len(segment)), []
+        )
+        for s, node in children:
+            if s == segment:
+                return node
+        node = _RouteNode()
+        children.append((segment, node))
+        return node
+
+    def find(self, path, start, end):
+        """Child of the static segment path[start:end], or None"""
+        children = self.static.get(_segment_hash(path, start, end))
+        if children:
+            for segment, node in children:
+                if _segment_equal(path, start, end, segment):
+                    return node
+        return None
+
+    def param(self, kind):
+        if kind == "path":
+            if self.rest is None:
+                self.rest = _RouteNode()
+            return self.rest
+        for k, _, node in self.params:
+            if k == kind:
+                return node
+        node = _RouteNode()
+        entry = (kind, _CONVERTERS[kind], node)
+        # Strings match anything, so they come last
+        if kind == "str":
+            self.params.append(entry)
+        else:
+            self.params.insert(0, entry)
+        return node
+
+
 class webserver:
     DEFAULT_MAX_BODY_SIZE = 1024
 
-    def __init__(self, request_timeout=3, max_concurrency=3, backlog=16, debug=False):
+    def __init__(
+        self,
+        request_timeout=3,
+        max_concurrency=3,
+        backlog=16,
+        debug=False,
+        keep_alive_timeout=5,
+        max_keep_alive_requests=32,
+    ):
         """Tiny Web Server class.
         Keyword arguments:
             request_timeout - Time for client to send complete request
@@ -395,39 +946,62 @@ class webserver:
                               It is very important to limit this number because of
                               memory constrain.
                               Default value depends on platform
+                              Persistent connections waiting for their next
+                              request do not count: when all the slots are
+                              taken, a new connection closes one of them.
             backlog         - Parameter to socket.listen() function. Defines size of
                               pending to be accepted connections queue.
                               Must be greater than max_concurrency
             debug           - Whether send exception info (text + backtrace)
                               to client together with HTTP 500 or not.
+            keep_alive_timeout - Time a persistent connection waits for the
+                              next request before being closed.
+                              0 disables persistent connections.
+            max_keep_alive_requests - How many requests one connection can
+                              serve before being closed.
         """
         self.loop = asyncio.get_event_loop()
         self.request_timeout = request_timeout
         self.max_concurrency = max_concurrency
         self.backlog = backlog
         self.debug = debug
-        self.explicit_url_map = {}
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        # Requests served and connections accepted, to measure socket reuse
+        self.requests = 0
+        self.connections = 0
+        # Route trie, compiled by add_route(), and the nodes of the URLs
+        # without parameters, found with one dict lookup
+        self.routes = _RouteNode()
+        self.static_routes = {}
         self.catch_all_handler = None
-        self.parameterized_url_map = {}
         # Currently opened connections
         self.conns = {}
+        # Tasks of the persistent connections waiting for their next request
+        self.idle_conns = {}
+        # Whether accepting is paused, with max_concurrency busy connections
+        self.paused = False
         # Statistics
         self.processed_connections = 0
 
     def _find_url_handler(self, req):
         """Helper to find URL handler.
-        Returns tuple of (function, opts, param) or (None, None) if not found.
+        Returns tuple of (function, opts) or (None, None) if not found.
+        Values of the URL parameters are saved into req.args.
+
+        Static segments take precedence over parameters, int parameters
+        over str ones, and both over path ones. When the chosen child leads
+        to no route, the next candidate of the segment is tried.
         """
-        # First try - lookup in explicit (non parameterized URLs)
-        if req.path in self.explicit_url_map:
-            return self.explicit_url_map[req.path]
-        # Second try - strip last path segment and lookup in another map
-        idx = req.path.rfind(b"/") + 1
-        path2 = req.path[:idx]
-        if len(path2) > 0 and path2 in self.parameterized_url_map:
-            # Save parameter into request
-            req._param = req.path[idx:].decode()
-            return self.parameterized_url_map[path2]
+        path = req.path
+        node = self.static_routes.get(path)
+        if node is not None:
+            return node.methods.get(req.method, node.route)
+        args = []
+        node = self._match(path, args)
+        if node is not None:
+            req.args = tuple(args)
+            return node.methods.get(req.method, node.route)
 
         if self.catch_all_handler:
             return self.catch_all_handler
@@ -435,8 +1009,72 @@ class webserver:
         # No handler found
         return (None, None)
 
+    def _match(self, path, args):
+        """Walk the route trie along path and return the node of its route,
+        or None. Values of the URL parameters are appended to args.
+
+        Segments are path[start:end], walked in place. The first one is the
+        empty segment before the leading slash. The candidates of a segment
+        are numbered: 0 is the static child, then come the parameters and
+        the path parameter. The segments with candidates left are pushed
+        on a stack as (node, start, len(args), next candidate), which is
+        only allocated for nodes having alternatives.
+        """
+        node = self.routes
+        size = len(path)
+        start = 0
+        candidate = 0
+        stack = None
+        while True:
+            end = path.find(b"/", start)
+            if end < 0:
+                end = size
+            count = len(args)
+            params = node.params
+            child = None
+            if candidate == 0:
+                child = node.find(path, start, end)
+                candidate = 1
+            while child is None and candidate <= len(params):
+                _, convert, param_node = params[candidate - 1]
+                candidate += 1
+                value = convert(path, start, end)
+                if value is not None:
+                    args.append(value)
+                    child = param_node
+            if child is not None:
+                if candidate <= len(params) or node.rest is not None:
+                    if stack is None:
+                        stack = []
+                    stack.append((node, start, count, candidate))
+                if end < size:
+                    node = child
+                    start = end + 1
+                    candidate = 0
+                    continue
+                if child.route is not None:
+                    return child
+            elif (
+                candidate == len(params) + 1
+                and node.rest is not None
+                and end > start
+                and node.rest.route is not None
+            ):
+                args.append(path[start:].decode())
+                return node.rest
+            # Dead end: back to the last segment with candidates left
+            if not stack:
+                return None
+            node, start, count, candidate = stack.pop()
+            del args[count:]
+
     async def _handle_request(self, req, resp):
         await req.read_request_line()
+        # The connection is busy again, it can not be closed for a new one
+        self.idle_conns.pop(id(resp.writer.s), None)
+        self.requests += 1
+        if req.version == b"HTTP/1.1":
+            resp.version = "1.1"
         # Find URL handler
         req.handler, req.params = self._find_url_handler(req)
         if not req.handler:
@@ -449,49 +1087,105 @@ class webserver:
         # Read / parse headers
         await req.read_headers(req.params["save_headers"])
 
+    def _keep_alive(self, req, served):
+        """Whether the connection may serve another request after req"""
+        if not self.keep_alive_timeout or served >= self.max_keep_alive_requests:
+            return False
+        if req.chunked:
+            return False
+        if req.version == b"HTTP/1.1":
+            return req.connection != b"close"
+        return req.connection == b"keep-alive"
+
+    async def _finish(self, req, resp):
+        """Prepare the connection for the next request after a response.
+        Returns whether the connection is kept"""
+        # A handler that did not answer leaves the client waiting for
+        # the end of the connection
+        if not resp.keep_alive or not resp.headers_sent:
+            return False
+        # Skip what the handler left of a small body, so the next
+        # request starts at its request line
+        body = req.reader
+        if body.remaining > self.DEFAULT_MAX_BODY_SIZE:
+            return False
+        try:
+            await asyncio.wait_for(body.drain(), self.request_timeout)
+        except (asyncio.TimeoutError, EOFError):
+            return False
+        return True
+
     async def _handler(self, reader, writer):
-        """Handler for TCP connection with
-        HTTP/1.0 protocol implementation
+        """Handler for TCP connection with HTTP/1.1 protocol implementation.
+        Persistent connections serve requests one after another, so
+        pipelined requests are answered in order.
         """
-        gc.collect()
-
+        self.connections += 1
+        hid = id(writer.s)
+        served = 0
+        try:
+            while True:
+                gc.collect()
+                req = request(reader)
+                resp = response(writer)
+                # The first request must come within request_timeout, the
+                # next ones within keep_alive_timeout
+                timeout = self.request_timeout
+                if served:
+                    timeout = self.keep_alive_timeout
+                    # Idle until the request line: give the slot back
+                    self.idle_conns[hid] = asyncio.current_task()
+                    self._resume()
+                served += 1
+                if not await self._serve(req, resp, timeout, served):
+                    break
+        finally:
+            self.idle_conns.pop(hid, None)
+            await writer.aclose()
+            # Delete connection, using socket as a key
+            del self.conns[hid]
+            self._resume()
+
+    def _resume(self):
+        """Max concurrency support - schedule resume of the paused TCP server
+        task when a slot is free"""
+        if self.paused and len(self.conns) - len(self.idle_conns) < self.max_concurrency:
+            self.paused = False
+            self.loop.create_task(self._server_coro)
+
+    async def _serve(self, req, resp, timeout, served):
+        """Handle one request. Returns whether the connection is kept"""
         try:
-            req = request(reader)
-            resp = response(writer)
             # Read HTTP Request with timeout
-            await asyncio.wait_for(
-                self._handle_request(req, resp), self.request_timeout
-            )
+            await asyncio.wait_for(self._handle_request(req, resp), timeout)
+            resp.keep_alive = self._keep_alive(req, served)
 
             # OPTIONS method is handled automatically
             if req.method == b"OPTIONS":
                 resp.add_access_control_headers()
-                # Since we support only HTTP 1.0 - it is important
-                # to tell browser that there is no payload expected
+                # Tell browser that there is no payload expected
                 # otherwise some webkit based browsers (Chrome)
                 # treat this behavior as an error
                 resp.add_header("Content-Length", "0")
                 await resp._send_headers()
-                return
-
-            # Ensure that HTTP method is allowed for this path
-            if req.method not in req.params["methods"]:
-                raise HTTPException(405)
-
-            # Handle URL
-            gc.collect()
-            if hasattr(req, "_param"):
-                await req.handler(req, resp, req._param)
             else:
-                await req.handler(req, resp)
+                # Ensure that HTTP method is allowed for this path
+                if req.method not in req.params["methods"]:
+                    raise HTTPException(405)
+
+                # Handle URL
+                gc.collect()
+                await req.handler(req, resp, *req.args)
             # Done here
-        except (asyncio.CancelledError, asyncio.TimeoutError):
+            return await self._finish(req, resp)
+        except (asyncio.CancelledError, asyncio.TimeoutError, EOFError):
             pass
         except OSError as e:
             # Do not send response for connection related errors - too late :)
             # P.S. code 32 - is possible BROKEN PIPE error (TODO: is it true?)
             if e.args[0] not in (errno.ECONNABORTED, errno.ECONNRESET, 32):
                 try:
+                    resp.keep_alive = False
                     await resp.error(500)
                 except Exception as e:
                     log.exception(
@@ -499,7 +1193,13 @@ class webserver:
                     )
         except HTTPException as e:
             try:
-                await resp.error(e.code)
+                if not resp.headers_sent:
+                    # Errors found after the headers, like 404, keep the
+                    # connection
+                    if isinstance(req.reader, _BodyReader):
+                        resp.keep_alive = self._keep_alive(req, served)
+                    await resp.error(e.code)
+                    return await self._finish(req, resp)
             except Exception as e:
                 log.exception(
                     f"Failed to send error after HTTPException. Original error: {e}"
@@ -509,20 +1209,15 @@ class webserver:
             log.error(req.path.decode())
             log.exception(f"Unhandled exception in user's method. Original error: {e}")
             try:
+                resp.keep_alive = False
                 await resp.error(500)
                 # Send exception info if desired
                 if self.debug:
                     sys.print_exception(e, resp.writer.s)
             except Exception as e:
                 pass
-        finally:
-            await writer.aclose()
-            # Max concurrency support -
-            # if queue is full schedule resume of TCP server task
-            if len(self.conns) == self.max_concurrency:
-                self.loop.create_task(self._server_coro)
-            # Delete connection, using socket as a key
-            del self.conns[id(writer.s)]
+        # Errors close the connection: the response may be incomplete
+        return False
 
     def add_route(self, url, f, **kwargs):
         """Add URL to function mapping.
@@ -531,9 +1226,18 @@ class webserver:
             url - url to map function with
             f - function to map
 
+        URL segments like <name> or <type:name> are parameters, passed to
+        the function after req and resp, in order. Types are str (default),
+        int (up to 9 decimal digits), and path, which takes the rest of the URL and must be last:
+            /api/sensor/<name>/history/<int:window>
+            /files/<path:file>
+
+        Several routes can share a URL when their methods differ.
+
         Keyword arguments:
-            methods - list of allowed methods. Defaults to ['GET', 'POST']
-            save_headers - contains list of HTTP headers to be saved. Case sensitive. Default - empty.
+            methods - list of allowed methods. Defaults to ['GET']
+            save_headers - contains list of HTTP headers to be saved. Case insensitive,
+                           saved in req.headers under lowercase names. Default - empty.
             max_body_size - Max HTTP body size (e.g. POST form data). Defaults to 1024
             allowed_access_control_headers - Default value for the same name header. Defaults to *
             allowed_access_control_origins - Default value for the same name header. Defaults to *
@@ -553,20 +1257,42 @@ class webserver:
         # Convert methods/headers to bytestring
         params["methods"] = [x.encode().upper() for x in params["methods"]]
         params["save_headers"] = [x.encode().lower() for x in params["save_headers"]]
-        # If URL has a parameter
-        if url.endswith(">"):
-            idx = url.rfind("<")
-            path = url[:idx]
-            idx += 1
-            param = url[idx:-1]
-            if path.encode() in self.parameterized_url_map:
+        node = self._compile(url)
+        if "<" not in url:
+            self.static_routes[url.encode()] = node
+        for method in params["methods"]:
+            if method in node.methods:
                 raise ValueError("URL exists")
-            params["_param_name"] = param
-            self.parameterized_url_map[path.encode()] = (f, params)
-
-        if url.encode() in self.explicit_url_map:
-            raise ValueError("URL exists")
-        self.explicit_url_map[url.encode()] = (f, params)
+        for method in params["methods"]:
+            node.methods[method] = (f, params)
+        if node.route is None:
+            node.route = (f, params)
+        # OPTIONS and 405 answers list the methods of all routes of url
+        allowed = ", ".join([m.decode() for m in node.methods])
+        for _, route_params in node.methods.values():
+            route_params["allowed_access_control_methods"] = allowed
+
+    def _compile(self, url):
+        """Return the node of the route trie for url, adding missing nodes"""
+        if not url.startswith("/"):
+            raise ValueError("Invalid URL")
+        node = self.routes
+        segments = url.encode().split(b"/")
+        for i, segment in enumerate(segments):
+            if not (segment.startswith(b"<") and segment.endswith(b">")):
+                node = node.child(segment)
+                continue
+            kind = b"str"
+            spec = segment[1:-1].split(b":", 1)
+            if len(spec) == 2:
+                kind = spec[0]
+            kind = kind.decode()
+            if kind not in _CONVERTERS and kind != "path":
+                raise ValueError("Invalid URL parameter type: " + kind)
+            if kind == "path" and i != len(segments) - 1:
+                raise ValueError("Invalid URL: path parameter must be last")
+            node = node.param(kind)
+        return node
 
     def add_resource(self, cls, url, max_body_size=DEFAULT_MAX_BODY_SIZE, **kwargs):
         """Map resource (RestAPI) to URL
@@ -702,12 +1428,19 @@ class webserver:
                 )
                 self.conns[hid] = handler
                 self.loop.create_task(handler)
+                if len(self.conns) > self.max_concurrency:
+                    # Make room by closing a persistent connection waiting
+                    # for its next request
+                    _, task = self.idle_conns.popitem()
+                    task.cancel()
                 # In case of max concurrency reached - temporary pause server:
                 # 1. backlog must be greater than max_concurrency, otherwise
                 #    client will got "Connection Reset"
-                # 2. Server task will be resumed whenever one active connection finished
-                if len(self.conns) == self.max_concurrency:
+                # 2. Server task will be resumed whenever one busy connection
+                #    finished or waits for its next request
+                if len(self.conns) - len(self.idle_conns) >= self.max_concurrency:
                     # Pause
+                    self.paused = True
                     yield False
         except asyncio.CancelledError:
             return
@@ -11,14 +11,20 @@ import binascii
 import json
 from machine import Pin, PWM # type: ignore
 from libs.display.st7789 import ST7789
-from libs.sensor.mpu6886 import MPU6886
+from libs.sensor.sensorcontroller import SensorController
 from libs.rtc.pcf8563 import PCF8563
 import libs.display.colors as colors
 import os
 import libs.network.tinyweb as tinyweb
-from libs.network.tinyweb import response, request
+from libs.network.tinyweb import response, request, HTTPException
 import libs.std.logging as logging
-from libs.display.bitmap import Bitmap
+from libs.display.animation import Player
+from libs.display.bitmap import Bitmap, BitmapDecoder, RawDecoder
+from libs.display.qoi import QOI, QOIDecoder
+from libs.display.renderer import Renderer
+from libs.display.rgb565file import RGB565File
+from libs.display.layout import TextBlock, LEFT, CENTER, RIGHT
+from libs.display.widgets import Scene
 
 class Config():
     def __init__(self, config_path):
@@ -42,8 +48,17 @@ class WebController:
     DEFAULT_MESSAGE = "OK"
     DEFAULT_TEXT_X = 10
     DEFAULT_TEXT_Y = 20
+    TEXT_LINE_SPACING = 2
     DATA_FOLDER = "/data"
+    BACKGROUND_PATH = f"{DATA_FOLDER}/background.rgb565"
+    # Uploaded QOI backgrounds are kept as sent, smaller than RGB565
+    BACKGROUND_QOI_PATH = f"{DATA_FOLDER}/background.qoi"
+    PUBLIC_FOLDER = "public"
+    # Written by tools/build_assets.py
+    ASSETS_PATH = f"{PUBLIC_FOLDER}/assets.json"
     CHUNK_SIZE = 1024
+    SCREENSHOT_CHUNK_SIZE = 2048
+    MAX_IMAGE_SIZE = 200000
 
     def __init__(
         self,
@@ -51,7 +66,7 @@ class WebController:
         ledcontroller: LEDController,
         backlight: Pin,
         display: ST7789,
-        sensor: MPU6886,
+        sensor: SensorController,
         rtc: PCF8563,
         buzzercontroller: BuzzerController
     ) -> None:
@@ -85,75 +100,284 @@ class WebController:
             self.logger.warning("Default WLAN to connect does not exists.")
             
         # LCD Parameters
-        self.display
         self.display_parameters = {
             "background_color" : colors.BLACK,
             "foreground_color" : colors.WHITE,
-            "background_image" : None,
             "text_x" : self.DEFAULT_TEXT_X,
-            "text_y" : self.DEFAULT_TEXT_Y
+            "text_y" : self.DEFAULT_TEXT_Y,
+            "text_align" : LEFT,
+            "text_block" : None
         }
         
         # Start default screen
         ap_info = wlancontroller.get_ap_info()
         self.backlight.on()
-        self.display.fill(self.display_parameters["background_color"])
-        display.text(
-            f"AP SSID: {ap_info["ssid"]}",
-            self.DEFAULT_TEXT_X,
-            self.DEFAULT_TEXT_Y,
-            self.display_parameters["foreground_color"],
-            self.display_parameters["background_color"],
-        )
-        display.text(
-            f"AP IP: {ap_info["ip"]}",
-            self.DEFAULT_TEXT_X,
-            self.DEFAULT_TEXT_Y + 10,
-            self.display_parameters["foreground_color"],
-            self.display_parameters["background_color"],
+        WebController.draw_background(self.display, self.display_parameters)
+        self.scene = Scene(self.display)
+        # Drawing from the handlers is queued and applied by one task
+        self.renderer = Renderer(self.display)
+        self.player = Player(self.display, lock=self.renderer.lock, on_done=self.player_done)
+        # Built on the first screenshot
+        self.screenshot_header = None
+        WebController.draw_text(
+            self.scene,
+            self.display_parameters,
+            f"AP SSID: {ap_info["ssid"]}\nAP IP: {ap_info["ip"]}",
         )
+        self.display.flush()
 
         # Define routes
-        self.app.add_route("/", self.root)
+        self.assets = Config(self.ASSETS_PATH)
+        self.app.add_route("/", self.root, save_headers=["Accept-Encoding", "If-None-Match"])
         self.app.add_resource(WebController.AP, "/api/ap", wlancontroller=self.wlancontroller)
         self.app.add_resource(WebController.STA, "/api/sta", wlancontroller=self.wlancontroller)
         self.app.add_resource(WebController.WLANList, "/api/wlan", wlancontroller=self.wlancontroller)
         self.app.add_resource(WebController.WLANConnect, "/api/wlan/connect", wlancontroller=self.wlancontroller, config=self.config)
         self.app.add_resource(WebController.RTC, "/api/rtc", rtc=self.rtc)
         self.app.add_resource(WebController.DisplayBacklight, "/api/display/backlight/toggle", backlight=self.backlight)
-        self.app.add_resource(WebController.DisplayBackgroundColor, "/api/display/background/color", display=self.display, display_parameters=self.display_parameters)
-        self.app.add_resource(WebController.DisplayBackgroundImage, "/api/display/background/image", max_body_size=200000, display=self.display, display_parameters=self.display_parameters)
+        self.app.add_resource(WebController.DisplayBackgroundColor, "/api/display/background/color", display=self.display, display_parameters=self.display_parameters, background_path=self.BACKGROUND_PATH, qoi_background_path=self.BACKGROUND_QOI_PATH, scene=self.scene, renderer=self.renderer)
+        self.app.add_resource(WebController.DisplayBackgroundImage, "/api/display/background/image", max_body_size=self.MAX_IMAGE_SIZE, display=self.display, background_path=self.BACKGROUND_PATH, qoi_background_path=self.BACKGROUND_QOI_PATH, scene=self.scene, renderer=self.renderer)
+        self.app.add_route("/api/display/screenshot", self.screenshot)
+        self.app.add_route("/api/display/background/raw", self.background_raw, methods=["POST"], save_headers=["Content-Length", "Content-Type"], max_body_size=self.MAX_IMAGE_SIZE)
         self.app.add_resource(WebController.DisplayForegroundColor, "/api/display/foreground/color", display_parameters=self.display_parameters)
-        self.app.add_resource(WebController.DisplayText, "/api/display/text", display=self.display, display_parameters=self.display_parameters)
+        self.app.add_resource(WebController.DisplayText, "/api/display/text", display_parameters=self.display_parameters, scene=self.scene, renderer=self.renderer)
+        self.app.add_resource(WebController.DisplayPlayer, "/api/display/player", player=self.player, display=self.display, display_parameters=self.display_parameters, scene=self.scene, renderer=self.renderer)
         self.app.add_resource(WebController.SensorTemperature, "/api/sensor/temperature", sensor=self.sensor)
         self.app.add_resource(WebController.SensorRotation, "/api/sensor/rotation", sensor=self.sensor)
         self.app.add_resource(WebController.SensorAcceleration, "/api/sensor/acceleration", sensor=self.sensor)
         self.app.add_resource(WebController.LED, "/api/led/toggle", ledcontroller=self.ledcontroller)
         self.app.add_resource(WebController.Buzzer, "/api/buzzer", buzzercontroller=self.buzzercontroller)
 
+    @staticmethod
+    def draw_text(scene: Scene, display_parameters: dict, text: str):
+        """Show text wrapped over the background, at the text position and
+        alignment of the display parameters.
+
+        Only the lines that changed are redrawn, and in them only the glyphs
+        that changed; the background under removed glyphs is restored from
+        the scene. The caller flushes.
+        """
+        block = display_parameters["text_block"]
+        x = display_parameters["text_x"]
+        y = display_parameters["text_y"]
+        align = display_parameters["text_align"]
+        if block is not None and (block.x != x or block.y != y or block.align != align):
+            block.clear()
+            block = None
+        if block is None:
+            width = scene.display.width
+            # Same margin on both sides when it fits, for centered text
+            width = width - 2 * x if 2 * x < width else width - x
+            block = TextBlock(scene, x, y, width, align=align, line_spacing=WebController.TEXT_LINE_SPACING)
+            display_parameters["text_block"] = block
+        block.set_colors(display_parameters["foreground_color"])
+        block.set(text)
+        scene.render(flush=False)
+
+    @staticmethod
+    def draw_background(display: ST7789, display_parameters: dict):
+        """Draw the saved background image, or the background color"""
+        try:
+            try:
+                with open(WebController.BACKGROUND_QOI_PATH, "rb") as f:
+                    QOI.draw_stream(f, display, display.width, display.height)
+            except OSError:
+                RGB565File.draw(WebController.BACKGROUND_PATH, display)
+        except OSError:
+            display.fill(display_parameters["background_color"])
+        except Exception as e:
+            logging.getLogger("WEBCONTROLLER").warning(f"Saved background ignored: {str(e)}")
+            display.fill(display_parameters["background_color"])
+
+    @staticmethod
+    def fill_background(scene: Scene, color: int):
+        scene.display.fill(color)
+        scene.capture()
+        scene.render(flush=False)
+
+    @staticmethod
+    def draw_base64_background(file: str, display: ST7789, background_path: str, qoi_background_path: str, scene: Scene):
+        Bitmap.draw_base64bitmap(file, display)
+        RGB565File.save(display, background_path)
+        WebController.remove_files(qoi_background_path)
+        scene.capture()
+        scene.render(flush=False)
+
+    @staticmethod
+    def redraw_background(display: ST7789, display_parameters: dict, scene: Scene):
+        WebController.draw_background(display, display_parameters)
+        scene.capture()
+        scene.render(flush=False)
+
+    def player_done(self):
+        """Put the background and the widgets back after a playback ended by
+        itself, as stopping it does"""
+        self.renderer.submit("background", WebController.redraw_background, self.display, self.display_parameters, self.scene)
+
+    @staticmethod
+    def remove_files(*paths):
+        """Remove files, ignoring the missing ones"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def parse_color(data: dict):
+        """RGB565 value of the r, g and b channels of a request, or None if
+        one of them is not an integer from 0 to 255"""
+        channels = (data.get("r"), data.get("g"), data.get("b"))
+        for channel in channels:
+            if not isinstance(channel, int) or not 0 <= channel <= 255:
+                return None
+        return colors.rgb565(channels)
+
     def start(self):
+        """Start the web server and renderer tasks. They run in the event
+        loop of the caller."""
         self.app.run(host='0.0.0.0', port=80, loop_forever=False)
-        
-    async def stop_coro(self):
-        self.app.loop.stop()
-        
-    async def stop(self):
-        return await self.stop_coro()
-
-    def process(self):
-        self.app.loop.create_task(self.stop())
-        self.app.loop.run_forever()
+        self.renderer.start()
 
     async def root(self, req: request, resp: response):
+        asset = self.assets.get_property("/")
+        if asset is None or b"gzip" not in req.headers.get(b"accept-encoding", b""):
+            # Assets not built, or client without gzip
+            await resp.send_file(
+                f"{self.PUBLIC_FOLDER}/index.html", content_type="text/html", max_age=0, buf_size=self.CHUNK_SIZE
+            )
+            return
+        etag = f'"{asset["etag"]}"'
+        resp.add_header("ETag", etag)
+        resp.add_header("Vary", "Accept-Encoding")
+        # max-age=0: the browser revalidates the cached page on every load
+        if etag.encode() in req.headers.get(b"if-none-match", b""):
+            resp.code = 304
+            resp.add_header("Cache-Control", "max-age=0, public")
+            await resp._send_headers()
+            return
+        await resp.send_file(
+            f"{self.PUBLIC_FOLDER}/{asset["file"]}",
+            content_type=asset["type"],
+            content_encoding="gzip",
+            max_age=0,
+            buf_size=self.CHUNK_SIZE,
+        )
+
+    async def screenshot(self, req: request, resp: response):
+        """Stream the retained frame as a 16-bit BMP, a few rows per chunk.
+        The display is leased for the whole response, so the renderer and the
+        player do not draw between the chunks."""
         del req
-        await resp.start_html()
-        with open("public/index.html") as f:
-            while True:
-                data = f.read(1024)
-                if not data:
+        display = self.display
+        if self.screenshot_header is None:
+            self.screenshot_header = Bitmap.rgb565_header(display.width, display.height)
+        row_len = (display.width * 2 + 3) & ~3
+        rows = max(1, self.SCREENSHOT_CHUNK_SIZE // row_len)
+        chunk = memoryview(bytearray(rows * row_len))
+        resp.add_header("Cache-Control", "no-store")
+        resp.add_access_control_headers()
+        await resp.start_chunked("image/bmp")
+        await resp.send_chunk(self.screenshot_header)
+        async with self.renderer.lease():
+            # Bitmap rows are stored bottom-up
+            y = display.height
+            while y > 0:
+                count = min(rows, y)
+                for i in range(count):
+                    y -= 1
+                    display.read_buffer(
+                        0, y, display.width, 1, chunk[i * row_len :], little_endian=True
+                    )
+                await resp.send_chunk(chunk[: count * row_len])
+        await resp.end_chunked()
+
+    async def background_raw(self, req: request, resp: response):
+        """Stream an image (BMP, QOI or raw big-endian RGB565, or little-endian
+        with ?byteorder=little) into the display. The image is the
+        application/octet-stream body, or the first file of a
+        multipart/form-data body. Bodies may be sent chunked."""
+        content_type = req.content_type.split(b";", 1)[0]
+        if content_type not in (b"application/octet-stream", b"multipart/form-data"):
+            raise HTTPException(415)
+        if not req.content_length and not req.chunked:
+            raise HTTPException(411)
+        query = tinyweb.parse_query_string(req.query_string.decode())
+        little_endian = query.get("byteorder") == "little"
+
+        buf = bytearray(self.CHUNK_SIZE)
+        if content_type == b"multipart/form-data":
+            image = None
+            async for part in req.multipart(buf):
+                if part.filename is not None:
+                    image = part
                     break
-                await resp.send(data)
-                
+            if image is None:
+                raise HTTPException(400)
+        else:
+            image = req.body(buf)
+
+        # A queued background would be drawn over this one
+        self.renderer.cancel("background")
+        async with self.renderer.lease():
+            decoder = None
+            # QOI images are also written to flash while decoding
+            qoi_file = None
+            qoi_tmp_path = self.BACKGROUND_QOI_PATH + ".tmp"
+            try:
+                async for chunk in image:
+                    if decoder is None:
+                        magic = bytes(chunk[0:4])
+                        if magic[0:2] == b"BM":
+                            decoder = BitmapDecoder(self.display)
+                        elif magic == b"qoif":
+                            decoder = QOIDecoder(
+                                self.display, self.display.width, self.display.height
+                            )
+                            qoi_file = open(qoi_tmp_path, "wb")
+                        else:
+                            decoder = RawDecoder(
+                                self.display, self.display.width, self.display.height, little_endian
+                            )
+                    decoder.feed(chunk)
+                    if qoi_file:
+                        qoi_file.write(chunk)
+                if decoder is None:
+                    raise Exception("Wrong file size: the image is empty")
+                decoder.close()
+                if qoi_file:
+                    qoi_file.close()
+                    qoi_file = None
+                    os.rename(qoi_tmp_path, self.BACKGROUND_QOI_PATH)
+                    WebController.remove_files(self.BACKGROUND_PATH)
+                else:
+                    RGB565File.save(self.display, self.BACKGROUND_PATH)
+                    WebController.remove_files(self.BACKGROUND_QOI_PATH)
+                result = {"message": "Background image changed.", "result": None}
+            except HTTPException as e:
+                # Body too large or malformed
+                resp.code = e.code
+                result = {"message": "Wrong image: body rejected", "result": None}
+                # Do not keep the rows drawn before the error
+                WebController.draw_background(self.display, self.display_parameters)
+            except Exception as e:
+                resp.code = 400
+                result = {"message": f"Wrong image: {str(e)}", "result": None}
+                WebController.draw_background(self.display, self.display_parameters)
+            if qoi_file:
+                qoi_file.close()
+                WebController.remove_files(qoi_tmp_path)
+            self.scene.capture()
+            self.scene.render(flush=False)
+            await self.display.flush_async()
+
+        result = json.dumps(result).encode()
+        resp.add_header("Content-Type", "application/json")
+        resp.add_header("Content-Length", str(len(result)))
+        resp.add_access_control_headers()
+        await resp._send_headers()
+        await resp.send(result)
+
     class AP:
         def get(self, data, wlancontroller: WLANController):
             del data
@@ -226,51 +450,104 @@ class WebController:
             return {"message": "Backlight toggled.", "result" : None}
         
     class DisplayBackgroundColor:
-        def post(self, data, display: ST7789, display_parameters: dict):
-            display_parameters["background_color"] = colors.rgb565(data["r"], data["g"], data["b"])
-            display.fill(display_parameters["background_color"])
-            display_parameters["background_image"] = None
+        def post(self, data, display: ST7789, display_parameters: dict, background_path: str, qoi_background_path: str, scene: Scene, renderer: Renderer):
+            color = WebController.parse_color(data)
+            if color is None:
+                return {"message": "Wrong color: expecting r, g and b from 0 to 255.", "result": None}, 400
+            display_parameters["background_color"] = color
+            renderer.submit("background", WebController.fill_background, scene, display_parameters["background_color"])
+            WebController.remove_files(background_path, qoi_background_path)
             return {"message" : "Background color changed.", "result": None}
         
     class DisplayBackgroundImage:
-        def post(self, data, display: ST7789, display_parameters: dict):
-            bitmap_base64 = data["file"]
-            pixels = Bitmap.extract_pixels_from_base64bitmap(bitmap_base64)
-            display.image(pixels)
-            display_parameters["background_image"] = pixels
+        def post(self, data, display: ST7789, background_path: str, qoi_background_path: str, scene: Scene, renderer: Renderer):
+            # Decoding errors are only logged once queued, check the headers now
+            try:
+                Bitmap.check_base64bitmap(data["file"])
+            except Exception as e:
+                return {"message": str(e), "result": None}, 400
+            renderer.submit("background", WebController.draw_base64_background, data["file"], display, background_path, qoi_background_path, scene)
             return {"message" : "Background image changed.", "result": None}
         
     class DisplayForegroundColor:
         def post(self, data, display_parameters: dict):
-            display_parameters["foreground_color"] = colors.rgb565(data["r"], data["g"], data["b"])
+            color = WebController.parse_color(data)
+            if color is None:
+                return {"message": "Wrong color: expecting r, g and b from 0 to 255.", "result": None}, 400
+            display_parameters["foreground_color"] = color
             return {"message": "Foreground color changed.", "result": None}
         
     class DisplayText:
-        def post(self, data, display: ST7789, display_parameters: dict):
-            if display_parameters["background_image"]:
-                display.image(display_parameters["background_image"])
-            else:
-                display.fill(display_parameters["background_color"])
-            display.text(
-                data["text"], display_parameters["text_x"], display_parameters["text_y"], display_parameters["foreground_color"], display_parameters["background_color"]
-            )
+        def post(self, data, display_parameters: dict, scene: Scene, renderer: Renderer):
+            text = data.get("text")
+            x = data.get("x", display_parameters["text_x"])
+            y = data.get("y", display_parameters["text_y"])
+            align = data.get("align", display_parameters["text_align"])
+            if not isinstance(text, str):
+                return {"message": "Wrong text: expecting a string.", "result": None}, 400
+            if not isinstance(x, int) or not isinstance(y, int):
+                return {"message": "Wrong position: expecting integers.", "result": None}, 400
+            if not (0 <= x < scene.display.width and 0 <= y < scene.display.height):
+                return {"message": "Wrong position: outside of the display.", "result": None}, 400
+            if align not in (LEFT, CENTER, RIGHT):
+                return {"message": "Wrong alignment: expecting left, center or right.", "result": None}, 400
+            display_parameters["text_x"] = x
+            display_parameters["text_y"] = y
+            display_parameters["text_align"] = align
+            renderer.submit("text", WebController.draw_text, scene, display_parameters, text)
             return {"message" : "Text written.", "result": None}
     
+    class DisplayPlayer:
+        def get(self, data, player: Player, display: ST7789, display_parameters: dict, scene: Scene, renderer: Renderer):
+            del data
+            return {"message": "Player status returned.", "result": player.status()}
+
+        def post(self, data, player: Player, display: ST7789, display_parameters: dict, scene: Scene, renderer: Renderer):
+            loop = data.get("loop", True)
+            if "animation" in data:
+                animation = data["animation"]
+                fps = data.get("fps")
+                if not isinstance(animation, str):
+                    return {"message": "Expecting the path of an animation.", "result": None}, 400
+                if fps is not None and (not isinstance(fps, (int, float)) or int(fps) <= 0):
+                    return {"message": "Expecting a positive fps.", "result": None}, 400
+                player.play(animation, int(fps) if fps else None, loop)
+            elif "images" in data:
+                images = data["images"]
+                interval = data.get("interval", 5)
+                if not isinstance(images, list) or not images:
+                    return {"message": "Expecting a list of images.", "result": None}, 400
+                for image in images:
+                    if not isinstance(image, str):
+                        return {"message": "Expecting a list of image paths.", "result": None}, 400
+                if not isinstance(interval, (int, float)) or int(interval * 1000) <= 0:
+                    return {"message": "Expecting an interval of at least 1 ms.", "result": None}, 400
+                player.slideshow(images, int(interval * 1000), loop)
+            else:
+                return {"message": "Expecting an animation or images.", "result": None}, 400
+            return {"message": "Player started.", "result": player.status()}
+
+        def delete(self, data, player: Player, display: ST7789, display_parameters: dict, scene: Scene, renderer: Renderer):
+            del data
+            player.stop()
+            renderer.submit("background", WebController.redraw_background, display, display_parameters, scene)
+            return {"message": "Player stopped.", "result": None}
+
     class SensorTemperature:
-        def get(self, data, sensor: MPU6886):
+        def get(self, data, sensor: SensorController):
             del data
             temperature = {"temperature":sensor.temperature}
             return {"message": "Sensor temperature returned.", "result" : temperature}
 
     class SensorRotation:
-        def get(self, data, sensor: MPU6886):
+        def get(self, data, sensor: SensorController):
             del data
             gyro = sensor.gyro
             rotation = {"x": gyro[0], "y": gyro[1], "z": gyro[2]}
             return {"message" : "Sensor rotation data returned.", "result" : rotation}
         
     class SensorAcceleration:
-        def get(self, data, sensor: MPU6886):
+        def get(self, data, sensor: SensorController):
             del data
             acceleration = sensor.acceleration
             acceleration_data = {
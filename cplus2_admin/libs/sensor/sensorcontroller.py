@@ -0,0 +1,72 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+"""
+
+import asyncio
+import time
+
+from libs.sensor.mpu6886 import MPU6886
+import libs.std.logging as logging
+
+
+class SensorController:
+    """Latest readings of the MPU6886, sampled by a task.
+
+    Request handlers read the cached values instead of waiting on the I2C
+    bus. The task samples every interval_ms while the readings are used and
+    sleeps when nobody asked for them during idle_ms.
+    """
+
+    def __init__(self, sensor: MPU6886, interval_ms=100, idle_ms=2000) -> None:
+        self.logger: logging.Logger = logging.getLogger("SENSORCONTROLLER")
+        self.sensor = sensor
+        self.interval_ms = interval_ms
+        self.idle_ms = idle_ms
+        self.event = asyncio.Event()
+        self.samples = 0
+        self.sample()
+        self.last_read = self.sampled_at
+
+    def sample(self):
+        self.acceleration_value = self.sensor.acceleration
+        self.gyro_value = self.sensor.gyro
+        self.temperature_value = self.sensor.temperature
+        self.sampled_at = time.ticks_ms()
+        self.samples += 1
+
+    def _read(self):
+        now = time.ticks_ms()
+        self.last_read = now
+        if time.ticks_diff(now, self.sampled_at) > self.interval_ms * 2:
+            # The task was idle: do not return a stale reading
+            self.sample()
+            self.event.set()
+
+    @property
+    def acceleration(self):
+        self._read()
+        return self.acceleration_value
+
+    @property
+    def gyro(self):
+        self._read()
+        return self.gyro_value
+
+    @property
+    def temperature(self):
+        self._read()
+        return self.temperature_value
+
+    async def run(self):
+        while True:
+            if time.ticks_diff(time.ticks_ms(), self.last_read) > self.idle_ms:
+                self.event.clear()
+                await self.event.wait()
+            else:
+                try:
+                    self.sample()
+                except OSError as e:
+                    self.logger.warning(f"Sensor reading failed: {str(e)}")
+            await asyncio.sleep_ms(self.interval_ms)
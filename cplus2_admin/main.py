@@ -1,16 +1,21 @@
 from machine import I2C, Pin, SPI, ADC, PWM  # type: ignore
-from libs.display.st7789 import ST7789, ColorMode_16bit
+from libs.display.st7789 import ST7789, ColorMode_16bit, palette_rgb332
 from libs.rtc.pcf8563 import PCF8563
 from libs.sensor.mpu6886 import MPU6886, SF_G, SF_DEG_S
+from libs.sensor.sensorcontroller import SensorController
 from libs.network.wlancontroller import WLANController
 from libs.network.webcontroller import WebController
 from libs.button.buttoncontroller import ButtonController
 from libs.led.ledcontroller import LEDController
 from libs.audio.buzzercontroller import BuzzerController
 import libs.std.logging as logging
+import asyncio
 import gc
 import os
 
+# Builds without SPIRAM have less than 1MB of heap
+HAS_SPIRAM = gc.mem_free() + gc.mem_alloc() > 1024 * 1024
+
 logging.basicConfig(
     level=logging.INFO, format="%(name)s %(asctime)s %(levelname)s %(message)s"
 )
@@ -55,7 +60,14 @@ class Admin:
         mosi=Pin(15, Pin.OUT),
     )
 
-    # Set up ST7789 LCD
+    # Set up ST7789 LCD. Without SPIRAM, an 8-bit palette framebuffer
+    # (240x135x1) takes half the RAM of the RGB565 one (240x135x2)
+    if HAS_SPIRAM:
+        framebuffer = bytearray(64800)
+        palette = None
+    else:
+        framebuffer = bytearray(32400)
+        palette = palette_rgb332()
     display = ST7789(
         spi=spi,
         width=240,
@@ -65,7 +77,8 @@ class Admin:
         reset=Pin(12, Pin.OUT),
         dc=Pin(14, Pin.OUT),
         cs=Pin(5, Pin.OUT),
-        buf=bytearray(64800),  # Image size: 240x135x2
+        framebuffer=framebuffer,
+        palette=palette,
         color_mode=ColorMode_16bit,
     )
     display.change_orientation("RLANDSCAPE")
@@ -84,6 +97,9 @@ class Admin:
         # Create Buzzer Controller
         self.buzzercontroller = BuzzerController(self.buzzer)
 
+        # Create Sensor Controller
+        self.sensorcontroller = SensorController(self.sensor)
+
         # Create network
         self.wlancontroller = WLANController()
         self.wlancontroller.configure_ap()
@@ -93,11 +109,10 @@ class Admin:
             self.ledcontroller,
             self.backlight,
             self.display,
-            self.sensor,
+            self.sensorcontroller,
             self.rtc,
             self.buzzercontroller,
         )
-        self.webcontroller.start()
 
         # Create Button Controllers
         self.button_a_controller = ButtonController(self.button_a, "Button A")
@@ -112,6 +127,17 @@ class Admin:
         self.button_c_controller.register_event("on_press", self.ledcontroller.on)
         self.button_c_controller.register_event("on_release", self.ledcontroller.off)
 
+    async def run(self):
+        """Run the application as cooperating tasks, which sleep when idle"""
+        # Web server and display renderer
+        self.webcontroller.start()
+        await asyncio.gather(
+            self.button_a_controller.run(),
+            self.button_b_controller.run(),
+            self.button_c_controller.run(),
+            self.sensorcontroller.run(),
+        )
+
 
 if __name__ == "__main__":
     admin = Admin()
@@ -129,16 +155,5 @@ if __name__ == "__main__":
     logger.info(
         f"Flash used: {total_space-free_space}/{total_space} bytes ({(((total_space-free_space)/total_space)*100):.2f}%)"
     )
-    logger.info("Initializing infinite loop...")
-    while True:
-        # Process events from Button A
-        admin.button_a_controller.process()
-
-        # Process events from Button B
-        admin.button_b_controller.process()
-
-        # Process events from Button C
-        admin.button_c_controller.process()
-
-        # Process Web server requests
-        admin.webcontroller.process()
+    logger.info("Starting event loop...")
+    asyncio.run(admin.run())
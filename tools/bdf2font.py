@@ -0,0 +1,110 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Convert a BDF bitmap font into the binary format read by libs.display.font.
+
+Usage:
+    python3 tools/bdf2font.py font.bdf cplus2_admin/fonts/font.bin [first] [last]
+
+Characters from first to last (default 32 to 126) are converted. Glyphs are
+placed on a cell as tall as the font ascent plus descent and as wide as
+their advance (DWIDTH), so proportional fonts keep their spacing.
+"""
+
+import struct
+import sys
+
+MAGIC = b"MPF1"
+
+
+def parse_bdf(path):
+    glyphs = {}
+    ascent = descent = None
+    bbox = None
+    with open(path) as f:
+        lines = iter(f.read().splitlines())
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == "FONTBOUNDINGBOX":
+            bbox = [int(v) for v in fields[1:5]]
+        elif fields[0] == "FONT_ASCENT":
+            ascent = int(fields[1])
+        elif fields[0] == "FONT_DESCENT":
+            descent = int(fields[1])
+        elif fields[0] == "STARTCHAR":
+            glyph = {"bitmap": []}
+            for line in lines:
+                fields = line.split()
+                if not fields:
+                    continue
+                if fields[0] == "ENCODING":
+                    glyph["encoding"] = int(fields[1])
+                elif fields[0] == "DWIDTH":
+                    glyph["advance"] = int(fields[1])
+                elif fields[0] == "BBX":
+                    glyph["bbx"] = [int(v) for v in fields[1:5]]
+                elif fields[0] == "BITMAP":
+                    for line in lines:
+                        if line.strip() == "ENDCHAR":
+                            break
+                        glyph["bitmap"].append(int(line.strip(), 16))
+                    break
+            glyphs[glyph["encoding"]] = glyph
+    if ascent is None or descent is None:
+        ascent = bbox[1] + bbox[3]
+        descent = -bbox[3]
+    return glyphs, ascent, descent
+
+
+def render_glyph(glyph, ascent, height):
+    width = glyph.get("advance", glyph["bbx"][0])
+    bbx_width, bbx_height, x_offset, y_offset = glyph["bbx"]
+    row_bytes = (width + 7) // 8
+    data = bytearray(row_bytes * height)
+    # BDF rows are padded to whole bytes, most significant bit first
+    source_bits = (bbx_width + 7) // 8 * 8
+    top = ascent - (bbx_height + y_offset)
+    for row, bits in enumerate(glyph["bitmap"]):
+        y = top + row
+        if not 0 <= y < height:
+            continue
+        for column in range(bbx_width):
+            if bits & (1 << (source_bits - 1 - column)):
+                x = x_offset + column
+                if 0 <= x < width:
+                    data[y * row_bytes + x // 8] |= 0x80 >> (x % 8)
+    return width, data
+
+
+def convert(source, destination, first=32, last=126):
+    glyphs, ascent, descent = parse_bdf(source)
+    height = ascent + descent
+    blank = {"advance": height // 2, "bbx": [0, 0, 0, 0], "bitmap": []}
+    widths = bytearray()
+    offsets = bytearray()
+    bitmaps = bytearray()
+    for code in range(first, last + 1):
+        width, data = render_glyph(glyphs.get(code, blank), ascent, height)
+        widths.append(width)
+        offsets += struct.pack("<H", len(bitmaps))
+        bitmaps += data
+    if len(bitmaps) > 0xFFFF:
+        raise ValueError("Font too large: bitmaps must fit in 64 KB")
+    with open(destination, "wb") as f:
+        f.write(struct.pack("<4sBBBB", MAGIC, height, first, last - first + 1, 0))
+        f.write(widths)
+        f.write(offsets)
+        f.write(bitmaps)
+    print(f"{destination}: {height}px, {last - first + 1} glyphs, {len(bitmaps)} bytes")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    args = [int(v) for v in sys.argv[3:5]]
+    convert(sys.argv[1], sys.argv[2], *args)
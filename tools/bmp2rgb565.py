@@ -0,0 +1,89 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Convert a BMP image into the RGB565 file format read by
+libs.display.rgb565file and libs.display.sprite.
+
+Usage:
+    python3 tools/bmp2rgb565.py image.bmp cplus2_admin/icons/image.rgb565 [--rle]
+
+16-bit (RGB555 or RGB565 bit fields), 24-bit and 32-bit bitmaps are
+supported. Sprite sheets must stay raw, so tiles can be read on demand;
+--rle is meant for full screen images.
+"""
+
+import struct
+import sys
+
+MAGIC = b"R565"
+RAW = 0
+RLE = 1
+
+
+def read_bmp(path):
+    """Return width, height and the RGB565 pixels, top to bottom"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[0:2] != b"BM":
+        raise ValueError("Not a bitmap file")
+    offset = struct.unpack_from("<I", data, 10)[0]
+    width, height, _, bits, compression = struct.unpack_from("<iiHHI", data, 18)
+    rgb565 = False
+    if compression == 3:
+        red_mask = struct.unpack_from("<I", data, 54)[0]
+        rgb565 = red_mask == 0xF800
+    elif compression != 0:
+        raise ValueError("Compressed bitmaps are not supported")
+    if bits not in (16, 24, 32):
+        raise ValueError(f"{bits}-bit bitmaps are not supported")
+    bottom_up = height > 0
+    height = abs(height)
+    row_len = (width * bits + 31) // 32 * 4
+    pixels = []
+    for y in range(height):
+        row = height - 1 - y if bottom_up else y
+        start = offset + row * row_len
+        for x in range(width):
+            if bits == 16:
+                value = struct.unpack_from("<H", data, start + x * 2)[0]
+                if not rgb565:
+                    green = (value >> 5) & 0x1F
+                    green = green << 1 | green >> 4
+                    value = (value & 0x7C00) << 1 | green << 5 | value & 0x1F
+            else:
+                i = start + x * bits // 8
+                b, g, r = data[i], data[i + 1], data[i + 2]
+                value = (r & 0xF8) << 8 | (g & 0xFC) << 3 | b >> 3
+            pixels.append(value)
+    return width, height, pixels
+
+
+def encode(pixels, rle):
+    if not rle:
+        return b"".join(struct.pack(">H", p) for p in pixels)
+    records = bytearray()
+    i = 0
+    while i < len(pixels):
+        run = 1
+        while i + run < len(pixels) and run < 0xFFFF and pixels[i + run] == pixels[i]:
+            run += 1
+        records += struct.pack("<H", run) + struct.pack(">H", pixels[i])
+        i += run
+    return bytes(records)
+
+
+def convert(source, destination, rle=False):
+    width, height, pixels = read_bmp(source)
+    with open(destination, "wb") as f:
+        f.write(struct.pack("<4sHHBB", MAGIC, width, height, RLE if rle else RAW, 0))
+        f.write(encode(pixels, rle))
+    print(f"{destination}: {width}x{height}, {'RLE' if rle else 'raw'}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2], "--rle" in sys.argv[3:])
@@ -0,0 +1,89 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Minify and gzip the static assets of the admin page.
+
+Usage:
+    python3 tools/build_assets.py [cplus2_admin/public]
+
+Each asset is written next to its source as NAME.HASH.EXT.gz, where HASH
+is taken from the compressed content, and listed in assets.json with its
+URL, content type and ETag. The web server sends the compressed file and
+answers requests carrying the same ETag with 304 Not Modified.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+# URL, source file and content type of each asset
+ASSETS = [
+    ("/", "index.html", "text/html"),
+]
+MANIFEST = "assets.json"
+HASH_SIZE = 16
+
+_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_PRE = re.compile(r"(<pre>.*?</pre>)", re.S)
+
+
+def minify_html(text):
+    """Drop comments, indentation and empty lines. Lines are not joined,
+    so scripts keep their line breaks, and <pre> blocks are kept as is."""
+    text = _COMMENT.sub("", text)
+    parts = []
+    for i, part in enumerate(_PRE.split(text)):
+        if i % 2:
+            parts.append(part)
+            continue
+        lines = []
+        script = False
+        for line in part.split("\n"):
+            line = line.strip()
+            if "<script" in line:
+                script = True
+            if "</script>" in line:
+                script = False
+            if not line or (script and line.startswith("//")):
+                continue
+            lines.append(line)
+        parts.append("\n".join(lines))
+    return "\n".join(parts)
+
+
+def compress(data):
+    """gzip without timestamp, so the same source gives the same hash"""
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def build(folder):
+    manifest = {}
+    for url, source, content_type in ASSETS:
+        with open(os.path.join(folder, source), encoding="utf-8") as f:
+            text = f.read()
+        if content_type == "text/html":
+            text = minify_html(text)
+        data = compress(text.encode("utf-8"))
+        digest = hashlib.sha256(data).hexdigest()[:HASH_SIZE]
+        name, ext = os.path.splitext(source)
+        target = f"{name}.{digest}{ext}.gz"
+        # Remove the builds of previous versions
+        for old in os.listdir(folder):
+            if old.startswith(name + ".") and old.endswith(ext + ".gz"):
+                os.remove(os.path.join(folder, old))
+        with open(os.path.join(folder, target), "wb") as f:
+            f.write(data)
+        manifest[url] = {"file": target, "type": content_type, "etag": digest}
+        size = os.path.getsize(os.path.join(folder, source))
+        print(f"{url}: {source} {size} bytes -> {target} {len(data)} bytes")
+    with open(os.path.join(folder, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+if __name__ == "__main__":
+    build(sys.argv[1] if len(sys.argv) > 1 else "cplus2_admin/public")
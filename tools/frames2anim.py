@@ -0,0 +1,95 @@
+"""
+MIT license
+Copyright (c) 2024 Rafael Correia
+https://github.com/faelcorreia/micropython-m5stickc-plus2-admin
+
+Convert a sequence of BMP frames into the animation format played by
+libs.display.animation.
+
+Usage:
+    python3 tools/frames2anim.py cplus2_admin/data/intro.anim FPS frame0.bmp frame1.bmp ...
+
+Each frame is stored raw, run-length encoded or as a delta from the previous
+frame, whichever is the smallest. Use --keyframe N to force a full frame
+every N frames, so late frames can be skipped without decoding them.
+"""
+
+import struct
+import sys
+
+from bmp2rgb565 import encode, read_bmp
+
+MAGIC = b"A565"
+RAW = 0
+RLE = 1
+DELTA = 2
+SKIP = 0x8000
+MAX_DELTA_RUN = 0x7FFF
+
+
+def encode_delta(previous, pixels):
+    """Run-length records of the changed pixels, with skip records for the
+    unchanged ones"""
+    records = bytearray()
+    i = 0
+    while i < len(pixels):
+        run = 1
+        if pixels[i] == previous[i]:
+            while (
+                i + run < len(pixels)
+                and run < MAX_DELTA_RUN
+                and pixels[i + run] == previous[i + run]
+            ):
+                run += 1
+            records += struct.pack("<HH", SKIP | run, 0)
+        else:
+            while (
+                i + run < len(pixels)
+                and run < MAX_DELTA_RUN
+                and pixels[i + run] == pixels[i]
+                and pixels[i + run] != previous[i + run]
+            ):
+                run += 1
+            records += struct.pack("<H", run) + struct.pack(">H", pixels[i])
+        i += run
+    return bytes(records)
+
+
+def convert(destination, fps, sources, keyframe=0):
+    frames = []
+    size = None
+    previous = None
+    for index, source in enumerate(sources):
+        width, height, pixels = read_bmp(source)
+        if size is None:
+            size = (width, height)
+        elif size != (width, height):
+            raise ValueError(f"{source}: frames must have the same size")
+        candidates = [(RAW, encode(pixels, False)), (RLE, encode(pixels, True))]
+        if previous is not None and not (keyframe and index % keyframe == 0):
+            candidates.append((DELTA, encode_delta(previous, pixels)))
+        frames.append(min(candidates, key=lambda c: len(c[1])))
+        previous = pixels
+    with open(destination, "wb") as f:
+        f.write(struct.pack("<4sHHHBB", MAGIC, size[0], size[1], len(frames), fps, 0))
+        for encoding, payload in frames:
+            f.write(struct.pack("<BBI", encoding, 0, len(payload)))
+            f.write(payload)
+    counts = [sum(1 for e, _ in frames if e == kind) for kind in (RAW, RLE, DELTA)]
+    print(
+        f"{destination}: {size[0]}x{size[1]}, {len(frames)} frames at {fps} FPS "
+        f"({counts[0]} raw, {counts[1]} RLE, {counts[2]} delta)"
+    )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    keyframe = 0
+    if "--keyframe" in args:
+        i = args.index("--keyframe")
+        keyframe = int(args[i + 1])
+        del args[i : i + 2]
+    if len(args) < 3:
+        print(__doc__)
+        sys.exit(1)
+    convert(args[0], int(args[1]), args[2:], keyframe)